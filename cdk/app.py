@@ -6,6 +6,7 @@ from stacks.insurance_stack import InsuranceStack
 from stacks.retail_stack import RetailStack
 from stacks.healthcare_stack import HealthcareStack
 from stacks.landing_stack import LandingStack
+from stacks.shared_gateway_stack import SharedGatewayStack
 from config.environments import get_config
 
 app = App()
@@ -21,42 +22,67 @@ env = Environment(
     region=os.getenv("CDK_DEFAULT_REGION", "us-east-1"),
 )
 
+# Gateway mode serves every vertical from one Lambda function in its own stack;
+# the vertical stacks keep their resources and reference the function by name
+gateway_mode = get_config(stack_name, stage_name).gateway_mode
+
 # Determine which stacks to deploy
 deploy_insurance = vertical is None or vertical == "insurance"
 deploy_retail = vertical is None or vertical == "retail"
 deploy_healthcare = vertical is None or vertical == "healthcare"
 deploy_landing = vertical is None or vertical == "landing"
 
+# ========================================
+# Gateway Stack (shared function for the vertical stacks)
+# ========================================
+
+gateway_stack = None
+if gateway_mode and (deploy_insurance or deploy_retail or deploy_healthcare):
+    gateway_config = get_config(f"{stack_name}-gateway", stage_name)
+    gateway_stack = SharedGatewayStack(
+        app,
+        f"{stack_name}-gateway",
+        config=gateway_config,
+        verticals=["insurance", "retail", "healthcare"],
+        env=env,
+    )
+
 # ========================================
 # Vertical Stacks (Each manages its own certificate)
 # ========================================
 
 if deploy_insurance:
     insurance_config = get_config(f"{stack_name}-insurance", stage_name)
-    InsuranceStack(
+    insurance_stack = InsuranceStack(
         app,
         f"{stack_name}-insurance",
         config=insurance_config,
         env=env,
     )
+    if gateway_stack:
+        insurance_stack.add_stack_dependency(gateway_stack)
 
 if deploy_retail:
     retail_config = get_config(f"{stack_name}-retail", stage_name)
-    RetailStack(
+    retail_stack = RetailStack(
         app,
         f"{stack_name}-retail",
         config=retail_config,
         env=env,
     )
+    if gateway_stack:
+        retail_stack.add_stack_dependency(gateway_stack)
 
 if deploy_healthcare:
     healthcare_config = get_config(f"{stack_name}-healthcare", stage_name)
-    HealthcareStack(
+    healthcare_stack = HealthcareStack(
         app,
         f"{stack_name}-healthcare",
         config=healthcare_config,
         env=env,
     )
+    if gateway_stack:
+        healthcare_stack.add_stack_dependency(gateway_stack)
 
 if deploy_landing:
     landing_config = get_config(f"{stack_name}-landing", stage_name)
@@ -12,6 +12,8 @@ class SilvermoatConfig:
     ui_seeding_mode: str
     domain_name: str
     create_cloudfront: bool
+    gateway_mode: bool = False  # Serve all verticals from one Lambda function (GatewayStack)
+    chat_response_cache: bool = False  # Cache staff chat answers until the data they read changes
 
     @staticmethod
     def from_env():
@@ -23,4 +25,6 @@ class SilvermoatConfig:
             ui_seeding_mode=os.getenv("UI_SEEDING_MODE", "external"),
             domain_name=os.getenv("DOMAIN_NAME", "silvermoat.net"),
             create_cloudfront=os.getenv("CREATE_CLOUDFRONT", "true").lower() == "true",
+            gateway_mode=os.getenv("GATEWAY_MODE", "false").lower() == "true",
+            chat_response_cache=os.getenv("CHAT_RESPONSE_CACHE", "false").lower() == "true",
         )
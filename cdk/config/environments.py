@@ -1,3 +1,4 @@
+import os
 from .base import SilvermoatConfig
 
 
@@ -5,7 +6,7 @@ def get_config(stack_name: str, stage_name: str) -> SilvermoatConfig:
     """Get configuration based on stack name and stage"""
 
     # Production stacks
-    if stack_name in ["silvermoat", "silvermoat-insurance", "silvermoat-retail", "silvermoat-healthcare", "silvermoat-landing"]:
+    if stack_name in ["silvermoat", "silvermoat-insurance", "silvermoat-retail", "silvermoat-healthcare", "silvermoat-landing", "silvermoat-gateway"]:
         return SilvermoatConfig(
             app_name="silvermoat",
             stage_name="prod",
@@ -13,6 +14,8 @@ def get_config(stack_name: str, stage_name: str) -> SilvermoatConfig:
             ui_seeding_mode="external",
             domain_name="*.silvermoat.net",  # Wildcard for multi-vertical subdomains
             create_cloudfront=True,
+            gateway_mode=os.getenv("GATEWAY_MODE", "false").lower() == "true",
+            chat_response_cache=os.getenv("CHAT_RESPONSE_CACHE", "false").lower() == "true",
         )
 
     # Test stacks (PR ephemeral stacks)
@@ -27,6 +30,8 @@ def get_config(stack_name: str, stage_name: str) -> SilvermoatConfig:
             ui_seeding_mode="external",
             domain_name="",  # No custom domain for test stacks
             create_cloudfront=False,  # Fast deployment, HTTP only
+            gateway_mode=os.getenv("GATEWAY_MODE", "false").lower() == "true",
+            chat_response_cache=os.getenv("CHAT_RESPONSE_CACHE", "false").lower() == "true",
         )
 
     # Default/fallback - load from environment
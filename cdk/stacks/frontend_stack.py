@@ -16,6 +16,7 @@ class FrontendStack(Construct):
     Routes:
     - insurance.domain.com → Insurance UI S3 + Insurance API
     - retail.domain.com → Retail UI S3 + Retail API
+    - healthcare.domain.com → Healthcare UI S3 + Healthcare API
     """
 
     def __init__(
@@ -78,8 +79,6 @@ class FrontendStack(Construct):
                 allowed_methods=cloudfront.AllowedMethods.ALLOW_GET_HEAD_OPTIONS,
                 cache_policy=cloudfront.CachePolicy.CACHING_OPTIMIZED,
                 compress=True,
-                # Cache varies by Host header for subdomain routing
-                cache_key_parameters=cloudfront.CacheQueryStringBehavior.none(),
                 origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER,
             ),
             "default_root_object": "index.html",
@@ -109,8 +108,7 @@ class FrontendStack(Construct):
                 # Extract base domain (e.g., "silvermoat.net" from "*.silvermoat.net")
                 base_domain = domain_name.lstrip("*").lstrip(".")
                 distribution_props["domain_names"] = [
-                    f"insurance.{base_domain}",
-                    f"retail.{base_domain}",
+                    *[f"{vertical_name}.{base_domain}" for vertical_name in self.verticals],
                     base_domain,  # Also support apex domain (defaults to insurance)
                 ]
             else:
@@ -0,0 +1,138 @@
+"""Multi-vertical gateway CDK construct - one Lambda function shared by several verticals"""
+from aws_cdk import (
+    aws_lambda as lambda_,
+    aws_iam as iam,
+    Duration,
+    Stack,
+)
+from constructs import Construct
+from .vertical_stack import CHAT_WORKER_TIMEOUT_SECONDS, CHAT_WORKER_ENVIRONMENT, vertical_environment
+
+
+class GatewayStack(Construct):
+    """
+    Single Lambda function that serves every vertical's API in-process.
+
+    Pass `function` as `gateway_function` and `worker_function` as
+    `gateway_worker` to each VerticalStack, or, from another stack, the
+    functions returned by `GatewayStack.import_functions`. Functions and
+    roles have fixed names, and each vertical's {VERTICAL}_* environment
+    variables are derived from the resource naming convention, so the
+    verticals can live in their own stacks: they grant table, bucket and
+    queue access to the imported roles and wire their API and chat job
+    queue to the imported functions. The gateway handler routes by stage
+    variable, Host header or queued job.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        app_name: str,
+        stage_name: str,
+        layer: lambda_.LayerVersion,
+        verticals: list,
+        response_cache: bool = False,
+    ):
+        super().__init__(scope, id)
+
+        environment = {"GATEWAY_VERTICALS": ",".join(verticals)}
+        for vertical in verticals:
+            for key, value in vertical_environment(self, app_name, vertical, stage_name, response_cache).items():
+                environment[f"{vertical.upper()}_{key}"] = value
+        # Export jobs run on the worker (ARN built from the name to avoid dependency cycles)
+        worker_name = _name(app_name, "chat-worker", stage_name)
+        environment["EXPORT_FUNCTION_NAME"] = worker_name
+
+        self.function = self._create_function(
+            "GatewayFunction", app_name, "api", stage_name, layer, verticals, Duration.seconds(30), environment,
+        )
+
+        # Async chat and export jobs of every vertical (chat jobs fed by the verticals' queues)
+        self.worker_function = self._create_function(
+            "GatewayChatWorkerFunction", app_name, "chat-worker", stage_name, layer, verticals,
+            Duration.seconds(CHAT_WORKER_TIMEOUT_SECONDS), {**environment, **CHAT_WORKER_ENVIRONMENT},
+        )
+
+        stack = Stack.of(self)
+        for function in (self.function, self.worker_function):
+            function.add_to_role_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=["lambda:InvokeFunction"],
+                    resources=[f"arn:aws:lambda:{stack.region}:{stack.account}:function:{worker_name}"]
+                )
+            )
+
+    @staticmethod
+    def import_functions(scope: Construct, app_name: str, stage_name: str):
+        """
+        Reference a gateway deployed in another stack by its fixed names.
+
+        Returns:
+            (function, worker_function); grants on them add policies to the gateway's roles
+        """
+        stack = Stack.of(scope)
+        imported = []
+        for id, kind in (("GatewayFunction", "api"), ("GatewayChatWorkerFunction", "chat-worker")):
+            function_name = _name(app_name, kind, stage_name)
+            imported.append(lambda_.Function.from_function_attributes(
+                scope,
+                id,
+                function_arn=f"arn:aws:lambda:{stack.region}:{stack.account}:function:{function_name}",
+                role=iam.Role.from_role_name(scope, f"{id}Role", _name(app_name, f"{kind}-role", stage_name)),
+                same_environment=True,
+            ))
+        return tuple(imported)
+
+    def _create_function(self, id: str, app_name: str, kind: str, stage_name: str, layer: lambda_.LayerVersion,
+                         verticals: list, timeout: Duration, environment: dict):
+        """Create a function running the gateway handler over the given verticals"""
+        # Named so that vertical stacks can grant access to their resources
+        role = iam.Role(
+            self,
+            f"{id}Role",
+            role_name=_name(app_name, f"{kind}-role", stage_name),
+            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+            managed_policies=[
+                iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole"),
+            ],
+        )
+
+        function = lambda_.Function(
+            self,
+            id,
+            function_name=_name(app_name, kind, stage_name),
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            # Gateway plus every vertical's code; the shared layer supplies shared/
+            code=lambda_.Code.from_asset(
+                "../lambda",
+                exclude=[
+                    "*",
+                    "!gateway", "!gateway/**",
+                    *[pattern for v in verticals for pattern in (f"!{v}", f"!{v}/**")],
+                    "**/__pycache__",
+                ],
+            ),
+            handler="gateway.handler.handler",
+            layers=[layer],
+            role=role,
+            timeout=timeout,
+            memory_size=512,
+            environment=environment,
+        )
+
+        # Grant Bedrock access for chatbots
+        function.add_to_role_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["bedrock:InvokeModel", "bedrock:InvokeModelWithResponseStream"],
+                resources=["arn:aws:bedrock:*:*:foundation-model/*"]
+            )
+        )
+        return function
+
+
+def _name(app_name, kind, stage_name):
+    """Physical name of a gateway resource (functions and their roles)"""
+    return f"{app_name}-gateway-{kind}-{stage_name}"
@@ -7,9 +7,11 @@ from aws_cdk import (
     aws_cloudfront_origins as origins,
     aws_certificatemanager as acm,
 )
+from aws_cdk.aws_lambda_python_alpha import PythonLayerVersion
 from constructs import Construct
 from config.base import SilvermoatConfig
 from .vertical_stack import VerticalStack
+from .gateway_stack import GatewayStack
 
 
 class RetailStack(Stack):
@@ -25,14 +27,21 @@ class RetailStack(Stack):
         super().__init__(scope, id, **kwargs)
 
         # Retail-specific Lambda Layer
-        self.layer = lambda_.LayerVersion(
+        self.layer = PythonLayerVersion(
             self,
             "RetailLayer",
-            code=lambda_.Code.from_asset("../lambda/layer"),
+            entry="../lambda/layer/python",  # shared/ plus requirements.txt (NumPy)
             compatible_runtimes=[lambda_.Runtime.PYTHON_3_12],
             description="Shared utilities for Retail Lambda functions",
         )
 
+        # Shared gateway functions (gateway mode), deployed by the gateway stack and referenced by name
+        gateway_function, gateway_worker = None, None
+        if config.gateway_mode:
+            gateway_function, gateway_worker = GatewayStack.import_functions(
+                self, config.app_name, config.stage_name
+            )
+
         # Retail Vertical Stack
         self.retail = VerticalStack(
             self,
@@ -42,6 +51,9 @@ class RetailStack(Stack):
             stage_name=config.stage_name,
             layer=self.layer,
             api_deployment_token=config.api_deployment_token,
+            gateway_function=gateway_function,
+            gateway_worker=gateway_worker,
+            response_cache=config.chat_response_cache,
         )
 
         # ========================================
@@ -112,6 +124,14 @@ class RetailStack(Stack):
             export_name=f"{self.stack_name}-RetailApiUrl",
         )
 
+        CfnOutput(
+            self,
+            "RetailChatStreamUrl",
+            value=self.retail.chat_stream_url,
+            description="Retail live-streamed chat URL (POST chat with stream: true)",
+            export_name=f"{self.stack_name}-RetailChatStreamUrl",
+        )
+
         CfnOutput(
             self,
             "RetailUiBucketName",
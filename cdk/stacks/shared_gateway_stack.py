@@ -0,0 +1,63 @@
+"""Shared gateway CDK stack - one Lambda function serving the vertical stacks (GATEWAY_MODE)"""
+from aws_cdk import (
+    Stack,
+    CfnOutput,
+    aws_lambda as lambda_,
+)
+from aws_cdk.aws_lambda_python_alpha import PythonLayerVersion
+from constructs import Construct
+from config.base import SilvermoatConfig
+from .gateway_stack import GatewayStack
+
+
+class SharedGatewayStack(Stack):
+    """
+    Gateway functions used by the per-vertical stacks in gateway mode.
+
+    Holds no vertical resources: each vertical stack keeps its tables,
+    buckets, queue and API, imports these functions with
+    GatewayStack.import_functions and depends on this stack.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        config: SilvermoatConfig,
+        verticals: list,
+        **kwargs,
+    ):
+        super().__init__(scope, id, **kwargs)
+
+        # Gateway Lambda Layer
+        self.layer = PythonLayerVersion(
+            self,
+            "GatewayLayer",
+            entry="../lambda/layer/python",  # shared/ plus requirements.txt (NumPy)
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_12],
+            description="Shared utilities for the multi-vertical gateway functions",
+        )
+
+        self.gateway = GatewayStack(
+            self,
+            "Gateway",
+            app_name=config.app_name,
+            stage_name=config.stage_name,
+            layer=self.layer,
+            verticals=verticals,
+            response_cache=config.chat_response_cache,
+        )
+
+        CfnOutput(
+            self,
+            "GatewayFunctionName",
+            value=self.gateway.function.function_name,
+            description="Gateway API Lambda function",
+        )
+
+        CfnOutput(
+            self,
+            "GatewayChatWorkerFunctionName",
+            value=self.gateway.worker_function.function_name,
+            description="Gateway chat and export job worker function",
+        )
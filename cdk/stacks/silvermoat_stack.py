@@ -1,9 +1,11 @@
 """Main Silvermoat CDK stack - multi-vertical platform with isolated resources per vertical"""
 from aws_cdk import Stack, CfnOutput, aws_lambda as lambda_
+from aws_cdk.aws_lambda_python_alpha import PythonLayerVersion
 from constructs import Construct
 from config.base import SilvermoatConfig
 from .vertical_stack import VerticalStack
 from .frontend_stack import FrontendStack
+from .gateway_stack import GatewayStack
 
 
 class SilvermoatStack(Stack):
@@ -19,14 +21,29 @@ class SilvermoatStack(Stack):
         super().__init__(scope, id, **kwargs)
 
         # Shared Lambda Layer (contains shared/ directory used by all verticals)
-        shared_layer = lambda_.LayerVersion(
+        shared_layer = PythonLayerVersion(
             self,
             "SharedLayer",
-            code=lambda_.Code.from_asset("../lambda/layer"),
+            entry="../lambda/layer/python",  # shared/ plus requirements.txt (NumPy)
             compatible_runtimes=[lambda_.Runtime.PYTHON_3_12],
             description="Shared utilities for Lambda functions across all verticals",
         )
 
+        # Optional shared gateway function (one warm pool for all verticals)
+        self.gateway = None
+        if config.gateway_mode:
+            self.gateway = GatewayStack(
+                self,
+                "Gateway",
+                app_name=config.app_name,
+                stage_name=config.stage_name,
+                layer=shared_layer,
+                verticals=["insurance", "retail", "healthcare"],
+                response_cache=config.chat_response_cache,
+            )
+        gateway_function = self.gateway.function if self.gateway else None
+        gateway_worker = self.gateway.worker_function if self.gateway else None
+
         # Insurance Vertical Stack
         self.insurance = VerticalStack(
             self,
@@ -36,6 +53,9 @@ class SilvermoatStack(Stack):
             stage_name=config.stage_name,
             layer=shared_layer,
             api_deployment_token=config.api_deployment_token,
+            gateway_function=gateway_function,
+            gateway_worker=gateway_worker,
+            response_cache=config.chat_response_cache,
         )
 
         # Retail Vertical Stack
@@ -47,6 +67,23 @@ class SilvermoatStack(Stack):
             stage_name=config.stage_name,
             layer=shared_layer,
             api_deployment_token=config.api_deployment_token,
+            gateway_function=gateway_function,
+            gateway_worker=gateway_worker,
+            response_cache=config.chat_response_cache,
+        )
+
+        # Healthcare Vertical Stack
+        self.healthcare = VerticalStack(
+            self,
+            "HealthcareVertical",
+            vertical_name="healthcare",
+            app_name=config.app_name,
+            stage_name=config.stage_name,
+            layer=shared_layer,
+            api_deployment_token=config.api_deployment_token,
+            gateway_function=gateway_function,
+            gateway_worker=gateway_worker,
+            response_cache=config.chat_response_cache,
         )
 
         # Frontend Stack with multi-vertical CloudFront distribution
@@ -62,6 +99,10 @@ class SilvermoatStack(Stack):
                     "ui_bucket": self.retail.ui_bucket,
                     "api_url": self.retail.api_url,
                 },
+                "healthcare": {
+                    "ui_bucket": self.healthcare.ui_bucket,
+                    "api_url": self.healthcare.api_url,
+                },
             },
             domain_name=config.domain_name,
             create_cloudfront=config.create_cloudfront,
@@ -80,6 +121,14 @@ class SilvermoatStack(Stack):
             export_name=f"{self.stack_name}-InsuranceApiUrl",
         )
 
+        CfnOutput(
+            self,
+            "InsuranceChatStreamUrl",
+            value=self.insurance.chat_stream_url,
+            description="Insurance live-streamed chat URL (POST chat with stream: true)",
+            export_name=f"{self.stack_name}-InsuranceChatStreamUrl",
+        )
+
         CfnOutput(
             self,
             "InsuranceUiBucketName",
@@ -105,6 +154,14 @@ class SilvermoatStack(Stack):
             export_name=f"{self.stack_name}-RetailApiUrl",
         )
 
+        CfnOutput(
+            self,
+            "RetailChatStreamUrl",
+            value=self.retail.chat_stream_url,
+            description="Retail live-streamed chat URL (POST chat with stream: true)",
+            export_name=f"{self.stack_name}-RetailChatStreamUrl",
+        )
+
         CfnOutput(
             self,
             "RetailUiBucketName",
@@ -121,6 +178,39 @@ class SilvermoatStack(Stack):
             export_name=f"{self.stack_name}-RetailUiBucketWebsiteURL",
         )
 
+        # Healthcare Vertical Outputs
+        CfnOutput(
+            self,
+            "HealthcareApiUrl",
+            value=self.healthcare.api_url,
+            description="Healthcare API Base URL",
+            export_name=f"{self.stack_name}-HealthcareApiUrl",
+        )
+
+        CfnOutput(
+            self,
+            "HealthcareChatStreamUrl",
+            value=self.healthcare.chat_stream_url,
+            description="Healthcare live-streamed chat URL (POST chat with stream: true)",
+            export_name=f"{self.stack_name}-HealthcareChatStreamUrl",
+        )
+
+        CfnOutput(
+            self,
+            "HealthcareUiBucketName",
+            value=self.healthcare.ui_bucket.bucket_name,
+            description="Healthcare UI S3 Bucket",
+            export_name=f"{self.stack_name}-HealthcareUiBucketName",
+        )
+
+        CfnOutput(
+            self,
+            "HealthcareUiBucketWebsiteURL",
+            value=self.healthcare.ui_bucket.bucket_website_url,
+            description="Healthcare UI S3 Website URL",
+            export_name=f"{self.stack_name}-HealthcareUiBucketWebsiteURL",
+        )
+
         # CloudFront Outputs (if enabled)
         if self.frontend.certificate:
             CfnOutput(
@@ -167,6 +257,12 @@ class SilvermoatStack(Stack):
                     value=f"https://retail.{base_domain}",
                     description="Retail vertical custom domain URL",
                 )
+                CfnOutput(
+                    self,
+                    "HealthcareDomainUrl",
+                    value=f"https://healthcare.{base_domain}",
+                    description="Healthcare vertical custom domain URL",
+                )
             else:
                 CfnOutput(
                     self,
@@ -5,13 +5,64 @@ from aws_cdk import (
     aws_dynamodb as dynamodb,
     aws_s3 as s3,
     aws_sns as sns,
+    aws_sqs as sqs,
     aws_iam as iam,
+    aws_lambda_event_sources as event_sources,
     Duration,
     RemovalPolicy,
+    Stack,
 )
 from constructs import Construct
 
 
+# Async chat jobs run in a worker function with room for long tool loops
+CHAT_WORKER_TIMEOUT_SECONDS = 300
+CHAT_WORKER_ENVIRONMENT = {
+    "CHAT_TIME_BUDGET_MS": str((CHAT_WORKER_TIMEOUT_SECONDS - 15) * 1000),
+    "CHAT_MAX_TOOL_ITERATIONS": "16",
+    "CHAT_TOOL_TIMEOUT_MS": "60000",
+}
+
+# Live-streamed chat (POST /chat with "stream": true) runs behind a function URL, without
+# API Gateway's 29s limit; the Lambda Web Adapter layer streams the HTTP server's response
+CHAT_STREAM_TIMEOUT_SECONDS = 120
+LAMBDA_ADAPTER_LAYER_ARN = "arn:aws:lambda:{region}:753240598075:layer:LambdaAdapterLayerX86:25"
+
+
+def vertical_environment(scope: Construct, app_name: str, vertical_name: str, stage_name: str,
+                         response_cache: bool = False) -> dict:
+    """
+    Environment variables pointing a function at a vertical's resources.
+
+    Built from the resource naming convention rather than from the resources
+    themselves, so a shared gateway function in another stack can be
+    configured without cross-stack references.
+    """
+    stack = Stack.of(scope)
+
+    def name(kind):
+        return f"{app_name}-{vertical_name}-{kind}-{stage_name}"
+
+    environment = {
+        "CUSTOMERS_TABLE": name("customers"),
+        "QUOTES_TABLE": name("quotes"),
+        "POLICIES_TABLE": name("policies"),
+        "CLAIMS_TABLE": name("claims"),
+        "PAYMENTS_TABLE": name("payments"),
+        "CASES_TABLE": name("cases"),
+        "IDEMPOTENCY_TABLE": name("idempotency"),
+        "CONVERSATIONS_TABLE": name("conversations"),
+        "CHAT_JOBS_TABLE": name("chat-jobs"),
+        "CHAT_JOBS_QUEUE_URL": f"https://sqs.{stack.region}.{stack.url_suffix}/{stack.account}/{name('chat-jobs')}",
+        "DOCS_BUCKET": name("docs"),
+        "SNS_TOPIC_ARN": f"arn:aws:sns:{stack.region}:{stack.account}:{name('events')}",
+        "VERTICAL": vertical_name,
+    }
+    if response_cache:
+        environment["RESPONSE_CACHE_TABLE"] = name("response-cache")
+    return environment
+
+
 class VerticalStack(Construct):
     """
     Complete vertical stack: API Gateway, Lambda, DynamoDB tables, S3 buckets.
@@ -27,18 +78,24 @@ class VerticalStack(Construct):
         stage_name: str,
         layer: lambda_.LayerVersion,
         api_deployment_token: str,
+        gateway_function: lambda_.IFunction = None,  # Shared multi-vertical function (GatewayStack)
+        gateway_worker: lambda_.IFunction = None,  # Shared chat job worker (GatewayStack)
+        response_cache: bool = False,  # Opt-in staff chat answer cache (ResponseCacheTable)
     ):
         super().__init__(scope, id)
 
         self.vertical_name = vertical_name
         self.app_name = app_name
         self.stage_name = stage_name
+        self.gateway_mode = gateway_function is not None
+        self.response_cache = response_cache
 
         # Create vertical-specific resources
         self._create_dynamodb_tables()
         self._create_s3_buckets()
         self._create_sns_topic()
-        self._create_lambda_function(layer)
+        self._create_chat_job_queue()
+        self._create_lambda_function(layer, gateway_function, gateway_worker)
         self._create_api_gateway(api_deployment_token)
 
     def _create_dynamodb_tables(self):
@@ -121,6 +178,49 @@ class VerticalStack(Construct):
             **table_config,
         )
 
+        # Idempotency records for create endpoints (expire via TTL)
+        self.idempotency_table = dynamodb.Table(
+            self,
+            "IdempotencyTable",
+            table_name=f"{self.app_name}-{self.vertical_name}-idempotency-{self.stage_name}",
+            partition_key=dynamodb.Attribute(name="id", type=dynamodb.AttributeType.STRING),
+            time_to_live_attribute="expiresAt",
+            **table_config,
+        )
+
+        # Server-side chat sessions: message chunks per conversation (expire via TTL)
+        self.conversations_table = dynamodb.Table(
+            self,
+            "ConversationsTable",
+            table_name=f"{self.app_name}-{self.vertical_name}-conversations-{self.stage_name}",
+            partition_key=dynamodb.Attribute(name="conversationId", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="seq", type=dynamodb.AttributeType.NUMBER),
+            time_to_live_attribute="expiresAt",
+            **table_config,
+        )
+
+        # Async chat jobs: request, progress and result per job (expire via TTL)
+        self.chat_jobs_table = dynamodb.Table(
+            self,
+            "ChatJobsTable",
+            table_name=f"{self.app_name}-{self.vertical_name}-chat-jobs-{self.stage_name}",
+            partition_key=dynamodb.Attribute(name="jobId", type=dynamodb.AttributeType.STRING),
+            time_to_live_attribute="expiresAt",
+            **table_config,
+        )
+
+        # Cached staff chat answers and per-domain data versions (answers expire via TTL)
+        self.response_cache_table = None
+        if self.response_cache:
+            self.response_cache_table = dynamodb.Table(
+                self,
+                "ResponseCacheTable",
+                table_name=f"{self.app_name}-{self.vertical_name}-response-cache-{self.stage_name}",
+                partition_key=dynamodb.Attribute(name="id", type=dynamodb.AttributeType.STRING),
+                time_to_live_attribute="expiresAt",
+                **table_config,
+            )
+
     def _create_s3_buckets(self):
         """Create S3 buckets for this vertical"""
         # UI bucket with website hosting
@@ -158,50 +258,167 @@ class VerticalStack(Construct):
             topic_name=f"{self.app_name}-{self.vertical_name}-events-{self.stage_name}",
         )
 
-    def _create_lambda_function(self, layer: lambda_.LayerVersion):
-        """Create Lambda function for this vertical"""
+    def _create_chat_job_queue(self):
+        """Create the SQS queue feeding async chat jobs to the worker function"""
+        self.chat_jobs_queue = sqs.Queue(
+            self,
+            "ChatJobsQueue",
+            queue_name=f"{self.app_name}-{self.vertical_name}-chat-jobs-{self.stage_name}",
+            # AWS recommends six times the consumer's timeout for Lambda event sources
+            visibility_timeout=Duration.seconds(CHAT_WORKER_TIMEOUT_SECONDS * 6),
+            retention_period=Duration.days(1),
+        )
+
+    def _create_lambda_function(
+        self,
+        layer: lambda_.LayerVersion,
+        gateway_function: lambda_.IFunction = None,
+        gateway_worker: lambda_.IFunction = None,
+    ):
+        """Create the API, chat job worker and chat stream functions for this vertical (API and worker may be the shared gateway's)"""
+        environment = vertical_environment(self, self.app_name, self.vertical_name, self.stage_name,
+                                           self.response_cache)
+        if gateway_function:
+            # The gateway configures itself for this vertical (GatewayStack); grants, queue and API stay here
+            self.function = gateway_function
+            self.worker_function = gateway_worker
+            environment["EXPORT_FUNCTION_NAME"] = gateway_worker.function_name
+            self._create_chat_stream_function(layer, environment)
+            gateway_worker.grant_invoke(self.chat_stream_function)
+        else:
+            # Export jobs run on the worker too (ARN built from the name to avoid dependency cycles)
+            worker_name = f"{self.app_name}-{self.vertical_name}-chat-worker-{self.stage_name}"
+            environment["EXPORT_FUNCTION_NAME"] = worker_name
+            self._create_vertical_function(layer, environment)
+            self._create_chat_worker_function(layer, environment, worker_name)
+            self._create_chat_stream_function(layer, environment)
+            stack = Stack.of(self)
+            for function in (self.function, self.worker_function, self.chat_stream_function):
+                function.add_to_role_policy(
+                    iam.PolicyStatement(
+                        effect=iam.Effect.ALLOW,
+                        actions=["lambda:InvokeFunction"],
+                        resources=[f"arn:aws:lambda:{stack.region}:{stack.account}:function:{worker_name}"]
+                    )
+                )
+
+        # Grant permissions
+        for function in (self.function, self.worker_function, self.chat_stream_function):
+            self.customers_table.grant_read_write_data(function)
+            self.quotes_table.grant_read_write_data(function)
+            self.policies_table.grant_read_write_data(function)
+            self.claims_table.grant_read_write_data(function)
+            self.payments_table.grant_read_write_data(function)
+            self.cases_table.grant_read_write_data(function)
+            self.idempotency_table.grant_read_write_data(function)
+            self.conversations_table.grant_read_write_data(function)
+            self.chat_jobs_table.grant_read_write_data(function)
+            if self.response_cache_table:
+                self.response_cache_table.grant_read_write_data(function)
+            self.docs_bucket.grant_read_write(function)
+            self.topic.grant_publish(function)
+        self.chat_jobs_queue.grant_send_messages(self.function)
+        self.chat_jobs_queue.grant_send_messages(self.chat_stream_function)
+
+        # One job per invocation; failed batches are retried per message
+        self.worker_function.add_event_source(
+            event_sources.SqsEventSource(self.chat_jobs_queue, batch_size=1, report_batch_item_failures=True)
+        )
+        if self.gateway_mode:
+            # The gateway worker's queue policy is created in this stack: attach it before the mapping
+            for child in self.worker_function.node.children:
+                if isinstance(child, lambda_.EventSourceMapping):
+                    child.node.add_dependency(self.worker_function.role)
+
+    def _create_vertical_function(self, layer: lambda_.LayerVersion, environment: dict):
+        """Create the dedicated Lambda function for this vertical"""
+        function_name = f"{self.app_name}-{self.vertical_name}-api-{self.stage_name}"
         self.function = lambda_.Function(
             self,
             "ApiFunction",
-            function_name=f"{self.app_name}-{self.vertical_name}-api-{self.stage_name}",
+            function_name=function_name,
             runtime=lambda_.Runtime.PYTHON_3_12,
             code=lambda_.Code.from_asset(f"../lambda/{self.vertical_name}"),
             handler="handler.handler",
             layers=[layer],
             timeout=Duration.seconds(30),
             memory_size=512,
-            environment={
-                "CUSTOMERS_TABLE": self.customers_table.table_name,
-                "QUOTES_TABLE": self.quotes_table.table_name,
-                "POLICIES_TABLE": self.policies_table.table_name,
-                "CLAIMS_TABLE": self.claims_table.table_name,
-                "PAYMENTS_TABLE": self.payments_table.table_name,
-                "CASES_TABLE": self.cases_table.table_name,
-                "DOCS_BUCKET": self.docs_bucket.bucket_name,
-                "SNS_TOPIC_ARN": self.topic.topic_arn,
-                "VERTICAL": self.vertical_name,
-            },
+            environment=environment,
         )
 
-        # Grant permissions
-        self.customers_table.grant_read_write_data(self.function)
-        self.quotes_table.grant_read_write_data(self.function)
-        self.policies_table.grant_read_write_data(self.function)
-        self.claims_table.grant_read_write_data(self.function)
-        self.payments_table.grant_read_write_data(self.function)
-        self.cases_table.grant_read_write_data(self.function)
-        self.docs_bucket.grant_read_write(self.function)
-        self.topic.grant_publish(self.function)
-
         # Grant Bedrock access for chatbot
         self.function.add_to_role_policy(
             iam.PolicyStatement(
                 effect=iam.Effect.ALLOW,
-                actions=["bedrock:InvokeModel"],
+                actions=["bedrock:InvokeModel", "bedrock:InvokeModelWithResponseStream"],
+                resources=["arn:aws:bedrock:*:*:foundation-model/*"]
+            )
+        )
+
+    def _create_chat_worker_function(self, layer: lambda_.LayerVersion, environment: dict, function_name: str):
+        """Create the function running this vertical's async chat and export jobs (same code, longer timeout)"""
+        self.worker_function = lambda_.Function(
+            self,
+            "ChatWorkerFunction",
+            function_name=function_name,
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            code=lambda_.Code.from_asset(f"../lambda/{self.vertical_name}"),
+            handler="handler.handler",
+            layers=[layer],
+            timeout=Duration.seconds(CHAT_WORKER_TIMEOUT_SECONDS),
+            memory_size=512,
+            environment={**environment, **CHAT_WORKER_ENVIRONMENT},
+        )
+
+        self.worker_function.add_to_role_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["bedrock:InvokeModel", "bedrock:InvokeModelWithResponseStream"],
                 resources=["arn:aws:bedrock:*:*:foundation-model/*"]
             )
         )
 
+    def _create_chat_stream_function(self, layer: lambda_.LayerVersion, environment: dict):
+        """Create the function serving live-streamed chat through a function URL (shared/chat_stream.py)"""
+        stack = Stack.of(self)
+        adapter_layer = lambda_.LayerVersion.from_layer_version_arn(
+            self, "LambdaAdapterLayer", LAMBDA_ADAPTER_LAYER_ARN.format(region=stack.region)
+        )
+        self.chat_stream_function = lambda_.Function(
+            self,
+            "ChatStreamFunction",
+            function_name=f"{self.app_name}-{self.vertical_name}-chat-stream-{self.stage_name}",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            code=lambda_.Code.from_asset(f"../lambda/{self.vertical_name}"),
+            # run.sh starts the HTTP server the adapter forwards requests to
+            handler="run.sh",
+            layers=[layer, adapter_layer],
+            timeout=Duration.seconds(CHAT_STREAM_TIMEOUT_SECONDS),
+            memory_size=512,
+            environment={
+                **environment,
+                "AWS_LAMBDA_EXEC_WRAPPER": "/opt/bootstrap",
+                "AWS_LWA_INVOKE_MODE": "response_stream",
+                "AWS_LWA_PORT": "8080",
+                "CHAT_TIME_BUDGET_MS": str((CHAT_STREAM_TIMEOUT_SECONDS - 15) * 1000),
+            },
+        )
+
+        self.chat_stream_function.add_to_role_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["bedrock:InvokeModel", "bedrock:InvokeModelWithResponseStream"],
+                resources=["arn:aws:bedrock:*:*:foundation-model/*"]
+            )
+        )
+
+        # CORS headers come from the handler's responses, as behind API Gateway
+        function_url = self.chat_stream_function.add_function_url(
+            auth_type=lambda_.FunctionUrlAuthType.NONE,
+            invoke_mode=lambda_.InvokeMode.RESPONSE_STREAM,
+        )
+        self.chat_stream_url = function_url.url
+
     def _create_api_gateway(self, api_deployment_token: str):
         """Create API Gateway for this vertical"""
         self.api = apigateway.RestApi(
@@ -211,6 +428,8 @@ class VerticalStack(Construct):
             description=f"API for {self.vertical_name} vertical",
             deploy_options=apigateway.StageOptions(
                 stage_name=self.stage_name,
+                # Lets the shared gateway function route requests from this API
+                variables={"vertical": self.vertical_name} if self.gateway_mode else None,
                 throttling_rate_limit=100,
                 throttling_burst_limit=200,
             ),
@@ -0,0 +1 @@
+"""Multi-vertical gateway"""
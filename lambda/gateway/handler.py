@@ -0,0 +1,118 @@
+"""Multi-vertical gateway - one Lambda function serving every vertical's API
+
+Each vertical's handler is imported lazily on its first request, with its own
+directory on sys.path and its own copy of the flat modules (entities, chatbot,
+customer_chatbot) and of the shared layer. Shared modules read their bucket,
+topic and table names at import time, so giving each vertical its own copy
+keeps those settings isolated exactly as with one function per vertical.
+
+Per-vertical configuration is passed as prefixed environment variables
+(INSURANCE_CUSTOMERS_TABLE, RETAIL_DOCS_BUCKET, ...). The vertical's settings
+are collected from them once and exposed under the unprefixed names only while
+its modules are imported (under a lock); the modules keep them as constants,
+so requests run without touching os.environ.
+"""
+import os
+import sys
+import json
+import importlib
+import threading
+from contextlib import contextmanager
+from shared.responses import _resp
+from shared.vertical_detector import detect_vertical
+
+
+LAMBDA_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VERTICALS = ["insurance", "retail", "healthcare"]
+ENABLED_VERTICALS = [v for v in os.environ.get("GATEWAY_VERTICALS", ",".join(VERTICALS)).split(",") if v]
+
+# Modules imported by flat name from a vertical's directory
+VERTICAL_MODULES = {"handler", "entities", "chatbot", "customer_chatbot"}
+
+# Loaded vertical handler modules, keyed by vertical name
+_handlers = {}
+_load_lock = threading.Lock()
+
+
+def _is_vertical_module(name):
+    return name in VERTICAL_MODULES or name == "shared" or name.startswith("shared.")
+
+
+def _vertical_config(vertical):
+    """A vertical's settings: its {VERTICAL}_* environment variables under their unprefixed names"""
+    prefix = f"{vertical.upper()}_"
+    return {key[len(prefix):]: value for key, value in os.environ.items() if key.startswith(prefix)}
+
+
+@contextmanager
+def _import_environment(config):
+    """Expose config as environment variables while a vertical's modules read their settings"""
+    saved = {key: os.environ.get(key) for key in config}
+    os.environ.update(config)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def _load_vertical(vertical):
+    """Import a vertical's handler module in its own module namespace, configured for that vertical"""
+    with _load_lock:
+        if vertical in _handlers:
+            return _handlers[vertical]
+
+        saved = {name: sys.modules.pop(name) for name in list(sys.modules) if _is_vertical_module(name)}
+        vertical_dir = os.path.join(LAMBDA_ROOT, vertical)
+        sys.path.insert(0, vertical_dir)
+        try:
+            with _import_environment(_vertical_config(vertical)):
+                module = importlib.import_module("handler")
+        finally:
+            sys.path.remove(vertical_dir)
+            # The vertical's modules stay reachable through its handler's globals
+            for name in [name for name in sys.modules if _is_vertical_module(name)]:
+                del sys.modules[name]
+            sys.modules.update(saved)
+
+        _handlers[vertical] = module
+        print(f"Gateway loaded vertical: {vertical}")
+        return module
+
+
+def _resolve_vertical(event):
+    """
+    Determine which vertical an invocation is for.
+
+    Order: async export jobs and queued chat jobs carry their vertical (each
+    vertical has its own chat job queue, so an SQS batch is for one vertical);
+    API Gateway stages set a "vertical" stage variable; otherwise fall back to
+    the Host header subdomain.
+    """
+    job = event.get("exportJob")
+    if job:
+        return job.get("vertical")
+
+    records = event.get("Records")
+    if records:
+        return json.loads(records[0]["body"]).get("chatJob", {}).get("vertical")
+
+    stage_variables = event.get("stageVariables") or {}
+    if stage_variables.get("vertical"):
+        return stage_variables["vertical"]
+
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    return detect_vertical(headers.get("host", ""))
+
+
+def handler(event, context):
+    """Route the invocation to the vertical's handler, loading it on first use"""
+    vertical = _resolve_vertical(event)
+    if vertical not in ENABLED_VERTICALS:
+        return _resp(404, {"error": "unknown_vertical", "vertical": vertical, "verticals": ENABLED_VERTICALS})
+
+    module = _handlers.get(vertical) or _load_vertical(vertical)
+    return module.handler(event, context)
@@ -1,14 +1,36 @@
 """Healthcare staff chatbot endpoint logic using AWS Bedrock"""
 import os
 import json
-import boto3
-from shared.responses import _resp, decimal_default
-
-
-# Initialize Bedrock client
-bedrock = boto3.client("bedrock-runtime", region_name=os.environ.get("BEDROCK_REGION", "us-east-1"))
+from shared.responses import _resp
+from shared.chat_engine import chat_events, chat_response
+from shared.chat_stream import wants_live_stream
+from shared.model_client import model_client
+from shared.chat_history import compact_history
+from shared.conversations import open_session, ConversationError
+from shared.chat_jobs import open_chat_job
+from shared.response_cache import open_response_cache
+from shared.status import StatusTracker
+from shared.deadline import Deadline
+from shared.memo import RequestMemo
+from shared.tool_registry import ToolRegistry, SearchTool, Contains, Equals
+from shared.intents import IntentParser
+from shared.vector_index import SemanticSearch
+from shared.aggregation import Aggregation
+from shared.storage import RequestCachedStorage
+
+
+# Model client (Bedrock, or a scripted stand-in when CHAT_MODEL_SCRIPT is set)
+bedrock = model_client()
 BEDROCK_MODEL_ID = os.environ.get("BEDROCK_MODEL_ID", "anthropic.claude-3-5-sonnet-20240620-v1:0")
 
+# Report aggregations: groupable and numeric fields per domain
+AGGREGATE = Aggregation({
+    "appointment": {"group_by": ["status", "appointmentType", "provider"]},
+    "prescription": {"group_by": ["status", "medication"], "numeric": ["refillsRemaining"]},
+    "billing": {"group_by": ["status"], "numeric": ["amount"]},
+    "case": {"group_by": ["status", "priority"]},
+})
+
 # Tool definitions for healthcare staff assistant
 TOOLS = [
     {
@@ -71,6 +93,22 @@ TOOLS = [
             }
         }
     },
+    {
+        "name": "semantic_search",
+        "description": "Find cases or billing records by meaning when keyword searches miss, e.g. \"patient cannot get a refill in time\". Searches case and billing descriptions",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "What the records are about, in plain words"},
+                "entity_type": {"type": "string", "enum": ["case", "billing"], "description": "Limit to one record type"},
+                "limit": {"type": "integer", "description": "Number of results (default 5, max 20)"}
+            },
+            "required": ["query"]
+        }
+    },
+    AGGREGATE.tool_definition(
+        "Counts and totals across all appointments, prescriptions, billing records or cases, grouped by a field, e.g. billing by status with total amount, or appointments per provider. Use for reports and \"how many\" / \"how much\" questions instead of paging through searches"
+    ),
     {
         "name": "get_entity_details",
         "description": "Get full details of a specific appointment, medical record, prescription, billing, or case by ID",
@@ -86,89 +124,60 @@ TOOLS = [
 ]
 
 
-def execute_tool(tool_name, tool_input, storage):
-    """Execute a tool call and return results"""
-    if tool_name == "search_appointments":
-        items = storage.scan("appointment")
-
-        # Filter by criteria
-        if tool_input.get("patient_name"):
-            name = tool_input["patient_name"].lower()
-            items = [i for i in items if name in i.get("data", {}).get("patientName", "").lower()]
-        if tool_input.get("date"):
-            date = tool_input["date"]
-            items = [i for i in items if date in i.get("data", {}).get("date", "")]
-        if tool_input.get("status"):
-            status = tool_input["status"]
-            items = [i for i in items if i.get("status") == status]
-
-        return {"results": items[:10], "count": len(items)}
-
-    elif tool_name == "search_medical_records":
-        items = storage.scan("medical_record")
-
-        # Filter by criteria
-        if tool_input.get("patient_name"):
-            name = tool_input["patient_name"].lower()
-            items = [i for i in items if name in i.get("data", {}).get("patientName", "").lower()]
-        if tool_input.get("record_type"):
-            record_type = tool_input["record_type"].lower()
-            items = [i for i in items if record_type in i.get("data", {}).get("recordType", "").lower()]
-        if tool_input.get("status"):
-            status = tool_input["status"]
-            items = [i for i in items if i.get("status") == status]
-
-        return {"results": items[:10], "count": len(items)}
-
-    elif tool_name == "search_prescriptions":
-        items = storage.scan("prescription")
-
-        # Filter by criteria
-        if tool_input.get("patient_name"):
-            name = tool_input["patient_name"].lower()
-            items = [i for i in items if name in i.get("data", {}).get("patientName", "").lower()]
-        if tool_input.get("medication"):
-            medication = tool_input["medication"].lower()
-            items = [i for i in items if medication in i.get("data", {}).get("medication", "").lower()]
-        if tool_input.get("status"):
-            status = tool_input["status"]
-            items = [i for i in items if i.get("status") == status]
+# Search tools: input-to-field mappings, match semantics and the columns sent to the model
+# (full records via get_entity_details); medical records and cases use the default projection
+SEARCH_TOOLS = ToolRegistry([
+    SearchTool(
+        "search_appointments", "appointment", "results",
+        {"patient_name": Contains("patientName"), "date": Contains("appointmentDate"), "status": Equals("status")},
+        columns=["id", "status", "patientName", "appointmentDate", "appointmentType", "provider"],
+    ),
+    SearchTool(
+        "search_medical_records", "medical_record", "results",
+        {"patient_name": Contains("patientName"), "record_type": Contains("recordType"), "status": Equals("status")},
+    ),
+    SearchTool(
+        "search_prescriptions", "prescription", "results",
+        {"patient_name": Contains("patientName"), "medication": Contains("medication"), "status": Equals("status")},
+        columns=["id", "status", "patientName", "medication", "dosage", "frequency", "refillsRemaining"],
+    ),
+    SearchTool(
+        "search_billing", "billing", "results",
+        {"patient_name": Contains("patientName"), "status": Equals("status")},
+        columns=["id", "status", "patientName", "serviceDate", "amount", "description"],
+    ),
+    SearchTool(
+        "search_cases", "case", "results",
+        {"title": Contains("title", "subject"), "patient_name": Contains("patientName"),
+         "priority": Equals("priority"), "status": Equals("status")},
+    ),
+])
+
+# Meaning-based search over free-text fields (embeddings indexed per domain)
+SEMANTIC_SEARCH = SemanticSearch({"case": ["subject", "title", "description"], "billing": ["description"]})
+RESULT_COLUMNS = {**SEARCH_TOOLS.result_columns(), "semantic_search": SEMANTIC_SEARCH.columns()}
+
+# Direct ID lookups answered from storage without the model (healthcare records only have UUIDs)
+INTENTS = IntentParser(
+    SEARCH_TOOLS,
+    id_lookups=[],
+    entity_tools={"appointment": "search_appointments", "medical_record": "search_medical_records",
+                  "prescription": "search_prescriptions", "billing": "search_billing", "case": "search_cases"},
+)
 
-        return {"results": items[:10], "count": len(items)}
 
-    elif tool_name == "search_billing":
-        items = storage.scan("billing")
-
-        # Filter by criteria
-        if tool_input.get("patient_name"):
-            name = tool_input["patient_name"].lower()
-            items = [i for i in items if name in i.get("data", {}).get("patientName", "").lower()]
-        if tool_input.get("status"):
-            status = tool_input["status"]
-            items = [i for i in items if i.get("status") == status]
-
-        return {"results": items[:10], "count": len(items)}
-
-    elif tool_name == "search_cases":
-        items = storage.scan("case")
+def execute_tool(tool_name, tool_input, storage):
+    """Execute a tool call and return results"""
+    if tool_name in SEARCH_TOOLS:
+        return SEARCH_TOOLS.run(tool_name, tool_input, storage)
 
-        # Filter by criteria
-        if tool_input.get("title"):
-            title_words = tool_input["title"].lower()
-            items = [i for i in items if title_words in i.get("data", {}).get("title", "").lower()]
-        if tool_input.get("patient_name"):
-            name = tool_input["patient_name"].lower()
-            items = [i for i in items if name in i.get("data", {}).get("patientName", "").lower()]
-        if tool_input.get("priority"):
-            priority = tool_input["priority"]
-            items = [i for i in items if i.get("data", {}).get("priority") == priority]
-        if tool_input.get("status"):
-            status = tool_input["status"]
-            items = [i for i in items if i.get("status") == status]
+    if tool_name == "semantic_search":
+        return SEMANTIC_SEARCH.run(storage, tool_input)
 
-        return {"results": items[:10], "count": len(items)}
+    if tool_name == "aggregate":
+        return AGGREGATE.run(storage, tool_input)
 
-    elif tool_name == "get_entity_details":
+    if tool_name == "get_entity_details":
         entity_type = tool_input["entity_type"]
         entity_id = tool_input["entity_id"]
         item = storage.get(entity_type, entity_id)
@@ -180,18 +189,33 @@ def execute_tool(tool_name, tool_input, storage):
     return {"error": "Unknown tool"}
 
 
-def handle_chat(event, storage):
+def handle_chat(event, storage, context=None):
     """Handle chatbot requests with tool use"""
     try:
         body = json.loads(event.get("body", "{}"))
         user_message = body.get("message", "")
-        conversation_history = body.get("history", [])
+        stream = bool(body.get("stream"))
 
         if not user_message:
             return _resp(400, {"error": "Message is required"})
 
-        # Build messages array
-        messages = conversation_history + [{"role": "user", "content": user_message}]
+        # Session mode: history is kept server-side and only the new turn is exchanged
+        session = open_session(body, owner="staff")
+        conversation_history = session.history if session else body.get("history", [])
+
+        # Opt-in answer cache for repeated first questions over unchanged data
+        cache = open_response_cache(body, user_message, conversation_history, session, storage.table_names)
+
+        status_tracker = StatusTracker()
+
+        # Request-scoped memo: identical tool calls and repeated table reads run once
+        memo = RequestMemo()
+        storage = RequestCachedStorage(storage, memo)
+        if cache:
+            storage = cache.track(storage)
+
+        # Build messages (old tool results compacted so long sessions stay within a token budget)
+        messages = compact_history(conversation_history, status_tracker=status_tracker) + [{"role": "user", "content": user_message}]
 
         # System prompt
         system_prompt = """You are a helpful healthcare staff assistant for Silvermoat Healthcare.
@@ -199,67 +223,33 @@ You can help staff search for appointments, medical records, prescriptions, bill
 Use the available tools to search and retrieve information when needed.
 Be professional, concise, and helpful in your responses."""
 
-        # Call Bedrock with tool use
-        response = bedrock.converse(
-            modelId=BEDROCK_MODEL_ID,
-            messages=messages,
-            system=[{"text": system_prompt}],
-            toolConfig={"tools": [{"toolSpec": tool} for tool in TOOLS]},
-            inferenceConfig={"maxTokens": 2000, "temperature": 0.7}
-        )
-
-        # Process response
-        output_message = response["output"]["message"]
-        stop_reason = response["stopReason"]
-
-        # Handle tool use
-        if stop_reason == "tool_use":
-            # Execute tools and get results
-            tool_results = []
-            for content_block in output_message["content"]:
-                if "toolUse" in content_block:
-                    tool_use = content_block["toolUse"]
-                    tool_name = tool_use["name"]
-                    tool_input = tool_use["input"]
-                    tool_use_id = tool_use["toolUseId"]
-
-                    # Execute tool
-                    result = execute_tool(tool_name, tool_input, storage)
-
-                    tool_results.append({
-                        "toolResult": {
-                            "toolUseId": tool_use_id,
-                            "content": [{"json": result}]
-                        }
-                    })
-
-            # Continue conversation with tool results
-            messages.append(output_message)
-            messages.append({"role": "user", "content": tool_results})
-
-            # Get final response
-            final_response = bedrock.converse(
-                modelId=BEDROCK_MODEL_ID,
-                messages=messages,
-                system=[{"text": system_prompt}],
-                toolConfig={"tools": [{"toolSpec": tool} for tool in TOOLS]},
-                inferenceConfig={"maxTokens": 2000, "temperature": 0.7}
+        # Direct ID lookups ("show claim CLM-1234-5678") are answered without the model
+        events = INTENTS.answer(user_message, messages, storage, status_tracker)
+        # Then a stored answer to the same first question, if the data it read is unchanged
+        cached = cache.lookup() if cache and events is None else None
+        if cached is not None:
+            events = cache.events(cached, messages, status_tracker)
+        elif events is None:
+            # Otherwise run the tool-use loop (NDJSON events when "stream" is requested)
+            events = chat_events(
+                bedrock, BEDROCK_MODEL_ID, system_prompt, messages, TOOLS,
+                lambda tool_name, tool_input: execute_tool(tool_name, tool_input, storage),
+                status_tracker, memo, max_tokens=2000, stream=stream,
+                result_columns=RESULT_COLUMNS, deadline=Deadline(context),
+                tool_domain=SEARCH_TOOLS.domain_of,
             )
-
-            output_message = final_response["output"]["message"]
-
-        # Extract text response
-        response_text = ""
-        for content_block in output_message["content"]:
-            if "text" in content_block:
-                response_text = content_block["text"]
-                break
-
-        return _resp(200, {
-            "response": response_text,
-            "history": messages
-        })
-
+            if cache:
+                events = cache.record(events)
+        if session:
+            events = session.record(events, len(messages) - 1)
+        # Chat job worker: status messages become the job's progress as they happen
+        job = open_chat_job(event)
+        if job:
+            events = job.record(events)
+        return chat_response(events, stream, live=wants_live_stream(event))
+
+    except ConversationError as e:
+        return _resp(e.status_code, {"error": e.error, "message": str(e)})
     except Exception as e:
         print(f"Error in chatbot handler: {str(e)}")
         return _resp(500, {"error": str(e)})
@@ -1,12 +1,22 @@
 """Healthcare patient chatbot endpoint logic using AWS Bedrock"""
 import os
 import json
-import boto3
-from shared.responses import _resp, decimal_default
-
-
-# Initialize Bedrock client
-bedrock = boto3.client("bedrock-runtime", region_name=os.environ.get("BEDROCK_REGION", "us-east-1"))
+from shared.responses import _resp
+from shared.chat_engine import chat_events, chat_response
+from shared.chat_stream import wants_live_stream
+from shared.model_client import model_client
+from shared.chat_history import compact_history
+from shared.conversations import open_session, ConversationError
+from shared.status import StatusTracker
+from shared.deadline import Deadline
+from shared.memo import RequestMemo
+from shared.customer_scope import resolve_customer
+from shared.tool_registry import ToolRegistry, SearchTool, Contains, Equals, OwnedBy, LinkedTo
+from shared.storage import RequestCachedStorage
+
+
+# Model client (Bedrock, or a scripted stand-in when CHAT_MODEL_SCRIPT is set)
+bedrock = model_client()
 BEDROCK_MODEL_ID = os.environ.get("BEDROCK_MODEL_ID", "anthropic.claude-3-5-sonnet-20240620-v1:0")
 
 # Tool definitions for patient-facing healthcare chatbot
@@ -57,34 +67,43 @@ CUSTOMER_TOOLS = [
 ]
 
 
-def execute_customer_tool(tool_name, tool_input, storage, patient_email):
-    """Execute a patient-scoped tool call and return results"""
-    # Get patient by email using GSI
-    patients = storage.query_by_email("patient", patient_email)
-    if not patients:
+# Search tools scoped to the signed-in patient: input-to-field mappings, match semantics
+# and the columns sent to the model (full appointments via get_appointment_details)
+SEARCH_TOOLS = ToolRegistry([
+    SearchTool(
+        "search_my_appointments", "appointment", "appointments",
+        {"date": Contains("appointmentDate"), "status": Equals("status")},
+        columns=["id", "status", "appointmentDate", "appointmentType", "provider"],
+        scope=OwnedBy(),    # Appointments store the patient id as customerId
+    ),
+    SearchTool(
+        "search_my_prescriptions", "prescription", "prescriptions",
+        {"medication": Contains("medication"), "status": Equals("status")},
+        columns=["id", "status", "medication", "dosage", "frequency", "prescribedDate", "refillsRemaining"],
+        scope=OwnedBy(),
+    ),
+    SearchTool(
+        "view_billing", "billing", "billing",
+        {"status": Equals("status")},
+        columns=["id", "status", "serviceDate", "amount", "description"],
+        scope=LinkedTo("medical_record", "medicalRecordId"),   # Bills reference the patient's medical records
+    ),
+])
+RESULT_COLUMNS = SEARCH_TOOLS.result_columns()
+
+# Patient items prefetched once per request (patient ids are stored as customerId)
+OWNED_DOMAINS = ["appointment", "prescription", "medical_record"]
+
+
+def execute_customer_tool(tool_name, tool_input, storage, patient):
+    """Execute a tool call scoped to the request's CustomerScope (the patient) and return results"""
+    if not patient:
         return {"error": "Patient record not found"}
 
-    patient = patients[0]
-    patient_id = patient["id"]
-
-    if tool_name == "search_my_appointments":
-        # Note: appointments use customerId in GSI even though we call it patientId
-        # Query appointments by patientId (stored as customerId in DynamoDB)
-        items = storage.query_by_customer_id("appointment", patient_id)
-
-        print(f"[DEBUG] search_my_appointments: patient_id='{patient_id}', total_appointments={len(items)}")
-
-        # Filter by additional criteria
-        if tool_input.get("date"):
-            date = tool_input["date"]
-            items = [i for i in items if date in i.get("data", {}).get("date", "")]
-        if tool_input.get("status"):
-            items = [i for i in items if tool_input["status"] == i.get("status")]
-            print(f"[DEBUG] After status filter ({tool_input['status']}): {len(items)} appointments")
+    if tool_name in SEARCH_TOOLS:
+        return SEARCH_TOOLS.run(tool_name, tool_input, storage, customer=patient)
 
-        return {"appointments": items[:10], "count": len(items)}
-
-    elif tool_name == "get_appointment_details":
+    if tool_name == "get_appointment_details":
         appointment_id = tool_input["appointment_id"]
         item = storage.get("appointment", appointment_id)
 
@@ -92,53 +111,21 @@ def execute_customer_tool(tool_name, tool_input, storage, patient_email):
             return {"error": "Appointment not found"}
 
         # Verify ownership (check both patientId and customerId for compatibility)
-        if item.get("data", {}).get("patientId") != patient_id and item.get("customerId") != patient_id:
+        if item.get("data", {}).get("patientId") != patient.customer_id and not patient.owns("appointment", appointment_id):
             return {"error": "Access denied"}
 
         return {"appointment": item}
 
-    elif tool_name == "search_my_prescriptions":
-        # Query prescriptions by patientId (stored as customerId in DynamoDB)
-        items = storage.query_by_customer_id("prescription", patient_id)
-
-        print(f"[DEBUG] search_my_prescriptions: patient_id='{patient_id}', total_prescriptions={len(items)}")
-
-        # Filter by criteria
-        if tool_input.get("medication"):
-            medication = tool_input["medication"].lower()
-            items = [i for i in items if medication in i.get("data", {}).get("medication", "").lower()]
-        if tool_input.get("status"):
-            items = [i for i in items if tool_input["status"] == i.get("status")]
-
-        return {"prescriptions": items[:10], "count": len(items)}
-
-    elif tool_name == "view_billing":
-        # Get all medical records for this patient first
-        medical_records = storage.query_by_customer_id("medical_record", patient_id)
-        medical_record_ids = [mr["id"] for mr in medical_records]
-
-        # Get all billing records and filter by medical record IDs
-        all_billing = storage.scan("billing")
-        items = [b for b in all_billing if b.get("data", {}).get("medicalRecordId") in medical_record_ids]
-
-        print(f"[DEBUG] view_billing: patient_id='{patient_id}', total_billing={len(items)}")
-
-        # Filter by status
-        if tool_input.get("status"):
-            items = [i for i in items if tool_input["status"] == i.get("status")]
-
-        return {"billing": items[:10], "count": len(items)}
-
     return {"error": "Unknown tool"}
 
 
-def handle_customer_chat(event, storage):
+def handle_customer_chat(event, storage, context=None):
     """Handle patient chatbot requests with tool use"""
     try:
         body = json.loads(event.get("body", "{}"))
         user_message = body.get("message", "")
         patient_email = body.get("customerEmail", "")  # Using customerEmail for consistency
-        conversation_history = body.get("history", [])
+        stream = bool(body.get("stream"))
 
         if not user_message:
             return _resp(400, {"error": "Message is required"})
@@ -146,8 +133,21 @@ def handle_customer_chat(event, storage):
         if not patient_email:
             return _resp(400, {"error": "Patient email is required"})
 
-        # Build messages array
-        messages = conversation_history + [{"role": "user", "content": user_message}]
+        # Session mode: history is kept server-side and only the new turn is exchanged
+        session = open_session(body, owner=patient_email)
+        conversation_history = session.history if session else body.get("history", [])
+
+        status_tracker = StatusTracker()
+
+        # Request-scoped memo: identical tool calls and repeated table reads run once
+        memo = RequestMemo()
+        storage = RequestCachedStorage(storage, memo)
+
+        # Resolve the patient once for every tool call in this request
+        patient = resolve_customer(storage, patient_email, OWNED_DOMAINS, customer_domain="patient")
+
+        # Build messages (old tool results compacted so long sessions stay within a token budget)
+        messages = compact_history(conversation_history, status_tracker=status_tracker) + [{"role": "user", "content": user_message}]
 
         # System prompt
         system_prompt = f"""You are a helpful patient assistant for Silvermoat Healthcare.
@@ -157,67 +157,20 @@ Use the available tools to search and retrieve information when needed.
 Be empathetic, professional, and helpful in your responses.
 Remember to protect patient privacy and only show information for this specific patient."""
 
-        # Call Bedrock with tool use
-        response = bedrock.converse(
-            modelId=BEDROCK_MODEL_ID,
-            messages=messages,
-            system=[{"text": system_prompt}],
-            toolConfig={"tools": [{"toolSpec": tool} for tool in CUSTOMER_TOOLS]},
-            inferenceConfig={"maxTokens": 2000, "temperature": 0.7}
+        # Run the tool-use loop (NDJSON events when "stream" is requested)
+        events = chat_events(
+            bedrock, BEDROCK_MODEL_ID, system_prompt, messages, CUSTOMER_TOOLS,
+            lambda tool_name, tool_input: execute_customer_tool(tool_name, tool_input, storage, patient),
+            status_tracker, memo, max_tokens=2000, stream=stream,
+            result_columns=RESULT_COLUMNS, deadline=Deadline(context),
+            tool_domain=SEARCH_TOOLS.domain_of,
         )
+        if session:
+            events = session.record(events, len(messages) - 1)
+        return chat_response(events, stream, live=wants_live_stream(event))
 
-        # Process response
-        output_message = response["output"]["message"]
-        stop_reason = response["stopReason"]
-
-        # Handle tool use
-        if stop_reason == "tool_use":
-            # Execute tools and get results
-            tool_results = []
-            for content_block in output_message["content"]:
-                if "toolUse" in content_block:
-                    tool_use = content_block["toolUse"]
-                    tool_name = tool_use["name"]
-                    tool_input = tool_use["input"]
-                    tool_use_id = tool_use["toolUseId"]
-
-                    # Execute tool with patient email scope
-                    result = execute_customer_tool(tool_name, tool_input, storage, patient_email)
-
-                    tool_results.append({
-                        "toolResult": {
-                            "toolUseId": tool_use_id,
-                            "content": [{"json": result}]
-                        }
-                    })
-
-            # Continue conversation with tool results
-            messages.append(output_message)
-            messages.append({"role": "user", "content": tool_results})
-
-            # Get final response
-            final_response = bedrock.converse(
-                modelId=BEDROCK_MODEL_ID,
-                messages=messages,
-                system=[{"text": system_prompt}],
-                toolConfig={"tools": [{"toolSpec": tool} for tool in CUSTOMER_TOOLS]},
-                inferenceConfig={"maxTokens": 2000, "temperature": 0.7}
-            )
-
-            output_message = final_response["output"]["message"]
-
-        # Extract text response
-        response_text = ""
-        for content_block in output_message["content"]:
-            if "text" in content_block:
-                response_text = content_block["text"]
-                break
-
-        return _resp(200, {
-            "response": response_text,
-            "history": messages
-        })
-
+    except ConversationError as e:
+        return _resp(e.status_code, {"error": e.error, "message": str(e)})
     except Exception as e:
         print(f"Error in patient chatbot handler: {str(e)}")
         return _resp(500, {"error": str(e)})
@@ -1,9 +1,16 @@
 """Healthcare vertical API handler - Complete standalone Lambda function"""
 import os
 import json
+import uuid
 from shared.responses import _resp
 from shared.events import _emit
+from shared.batch import handle_batch
+from shared.bulk_import import handle_import
+from shared.idempotency import with_idempotency
+from shared.bulk_export import start_export, get_export, run_export_job
+from shared.chat_jobs import wants_chat_job, start_chat_job, get_chat_job, handle_chat_job_records
 from shared.storage import DynamoDBBackend
+from shared.response_cache import bump_version
 from entities import (
     upsert_patient_for_appointment,
     upsert_patient_for_medical_record,
@@ -30,15 +37,113 @@ HEALTHCARE_DOMAIN_MAPPING = {
 }
 
 # Initialize storage backend with healthcare domain mapping
-storage = DynamoDBBackend(domain_mapping=HEALTHCARE_DOMAIN_MAPPING)
+storage = DynamoDBBackend(domain_mapping=HEALTHCARE_DOMAIN_MAPPING, on_write=bump_version)
 
 
 # Healthcare entities (domains)
 HEALTHCARE_ENTITIES = ["patient", "appointment", "medical_record", "prescription", "billing", "case"]
 
+# Initial status for newly created items, per domain
+HEALTHCARE_DEFAULT_STATUS = {
+    "patient": "ACTIVE",
+    "appointment": "SCHEDULED",
+    "medical_record": "ACTIVE",
+    "prescription": "ACTIVE",
+    "billing": "PENDING",
+    "case": "OPEN"
+}
+
+
+def denormalize(domain, body):
+    """
+    Upsert the patient a new appointment, medical record or prescription refers to and copy its id into the body.
+
+    Returns:
+        Top-level fields (GSI keys) for the new item
+    """
+    top_level_fields = {}
+
+    # Handle patient upsert for appointment
+    if domain == "appointment":
+        patient_id = upsert_patient_for_appointment(storage, body)
+        if patient_id:
+            body["patientId"] = patient_id
+
+    # Handle patient upsert for medical_record
+    elif domain == "medical_record":
+        patient_id = upsert_patient_for_medical_record(storage, body)
+        if patient_id:
+            body["patientId"] = patient_id
+            top_level_fields["customerId"] = patient_id  # GSI field name
+
+    # Handle prescription with patient denormalization
+    elif domain == "prescription":
+        # Denormalize patientId from medical_record
+        medical_record_id = body.get("medicalRecordId")
+        if medical_record_id:
+            patient_id = get_patient_id_from_medical_record(storage, medical_record_id)
+            if patient_id:
+                body["patientId"] = patient_id
+                top_level_fields["customerId"] = patient_id  # GSI field name
+
+    return top_level_fields
+
+
+def prepare_import(domain):
+    """
+    Bulk import counterpart of create_entity for one domain.
+
+    Patients keep their email top-level (the email GSI); a record whose
+    email already belongs to a patient, stored or earlier in the same
+    import, replaces that patient instead of adding a second one. Other
+    records are denormalized like creates.
+    """
+    customer_ids = {}   # email -> id, for patients not written yet
+
+    def prepare(body):
+        if domain == "patient":
+            customer_email = body.pop("email", None)
+            if not customer_email:
+                return {}
+            if customer_email not in customer_ids:
+                existing = storage.query_by_email("patient", customer_email)
+                customer_ids[customer_email] = existing[0]["id"] if existing else str(uuid.uuid4())
+            return {"email": customer_email, "id": customer_ids[customer_email]}
+        return denormalize(domain, body)
+    return prepare
+
+
+def create_entity(domain, body):
+    """Create an entity in a healthcare domain, upserting and denormalizing related records"""
+    # Add default status based on domain type
+    default_status = HEALTHCARE_DEFAULT_STATUS.get(domain, "PENDING")
+
+    # Handle patient creation/upsert
+    if domain == "patient":
+        # Use upsert_customer for proper email indexing
+        patient_email = body.get("email")
+        if patient_email:
+            item = storage.upsert_customer(patient_email, body)
+        else:
+            item = storage.create(domain, body, default_status)
+
+    else:
+        item = storage.create(domain, body, default_status, denormalize(domain, body))
+
+    _emit(f"{domain}.created", {"id": item["id"], "data": body, "status": default_status})
+    return _resp(201, {"id": item["id"], "item": item})
+
 
 def handler(event, context):
     """Main Lambda handler for Healthcare vertical API"""
+    # Asynchronous export job (self-invoked by POST /{domain}/export)
+    if "exportJob" in event:
+        return run_export_job(event["exportJob"], storage, context)
+
+    # Chat job worker (SQS messages queued by POST /chat with "async": true)
+    if "Records" in event:
+        return handle_chat_job_records(event, handle_healthcare_chat, storage, context)
+
     path = (event.get("path") or "/").strip("/")
     method = (event.get("httpMethod") or "GET").upper()
 
@@ -46,13 +151,23 @@ def handler(event, context):
     if method == "OPTIONS":
         return _resp(200, {"message": "CORS preflight"})
 
-    # POST /chat -> chatbot endpoint
+    # POST /chat -> chatbot endpoint ("async": true queues a chat job instead)
     if path == "chat" and method == "POST":
-        return handle_healthcare_chat(event, storage)
+        if wants_chat_job(event):
+            return start_chat_job(event, handle_healthcare_chat, storage, context)
+        return handle_healthcare_chat(event, storage, context)
+
+    # GET /chat/{jobId} -> async chat job status, progress and result
+    if path.startswith("chat/") and method == "GET":
+        return get_chat_job(path[len("chat/"):])
 
     # POST /customer-chat -> customer chatbot endpoint (patient chat)
     if path == "customer-chat" and method == "POST":
-        return handle_healthcare_customer_chat(event, storage)
+        return handle_healthcare_customer_chat(event, storage, context)
+
+    # POST /batch -> run several API requests in one round trip
+    if path == "batch" and method == "POST":
+        return handle_batch(event, context, handler)
 
     # Parse request body (needed by all endpoints)
     body = {}
@@ -69,7 +184,7 @@ def handler(event, context):
         return _resp(200, {
             "name": "Silvermoat Healthcare",
             "vertical": "healthcare",
-            "endpoints": [f"/{e}" for e in HEALTHCARE_ENTITIES] + ["/chat", "/customer-chat"]
+            "endpoints": [f"/{e}" for e in HEALTHCARE_ENTITIES] + ["/chat", "/customer-chat", "/batch"]
         })
 
     domain = parts[0]
@@ -120,60 +235,22 @@ def handler(event, context):
 
         return _resp(200, {"items": items, "count": len(items)})
 
-    # POST /{domain} -> create
+    # POST /{domain} -> create (retries with the same Idempotency-Key replay the first response)
     if method == "POST" and len(parts) == 1:
-        # Add default status based on domain type
-        default_status = {
-            "patient": "ACTIVE",
-            "appointment": "SCHEDULED",
-            "medical_record": "ACTIVE",
-            "prescription": "ACTIVE",
-            "billing": "PENDING",
-            "case": "OPEN"
-        }.get(domain, "PENDING")
-
-        # Handle patient creation/upsert
-        if domain == "patient":
-            # Use upsert_customer for proper email indexing
-            patient_email = body.get("email")
-            if patient_email:
-                item = storage.upsert_customer(patient_email, body)
-            else:
-                item = storage.create(domain, body, default_status)
-
-        # Handle patient upsert for appointment
-        elif domain == "appointment":
-            patient_id = upsert_patient_for_appointment(storage, body)
-            if patient_id:
-                body["patientId"] = patient_id
-            item = storage.create(domain, body, default_status)
+        return with_idempotency(event, f"{domain}.create", lambda: create_entity(domain, body))
 
-        # Handle patient upsert for medical_record
-        elif domain == "medical_record":
-            patient_id = upsert_patient_for_medical_record(storage, body)
-            top_level_fields = {}
-            if patient_id:
-                body["patientId"] = patient_id
-                top_level_fields["customerId"] = patient_id  # GSI field name
-            item = storage.create(domain, body, default_status, top_level_fields)
-
-        # Handle prescription with patient denormalization
-        elif domain == "prescription":
-            # Denormalize patientId from medical_record
-            medical_record_id = body.get("medicalRecordId")
-            top_level_fields = {}
-            if medical_record_id:
-                patient_id = get_patient_id_from_medical_record(storage, medical_record_id)
-                if patient_id:
-                    body["patientId"] = patient_id
-                    top_level_fields["customerId"] = patient_id  # GSI field name
-            item = storage.create(domain, body, default_status, top_level_fields)
+    # POST /{domain}/import -> streaming NDJSON bulk import (resumable via checkpoint)
+    if method == "POST" and len(parts) == 2 and parts[1] == "import":
+        return handle_import(event, context, storage, domain, HEALTHCARE_DEFAULT_STATUS.get(domain, "PENDING"),
+                             prepare_import(domain))
 
-        else:
-            item = storage.create(domain, body, default_status)
+    # POST /{domain}/export -> start async gzip NDJSON export to the docs bucket
+    if method == "POST" and len(parts) == 2 and parts[1] == "export":
+        return start_export(event, domain, storage)
 
-        _emit(f"{domain}.created", {"id": item["id"], "data": body, "status": default_status})
-        return _resp(201, {"id": item["id"], "item": item})
+    # GET /{domain}/export/{jobId} -> export job status and download URL
+    if method == "GET" and len(parts) == 3 and parts[1] == "export":
+        return get_export(domain, parts[2])
 
     # GET /{domain}/{id} -> read
     if method == "GET" and len(parts) == 2:
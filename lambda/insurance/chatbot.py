@@ -1,15 +1,37 @@
 """Chatbot endpoint logic using AWS Bedrock"""
 import os
 import json
-import boto3
-from shared.responses import _resp, decimal_default
-from shared.storage import DynamoDBBackend
-
-
-# Initialize Bedrock client
-bedrock = boto3.client("bedrock-runtime", region_name=os.environ.get("BEDROCK_REGION", "us-east-1"))
+from shared.responses import _resp
+from shared.chat_engine import chat_events, chat_response
+from shared.chat_stream import wants_live_stream
+from shared.model_client import model_client
+from shared.chat_history import compact_history
+from shared.conversations import open_session, ConversationError
+from shared.chat_jobs import open_chat_job
+from shared.response_cache import open_response_cache
+from shared.status import StatusTracker
+from shared.deadline import Deadline
+from shared.memo import RequestMemo
+from shared.tool_registry import ToolRegistry, SearchTool, Contains, Equals
+from shared.intents import IntentParser
+from shared.vector_index import SemanticSearch
+from shared.aggregation import Aggregation
+from shared.storage import DynamoDBBackend, RequestCachedStorage
+
+
+# Model client (Bedrock, or a scripted stand-in when CHAT_MODEL_SCRIPT is set)
+bedrock = model_client()
 BEDROCK_MODEL_ID = os.environ.get("BEDROCK_MODEL_ID", "anthropic.claude-3-5-sonnet-20240620-v1:0")
 
+# Report aggregations: groupable and numeric fields per domain
+AGGREGATE = Aggregation({
+    "policy": {"group_by": ["status"], "numeric": ["coverageAmount", "premium"]},
+    "claim": {"group_by": ["status", "lossType"], "numeric": ["amount"]},
+    "quote": {"group_by": ["status", "propertyType"], "numeric": ["coverageAmount"]},
+    "payment": {"group_by": ["status", "paymentMethod"], "numeric": ["amount"]},
+    "case": {"group_by": ["status", "priority", "topic", "assignee"]},
+})
+
 # Tool definitions for Claude
 TOOLS = [
     {
@@ -71,6 +93,22 @@ TOOLS = [
             }
         }
     },
+    {
+        "name": "semantic_search",
+        "description": "Find claims or cases by meaning when keyword searches miss, e.g. \"water leaking through the ceiling\" or \"customer unhappy with settlement delay\". Searches claim and case descriptions",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "What the records are about, in plain words"},
+                "entity_type": {"type": "string", "enum": ["claim", "case"], "description": "Limit to one record type"},
+                "limit": {"type": "integer", "description": "Number of results (default 5, max 20)"}
+            },
+            "required": ["query"]
+        }
+    },
+    AGGREGATE.tool_definition(
+        "Counts and totals across all quotes, policies, claims, payments or cases, grouped by a field, e.g. claims by status with total and average amount, or premium by policy status. Use for reports and \"how many\" / \"how much\" questions instead of paging through searches"
+    ),
     {
         "name": "get_entity_details",
         "description": "Get full details of a specific quote, policy, claim, payment, or case by ID",
@@ -86,80 +124,65 @@ TOOLS = [
 ]
 
 
-def execute_tool(tool_name, tool_input, storage):
-    """Execute a tool call and return results"""
-
-    if tool_name == "search_quotes":
-        items = storage.scan("quote")
-
-        # Filter by name or zip if provided
-        if tool_input.get("name"):
-            name_lower = tool_input["name"].lower()
-            items = [i for i in items if name_lower in i.get("data", {}).get("name", "").lower()]
-        if tool_input.get("zip"):
-            items = [i for i in items if tool_input["zip"] == i.get("data", {}).get("zip")]
-
-        return {"quotes": items[:10], "count": len(items)}
-
-    elif tool_name == "search_policies":
-        items = storage.scan("policy")
-
-        # Filter by criteria
-        if tool_input.get("policy_number"):
-            pn = tool_input["policy_number"].lower()
-            items = [i for i in items if pn in i.get("data", {}).get("policyNumber", "").lower()]
-        if tool_input.get("holder_name"):
-            hn = tool_input["holder_name"].lower()
-            items = [i for i in items if hn in i.get("data", {}).get("holderName", "").lower()]
-        if tool_input.get("status"):
-            items = [i for i in items if tool_input["status"] == i.get("status")]
-
-        return {"policies": items[:10], "count": len(items)}
+# Search tools: input-to-field mappings, match semantics and the columns sent to the model
+# (full records via get_entity_details)
+SEARCH_TOOLS = ToolRegistry([
+    SearchTool(
+        "search_quotes", "quote", "quotes",
+        {"name": Contains("customerName"), "zip": Contains("propertyAddress")},
+        columns=["id", "status", "customerName", "customerEmail", "propertyType", "coverageAmount", "propertyAddress"],
+    ),
+    SearchTool(
+        "search_policies", "policy", "policies",
+        {"policy_number": Contains("policyNumber"), "holder_name": Contains("holderName"), "status": Equals("status")},
+        columns=["id", "status", "policyNumber", "holderName", "coverageAmount", "premium", "effectiveDate", "expirationDate"],
+    ),
+    SearchTool(
+        "search_claims", "claim", "claims",
+        {"claim_number": Contains("claimNumber"), "claimant_name": Contains("claimantName"), "status": Equals("status")},
+        columns=["id", "status", "claimNumber", "claimantName", "lossType", "amount", "incidentDate", "policyId"],
+    ),
+    SearchTool(
+        "search_payments", "payment", "payments",
+        {"policyId": Equals("policyId"), "status": Equals("status")},
+        columns=["id", "status", "policyId", "amount", "paymentMethod", "createdAt"],
+    ),
+    SearchTool(
+        "search_cases", "case", "cases",
+        {"title": Contains("title"), "assignee": Contains("assignee"), "priority": Equals("priority"), "status": Equals("status")},
+        columns=["id", "status", "title", "priority", "assignee", "topic"],
+    ),
+])
+
+# Meaning-based search over free-text fields (embeddings indexed per domain)
+SEMANTIC_SEARCH = SemanticSearch({"claim": ["lossType", "description"], "case": ["title", "description"]})
+RESULT_COLUMNS = {**SEARCH_TOOLS.result_columns(), "semantic_search": SEMANTIC_SEARCH.columns()}
+
+# Direct ID lookups answered from storage without the model
+INTENTS = IntentParser(
+    SEARCH_TOOLS,
+    id_lookups=[
+        (r"POL-\d{4}-\d{4}", "search_policies", "policy_number"),
+        (r"CLM-\d{4}-\d{4}", "search_claims", "claim_number"),
+    ],
+    entity_tools={"quote": "search_quotes", "policy": "search_policies", "claim": "search_claims",
+                  "payment": "search_payments", "case": "search_cases"},
+)
 
-    elif tool_name == "search_claims":
-        items = storage.scan("claim")
 
-        # Filter by criteria
-        if tool_input.get("claim_number"):
-            cn = tool_input["claim_number"].lower()
-            items = [i for i in items if cn in i.get("data", {}).get("claimNumber", "").lower()]
-        if tool_input.get("claimant_name"):
-            cn = tool_input["claimant_name"].lower()
-            items = [i for i in items if cn in i.get("data", {}).get("claimantName", "").lower()]
-        if tool_input.get("status"):
-            items = [i for i in items if tool_input["status"] == i.get("status")]
-
-        return {"claims": items[:10], "count": len(items)}
-
-    elif tool_name == "search_payments":
-        items = storage.scan("payment")
-
-        # Filter by criteria
-        if tool_input.get("policyId"):
-            items = [i for i in items if tool_input["policyId"] == i.get("data", {}).get("policyId")]
-        if tool_input.get("status"):
-            items = [i for i in items if tool_input["status"] == i.get("status")]
-
-        return {"payments": items[:10], "count": len(items)}
+def execute_tool(tool_name, tool_input, storage):
+    """Execute a tool call and return results"""
 
-    elif tool_name == "search_cases":
-        items = storage.scan("case")
+    if tool_name in SEARCH_TOOLS:
+        return SEARCH_TOOLS.run(tool_name, tool_input, storage)
 
-        # Filter by criteria
-        if tool_input.get("title"):
-            title = tool_input["title"].lower()
-            items = [i for i in items if title in i.get("data", {}).get("title", "").lower()]
-        if tool_input.get("assignee"):
-            assignee = tool_input["assignee"].lower()
-            items = [i for i in items if assignee in i.get("data", {}).get("assignee", "").lower()]
-        if tool_input.get("priority"):
-            items = [i for i in items if tool_input["priority"] == i.get("data", {}).get("priority")]
-        if tool_input.get("status"):
-            items = [i for i in items if tool_input["status"] == i.get("status")]
+    if tool_name == "semantic_search":
+        return SEMANTIC_SEARCH.run(storage, tool_input)
 
-        return {"cases": items[:10], "count": len(items)}
+    if tool_name == "aggregate":
+        return AGGREGATE.run(storage, tool_input)
 
-    elif tool_name == "get_entity_details":
+    if tool_name == "get_entity_details":
         entity_type = tool_input["entity_type"]
         entity_id = tool_input["entity_id"]
 
@@ -172,94 +195,64 @@ def execute_tool(tool_name, tool_input, storage):
     return {"error": "Unknown tool"}
 
 
-def handle_chat(event, storage):
+def handle_chat(event, storage, context=None):
     """Handle POST /chat endpoint"""
     try:
         body = json.loads(event.get("body", "{}"))
         user_message = body.get("message", "")
-        conversation_history = body.get("history", [])
+        stream = bool(body.get("stream"))
 
         if not user_message:
             return _resp(400, {"error": "message_required", "message": "Message is required"})
 
-        # Build messages for Claude
-        messages = conversation_history + [{"role": "user", "content": user_message}]
-
-        # System prompt for insurance assistant
-        system_prompt = "You are a helpful AI assistant for Silvermoat Insurance employees. You help employees search customer data, fill forms, and generate reports. When users ask about customers, policies, or claims, use the available tools to search the database. Be professional, concise, and accurate. Format data clearly for insurance context. When helping with forms, provide structured data that can pre-fill form fields."
-
-        # Invoke Bedrock with tool use
-        response = bedrock.invoke_model(
-            modelId=BEDROCK_MODEL_ID,
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 4096,
-                "system": system_prompt,
-                "messages": messages,
-                "tools": TOOLS,
-                "temperature": 0.7
-            })
-        )
-
-        response_body = json.loads(response["body"].read())
+        # Session mode: history is kept server-side and only the new turn is exchanged
+        session = open_session(body, owner="staff")
+        conversation_history = session.history if session else body.get("history", [])
 
-        # Handle tool use loop
-        while response_body.get("stop_reason") == "tool_use":
-            # Extract tool calls
-            assistant_message = {
-                "role": "assistant",
-                "content": response_body["content"]
-            }
-            messages.append(assistant_message)
+        # Opt-in answer cache for repeated first questions over unchanged data
+        cache = open_response_cache(body, user_message, conversation_history, session, storage.table_names)
 
-            # Execute tools
-            tool_results = []
-            for content_block in response_body["content"]:
-                if content_block["type"] == "tool_use":
-                    tool_name = content_block["name"]
-                    tool_input = content_block["input"]
-                    tool_use_id = content_block["id"]
+        status_tracker = StatusTracker()
 
-                    # Execute the tool
-                    result = execute_tool(tool_name, tool_input, storage)
+        # Request-scoped memo: identical tool calls and repeated table reads run once
+        memo = RequestMemo()
+        storage = RequestCachedStorage(storage, memo)
+        if cache:
+            storage = cache.track(storage)
 
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": tool_use_id,
-                        "content": json.dumps(result, default=decimal_default)
-                    })
+        # Build messages (old tool results compacted so long sessions stay within a token budget)
+        messages = compact_history(conversation_history, status_tracker=status_tracker) + [{"role": "user", "content": user_message}]
 
-            # Send tool results back to Claude
-            messages.append({
-                "role": "user",
-                "content": tool_results
-            })
+        # System prompt for insurance assistant
+        system_prompt = "You are a helpful AI assistant for Silvermoat Insurance employees. You help employees search customer data, fill forms, and generate reports. When users ask about customers, policies, or claims, use the available tools to search the database. Be professional, concise, and accurate. Format data clearly for insurance context. When helping with forms, provide structured data that can pre-fill form fields."
 
-            # Continue conversation
-            response = bedrock.invoke_model(
-                modelId=BEDROCK_MODEL_ID,
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 4096,
-                    "system": system_prompt,
-                    "messages": messages,
-                    "tools": TOOLS,
-                    "temperature": 0.7
-                })
+        # Direct ID lookups ("show claim CLM-1234-5678") are answered without the model
+        events = INTENTS.answer(user_message, messages, storage, status_tracker)
+        # Then a stored answer to the same first question, if the data it read is unchanged
+        cached = cache.lookup() if cache and events is None else None
+        if cached is not None:
+            events = cache.events(cached, messages, status_tracker)
+        elif events is None:
+            # Otherwise run the tool-use loop (NDJSON events when "stream" is requested)
+            events = chat_events(
+                bedrock, BEDROCK_MODEL_ID, system_prompt, messages, TOOLS,
+                lambda tool_name, tool_input: execute_tool(tool_name, tool_input, storage),
+                status_tracker, memo, stream=stream,
+                result_columns=RESULT_COLUMNS, deadline=Deadline(context),
+                tool_domain=SEARCH_TOOLS.domain_of,
             )
-
-            response_body = json.loads(response["body"].read())
-
-        # Extract final response
-        assistant_content = response_body["content"]
-        text_content = next((block["text"] for block in assistant_content if block["type"] == "text"), "")
-
-        return _resp(200, {
-            "response": text_content,
-            "usage": response_body.get("usage", {}),
-            "conversation": messages + [{"role": "assistant", "content": assistant_content}]
-        })
-
+            if cache:
+                events = cache.record(events)
+        if session:
+            events = session.record(events, len(messages) - 1)
+        # Chat job worker: status messages become the job's progress as they happen
+        job = open_chat_job(event)
+        if job:
+            events = job.record(events)
+        return chat_response(events, stream, live=wants_live_stream(event))
+
+    except ConversationError as e:
+        return _resp(e.status_code, {"error": e.error, "message": str(e)})
     except Exception as e:
         print(f"Chat error: {str(e)}")
         return _resp(500, {"error": "chat_error", "message": str(e)})
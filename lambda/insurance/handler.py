@@ -1,10 +1,17 @@
 """Insurance vertical API handler - Complete standalone Lambda function"""
 import os
 import json
+import uuid
 import boto3
 from shared.responses import _resp
 from shared.events import _emit
+from shared.batch import handle_batch
+from shared.bulk_import import handle_import
+from shared.idempotency import with_idempotency
+from shared.bulk_export import start_export, get_export, run_export_job
+from shared.chat_jobs import wants_chat_job, start_chat_job, get_chat_job, handle_chat_job_records
 from shared.storage import DynamoDBBackend
+from shared.response_cache import bump_version
 from entities import (
     upsert_customer_for_quote,
     upsert_customer_for_policy,
@@ -15,7 +22,7 @@ from customer_chatbot import handle_customer_chat as handle_insurance_customer_c
 
 
 # Initialize storage backend
-storage = DynamoDBBackend()
+storage = DynamoDBBackend(on_write=bump_version)
 
 # S3 client for document uploads
 s3 = boto3.client("s3")
@@ -25,9 +32,107 @@ DOCS_BUCKET = os.environ["DOCS_BUCKET"]
 # Insurance entities (domains)
 INSURANCE_ENTITIES = ["customer", "quote", "policy", "claim", "payment", "case"]
 
+# Initial status for newly created items, per domain
+INSURANCE_DEFAULT_STATUS = {
+    "customer": "ACTIVE",
+    "quote": "PENDING",
+    "policy": "ACTIVE",
+    "claim": "PENDING",
+    "payment": "PENDING",
+    "case": "OPEN"
+}
+
+
+def denormalize(domain, body):
+    """
+    Upsert the customer a new quote, policy or claim refers to and copy its id into the body.
+
+    Returns:
+        Top-level fields (GSI keys) for the new item
+    """
+    top_level_fields = {}
+
+    # Handle customer upsert for quote
+    if domain == "quote":
+        customer_id = upsert_customer_for_quote(storage, body)
+        if customer_id:
+            body["customerId"] = customer_id
+
+    # Handle customer upsert for policy
+    elif domain == "policy":
+        customer_id = upsert_customer_for_policy(storage, body)
+        if customer_id:
+            body["customerId"] = customer_id
+            top_level_fields["customerId"] = customer_id
+
+    # Handle claim with customer denormalization
+    elif domain == "claim":
+        # Denormalize customerId from policy
+        policy_id = body.get("policyId")
+        if policy_id:
+            customer_id = get_customer_id_from_policy(storage, policy_id)
+            if customer_id:
+                body["customerId"] = customer_id
+                top_level_fields["customerId"] = customer_id
+
+    return top_level_fields
+
+
+def prepare_import(domain):
+    """
+    Bulk import counterpart of create_entity for one domain.
+
+    Customers keep their email top-level (the email GSI); a record whose
+    email already belongs to a customer, stored or earlier in the same
+    import, replaces that customer instead of adding a second one. Other
+    records are denormalized like creates.
+    """
+    customer_ids = {}   # email -> id, for customers not written yet
+
+    def prepare(body):
+        if domain == "customer":
+            customer_email = body.pop("email", None)
+            if not customer_email:
+                return {}
+            if customer_email not in customer_ids:
+                existing = storage.query_by_email("customer", customer_email)
+                customer_ids[customer_email] = existing[0]["id"] if existing else str(uuid.uuid4())
+            return {"email": customer_email, "id": customer_ids[customer_email]}
+        return denormalize(domain, body)
+    return prepare
+
+
+def create_entity(domain, body):
+    """Create an entity in an insurance domain, upserting and denormalizing related records"""
+    # Add default status based on domain type
+    default_status = INSURANCE_DEFAULT_STATUS.get(domain, "PENDING")
+
+    # Handle customer creation/upsert
+    if domain == "customer":
+        # Use upsert_customer for proper email indexing
+        customer_email = body.get("email")
+        if customer_email:
+            item = storage.upsert_customer(customer_email, body)
+        else:
+            item = storage.create(domain, body, default_status)
+
+    else:
+        item = storage.create(domain, body, default_status, denormalize(domain, body))
+
+    _emit(f"{domain}.created", {"id": item["id"], "data": body, "status": default_status})
+    return _resp(201, {"id": item["id"], "item": item})
+
 
 def handler(event, context):
     """Main Lambda handler for Insurance vertical API"""
+    # Asynchronous export job (self-invoked by POST /{domain}/export)
+    if "exportJob" in event:
+        return run_export_job(event["exportJob"], storage, context)
+
+    # Chat job worker (SQS messages queued by POST /chat with "async": true)
+    if "Records" in event:
+        return handle_chat_job_records(event, handle_insurance_chat, storage, context)
+
     path = (event.get("path") or "/").strip("/")
     method = (event.get("httpMethod") or "GET").upper()
 
@@ -35,13 +140,23 @@ def handler(event, context):
     if method == "OPTIONS":
         return _resp(200, {"message": "CORS preflight"})
 
-    # POST /chat -> chatbot endpoint
+    # POST /chat -> chatbot endpoint ("async": true queues a chat job instead)
     if path == "chat" and method == "POST":
-        return handle_insurance_chat(event, storage)
+        if wants_chat_job(event):
+            return start_chat_job(event, handle_insurance_chat, storage, context)
+        return handle_insurance_chat(event, storage, context)
+
+    # GET /chat/{jobId} -> async chat job status, progress and result
+    if path.startswith("chat/") and method == "GET":
+        return get_chat_job(path[len("chat/"):])
 
     # POST /customer-chat -> customer chatbot endpoint
     if path == "customer-chat" and method == "POST":
-        return handle_insurance_customer_chat(event, storage)
+        return handle_insurance_customer_chat(event, storage, context)
+
+    # POST /batch -> run several API requests in one round trip
+    if path == "batch" and method == "POST":
+        return handle_batch(event, context, handler)
 
     # Parse request body (needed by all endpoints)
     body = {}
@@ -58,7 +173,7 @@ def handler(event, context):
         return _resp(200, {
             "name": "Silvermoat Insurance",
             "vertical": "insurance",
-            "endpoints": [f"/{e}" for e in INSURANCE_ENTITIES] + ["/chat", "/customer-chat"]
+            "endpoints": [f"/{e}" for e in INSURANCE_ENTITIES] + ["/chat", "/customer-chat", "/batch"]
         })
 
     domain = parts[0]
@@ -108,60 +223,22 @@ def handler(event, context):
 
         return _resp(200, {"items": items, "count": len(items)})
 
-    # POST /{domain} -> create
+    # POST /{domain} -> create (retries with the same Idempotency-Key replay the first response)
     if method == "POST" and len(parts) == 1:
-        # Add default status based on domain type
-        default_status = {
-            "customer": "ACTIVE",
-            "quote": "PENDING",
-            "policy": "ACTIVE",
-            "claim": "PENDING",
-            "payment": "PENDING",
-            "case": "OPEN"
-        }.get(domain, "PENDING")
-
-        # Handle customer creation/upsert
-        if domain == "customer":
-            # Use upsert_customer for proper email indexing
-            customer_email = body.get("email")
-            if customer_email:
-                item = storage.upsert_customer(customer_email, body)
-            else:
-                item = storage.create(domain, body, default_status)
-
-        # Handle customer upsert for quote
-        elif domain == "quote":
-            customer_id = upsert_customer_for_quote(storage, body)
-            if customer_id:
-                body["customerId"] = customer_id
-            item = storage.create(domain, body, default_status)
+        return with_idempotency(event, f"{domain}.create", lambda: create_entity(domain, body))
 
-        # Handle customer upsert for policy
-        elif domain == "policy":
-            customer_id = upsert_customer_for_policy(storage, body)
-            top_level_fields = {}
-            if customer_id:
-                body["customerId"] = customer_id
-                top_level_fields["customerId"] = customer_id
-            item = storage.create(domain, body, default_status, top_level_fields)
-
-        # Handle claim with customer denormalization
-        elif domain == "claim":
-            # Denormalize customerId from policy
-            policy_id = body.get("policyId")
-            top_level_fields = {}
-            if policy_id:
-                customer_id = get_customer_id_from_policy(storage, policy_id)
-                if customer_id:
-                    body["customerId"] = customer_id
-                    top_level_fields["customerId"] = customer_id
-            item = storage.create(domain, body, default_status, top_level_fields)
+    # POST /{domain}/import -> streaming NDJSON bulk import (resumable via checkpoint)
+    if method == "POST" and len(parts) == 2 and parts[1] == "import":
+        return handle_import(event, context, storage, domain, INSURANCE_DEFAULT_STATUS.get(domain, "PENDING"),
+                             prepare_import(domain))
 
-        else:
-            item = storage.create(domain, body, default_status)
+    # POST /{domain}/export -> start async gzip NDJSON export to the docs bucket
+    if method == "POST" and len(parts) == 2 and parts[1] == "export":
+        return start_export(event, domain, storage)
 
-        _emit(f"{domain}.created", {"id": item["id"], "data": body, "status": default_status})
-        return _resp(201, {"id": item["id"], "item": item})
+    # GET /{domain}/export/{jobId} -> export job status and download URL
+    if method == "GET" and len(parts) == 3 and parts[1] == "export":
+        return get_export(domain, parts[2])
 
     # GET /{domain}/{id} -> read
     if method == "GET" and len(parts) == 2:
@@ -0,0 +1,3 @@
+#!/bin/bash
+# Entrypoint of the chat stream function (Lambda Web Adapter): serves handler.py over HTTP
+PYTHONPATH=$PYTHONPATH:$LAMBDA_TASK_ROOT:/opt/python:$LAMBDA_RUNTIME_DIR exec python -m shared.chat_stream
@@ -0,0 +1,225 @@
+"""Server-side aggregation for report-style chat questions: group-by counts and numeric summaries"""
+import math
+from .tool_projection import _value
+
+try:
+    import numpy as np
+except ImportError:     # Shipped in the Lambda layer; local runs without it group in pure Python
+    np = None
+
+
+METRICS = ["count", "sum", "avg", "min", "max"]
+MAX_GROUP_FIELDS = 2
+MAX_GROUPS = 50
+NONE_LABEL = "(none)"
+
+
+def _number(value):
+    """Float value of a numeric field (DynamoDB Decimals, ints, numeric strings), or NaN"""
+    if isinstance(value, bool) or value is None:
+        return math.nan
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return number if math.isfinite(number) else math.nan
+
+
+def _label(value):
+    return NONE_LABEL if value is None or value == "" else str(value)
+
+
+class ColumnarSnapshot:
+    """
+    One domain's items as columns: a label column per group-by field and a
+    float column (NaN where missing or not numeric) per numeric field.
+
+    Args:
+        items: Domain items ({"id", "status", "data": {...}})
+        group_fields: Fields that can be grouped or filtered on
+        numeric_fields: Fields that can be summarized
+    """
+
+    def __init__(self, items, group_fields, numeric_fields):
+        self.size = len(items)
+        self.labels = {field: [_label(_value(item, field)) for item in items] for field in group_fields}
+        self.numbers = {field: [_number(_value(item, field)) for item in items] for field in numeric_fields}
+        if np is not None:
+            self.labels = {field: np.array(column, dtype=str) for field, column in self.labels.items()}
+            self.numbers = {field: np.array(column, dtype=np.float64) for field, column in self.numbers.items()}
+
+    def aggregate(self, group_by, field, where):
+        """
+        Group rows and summarize a numeric column.
+
+        Args:
+            group_by: Label fields to group on (empty for one overall group)
+            field: Numeric field to summarize, or None for counts only
+            where: {label field: value} equality filters
+
+        Returns:
+            (groups, matched): [(key tuple, {"count", "values", "sum", "min", "max"})], rows matched by where
+        """
+        if np is not None:
+            return self._aggregate_numpy(group_by, field, where)
+        return self._aggregate_python(group_by, field, where)
+
+    def _aggregate_numpy(self, group_by, field, where):
+        mask = np.ones(self.size, dtype=bool)
+        for name, value in where.items():
+            mask &= self.labels[name] == _label(value)
+        matched = int(mask.sum())
+        if not matched:
+            return [], 0
+
+        if group_by:
+            # Rows of the label columns, with one integer code per distinct combination
+            stacked = np.stack([self.labels[name][mask] for name in group_by], axis=1)
+            keys, inverse = np.unique(stacked, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            keys = [tuple(str(label) for label in key) for key in keys]
+        else:
+            keys, inverse = [()], np.zeros(matched, dtype=np.intp)
+
+        size = len(keys)
+        summaries = [{"count": int(count)} for count in np.bincount(inverse, minlength=size)]
+        if field:
+            values = self.numbers[field][mask]
+            present = ~np.isnan(values)
+            codes, values = inverse[present], values[present]
+            counts = np.bincount(codes, minlength=size)
+            sums = np.bincount(codes, weights=values, minlength=size)
+            mins = np.full(size, np.inf)
+            maxs = np.full(size, -np.inf)
+            np.minimum.at(mins, codes, values)
+            np.maximum.at(maxs, codes, values)
+            for n, summary in enumerate(summaries):
+                summary.update(values=int(counts[n]), sum=float(sums[n]), min=float(mins[n]), max=float(maxs[n]))
+        return list(zip(keys, summaries)), matched
+
+    def _aggregate_python(self, group_by, field, where):
+        rows = [n for n in range(self.size)
+                if all(self.labels[name][n] == _label(value) for name, value in where.items())]
+        groups = {}
+        for n in rows:
+            key = tuple(self.labels[name][n] for name in group_by)
+            summary = groups.setdefault(key, {"count": 0, "values": 0, "sum": 0.0, "min": math.inf, "max": -math.inf})
+            summary["count"] += 1
+            if field:
+                value = self.numbers[field][n]
+                if not math.isnan(value):
+                    summary["values"] += 1
+                    summary["sum"] += value
+                    summary["min"] = min(summary["min"], value)
+                    summary["max"] = max(summary["max"], value)
+        if not field:
+            groups = {key: {"count": summary["count"]} for key, summary in groups.items()}
+        return list(groups.items()), len(rows)
+
+
+class Aggregation:
+    """
+    The aggregate chatbot tool: group-by counts and sum/avg/min/max over a whole domain.
+
+    Report questions ("claims by status with total amounts") otherwise need
+    the model to page through search results, which are capped at a few
+    items. Here the whole domain is read (every scan page, memoized for the
+    request), turned into a columnar snapshot of the allowed fields, and
+    grouped in a single pass. Only the group summaries are returned to the
+    model. With NumPy (shipped in the Lambda layer) the grouping uses array
+    operations; without it, a single Python loop.
+
+    Args:
+        domains: {domain: {"group_by": [fields], "numeric": [fields]}}; fields
+                 are top-level attributes (status) or data fields
+    """
+
+    def __init__(self, domains):
+        self.domains = domains
+
+    def tool_definition(self, description):
+        """Tool definition for the model; the allowed fields per domain are listed in the description"""
+        allowed = "; ".join(
+            f"{domain}: group by {', '.join(spec['group_by'])}"
+            + (f", numeric {', '.join(spec['numeric'])}" if spec.get("numeric") else "")
+            for domain, spec in self.domains.items()
+        )
+        return {
+            "name": "aggregate",
+            "description": f"{description}. Fields per record type - {allowed}",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "entity_type": {"type": "string", "enum": list(self.domains)},
+                    "group_by": {"type": "array", "items": {"type": "string"},
+                                 "description": f"Up to {MAX_GROUP_FIELDS} fields to group on; omit for overall totals"},
+                    "field": {"type": "string", "description": "Numeric field to summarize (for sum, avg, min, max)"},
+                    "metrics": {"type": "array", "items": {"type": "string", "enum": METRICS},
+                                "description": "Default: count, plus sum and avg when a field is given"},
+                    "where": {"type": "object",
+                              "description": "Equality filters on groupable fields, e.g. {\"status\": \"PENDING\"}"},
+                },
+                "required": ["entity_type"]
+            }
+        }
+
+    def _validate(self, tool_input):
+        """Parsed (domain, group_by, field, metrics, where), or an error message"""
+        domain = tool_input.get("entity_type")
+        spec = self.domains.get(domain)
+        if spec is None:
+            return f"Aggregation is not available for {domain}"
+        group_by = tool_input.get("group_by") or []
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        where = tool_input.get("where") or {}
+        field = tool_input.get("field") or None
+        metrics = tool_input.get("metrics") or (["count", "sum", "avg"] if field else ["count"])
+
+        if len(group_by) > MAX_GROUP_FIELDS:
+            return f"Group by at most {MAX_GROUP_FIELDS} fields"
+        for name in list(group_by) + list(where):
+            if name not in spec["group_by"]:
+                return f"Cannot group or filter {domain} by {name}; use one of {', '.join(spec['group_by'])}"
+        if field and field not in spec.get("numeric", []):
+            numeric = ", ".join(spec.get("numeric", [])) or "none"
+            return f"Cannot summarize {domain}.{field}; numeric fields: {numeric}"
+        if any(metric not in METRICS for metric in metrics):
+            return f"Unknown metric; use {', '.join(METRICS)}"
+        if not field and any(metric != "count" for metric in metrics):
+            return "sum, avg, min and max need a numeric field"
+        return domain, list(group_by), field, metrics, where
+
+    def run(self, storage, tool_input):
+        """Execute the tool: {"entity_type", "group_by"?, "field"?, "metrics"?, "where"?} -> group summaries"""
+        parsed = self._validate(tool_input)
+        if isinstance(parsed, str):
+            return {"error": parsed}
+        domain, group_by, field, metrics, where = parsed
+        spec = self.domains[domain]
+
+        items = [item for page in storage.scan_pages(domain) for item in page]
+        snapshot = ColumnarSnapshot(items, spec["group_by"], spec.get("numeric", []))
+        groups, matched = snapshot.aggregate(group_by, field, where)
+        groups.sort(key=lambda group: (-group[1]["count"], group[0]))
+
+        rows = []
+        for key, summary in groups[:MAX_GROUPS]:
+            row = dict(zip(group_by, key))
+            for metric in metrics:
+                if metric == "count":
+                    row["count"] = summary["count"]
+                elif not summary["values"]:
+                    row[metric] = None
+                elif metric == "avg":
+                    row["avg"] = round(summary["sum"] / summary["values"], 2)
+                else:
+                    row[metric] = round(summary[metric], 2)
+            rows.append(row)
+
+        result = {"entity_type": domain, "records": matched, "groups": rows}
+        if field:
+            result["field"] = field
+        if len(groups) > MAX_GROUPS:
+            result["note"] = f"Showing the {MAX_GROUPS} largest of {len(groups)} groups"
+        return result
@@ -0,0 +1,119 @@
+"""Batch execution of API sub-requests within a single Lambda invocation"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from .responses import _resp
+
+
+MAX_BATCH_SIZE = 25
+MAX_WORKERS = 8
+
+# Only reads are safe to reorder; anything else runs alone, in request order
+CONCURRENT_METHODS = {"GET"}
+
+
+# Not inherited from the batch request: each sub-request is a separate operation
+SUB_REQUEST_ONLY_HEADERS = {"idempotency-key"}
+
+
+def _sub_event(event, request):
+    """
+    Build an API Gateway proxy event for a single batch sub-request.
+
+    The batch request's headers are inherited, except Idempotency-Key: a
+    sub-request is only made idempotent by a key in its own headers.
+    """
+    path = "/" + (request.get("path") or "/").strip("/")
+    body = request.get("body")
+    headers = {name: value for name, value in (event.get("headers") or {}).items()
+               if name.lower() not in SUB_REQUEST_ONLY_HEADERS}
+    headers.update(request.get("headers") or {})
+
+    sub_event = dict(event)
+    sub_event.update({
+        "path": path,
+        "httpMethod": (request.get("method") or "GET").upper(),
+        "queryStringParameters": request.get("query") or None,
+        "headers": headers,
+        "body": json.dumps(body) if body is not None else None,
+    })
+    return sub_event
+
+
+def _run_one(dispatch, sub_event, context):
+    """Run one sub-request and unwrap the proxy response"""
+    try:
+        response = dispatch(sub_event, context)
+    except Exception as e:
+        print(f"Batch sub-request error ({sub_event['httpMethod']} {sub_event['path']}): {str(e)}")
+        return {"status": 500, "body": {"error": "internal_error", "message": str(e)}}
+
+    try:
+        body = json.loads(response.get("body") or "null")
+    except ValueError:
+        body = response.get("body")
+    return {"status": response.get("statusCode", 500), "body": body}
+
+
+def handle_batch(event, context, dispatch):
+    """
+    Handle POST /batch - run several API sub-requests in one round trip.
+
+    Request body:
+        {"requests": [{"id": "policies", "method": "GET", "path": "/policy",
+                       "query": {"limit": "10"}, "body": {...}}, ...]}
+
+    Consecutive GET requests run concurrently; any other method acts as a
+    barrier and runs alone, so writes keep their request order relative to
+    the reads around them.
+
+    Args:
+        event: API Gateway proxy event for the batch request
+        context: Lambda context (passed through to sub-requests)
+        dispatch: The vertical's handler function, invoked per sub-request
+
+    Returns:
+        API Gateway response with per-item status codes and bodies
+    """
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except ValueError:
+        return _resp(400, {"error": "invalid_batch", "message": "Body must be JSON"})
+
+    requests = body.get("requests") if isinstance(body, dict) else None
+    if not isinstance(requests, list) or not requests:
+        return _resp(400, {"error": "invalid_batch", "message": "requests must be a non-empty list"})
+    if len(requests) > MAX_BATCH_SIZE:
+        return _resp(400, {"error": "batch_too_large", "max": MAX_BATCH_SIZE, "count": len(requests)})
+
+    for request in requests:
+        if not isinstance(request, dict) or not request.get("path"):
+            return _resp(400, {"error": "invalid_batch", "message": "Each request needs a path"})
+        if request["path"].strip("/").split("/")[0] == "batch":
+            return _resp(400, {"error": "invalid_batch", "message": "Nested batch requests are not allowed"})
+
+    sub_events = [_sub_event(event, request) for request in requests]
+    results = [None] * len(sub_events)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        pending = []
+
+        def flush():
+            for index, future in pending:
+                results[index] = future.result()
+            pending.clear()
+
+        for index, sub_event in enumerate(sub_events):
+            if sub_event["httpMethod"] in CONCURRENT_METHODS:
+                pending.append((index, executor.submit(_run_one, dispatch, sub_event, context)))
+            else:
+                flush()
+                results[index] = _run_one(dispatch, sub_event, context)
+        flush()
+
+    responses = []
+    for request, result in zip(requests, results):
+        if "id" in request:
+            result = {"id": request["id"], **result}
+        responses.append(result)
+
+    return _resp(200, {"responses": responses, "count": len(responses)})
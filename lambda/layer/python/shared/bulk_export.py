@@ -0,0 +1,317 @@
+"""Asynchronous, resumable domain export to S3 as gzip NDJSON"""
+import gzip
+import json
+import os
+import threading
+import time
+import uuid
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from botocore.exceptions import ClientError
+from .responses import _resp, decimal_default
+from .events import _emit
+
+
+s3 = boto3.client("s3")
+lambda_client = boto3.client("lambda")
+DOCS_BUCKET = os.environ.get("DOCS_BUCKET", "")
+# Jobs run as async invocations of the long-running worker function (this function if unset)
+EXPORT_FUNCTION_NAME = os.environ.get("EXPORT_FUNCTION_NAME") or os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "")
+# Recorded on each job so that a multi-vertical gateway can route the async invocation
+VERTICAL = os.environ.get("VERTICAL", "")
+
+DEFAULT_SEGMENTS = 4
+MAX_SEGMENTS = 16
+PART_SIZE = 8 * 1024 * 1024     # S3 requires >= 5 MB for every part but the last
+LAST_PART_NUMBER = 10000        # S3 maximum; carries the segments' final partial chunks
+PARTS_PER_SEGMENT = (LAST_PART_NUMBER - 1) // MAX_SEGMENTS
+MIN_REMAINING_MS = 20000        # Checkpoint and continue in a new invocation below this budget
+MAX_INVOCATIONS = 10
+STALE_AFTER_SECONDS = 900       # A job without a checkpoint for this long has died
+DOWNLOAD_URL_TTL = 3600
+
+# Resume state kept in the manifest while a job runs
+INTERNAL_FIELDS = ("uploadId", "segmentState", "invocations")
+
+
+def _export_prefix(domain, job_id):
+    return f"exports/{domain}/{job_id}"
+
+
+def _export_key(domain, job_id):
+    return f"{_export_prefix(domain, job_id)}/{domain}.ndjson.gz"
+
+
+def _write_manifest(domain, job_id, manifest):
+    s3.put_object(
+        Bucket=DOCS_BUCKET,
+        Key=f"{_export_prefix(domain, job_id)}/manifest.json",
+        Body=json.dumps(manifest, default=decimal_default).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def _read_manifest(domain, job_id):
+    try:
+        obj = s3.get_object(Bucket=DOCS_BUCKET, Key=f"{_export_prefix(domain, job_id)}/manifest.json")
+    except ClientError:
+        return None
+    # Decimals keep numeric scan keys usable as ExclusiveStartKey
+    return json.loads(obj["Body"].read(), parse_float=Decimal)
+
+
+def _invoke_export(job):
+    lambda_client.invoke(
+        FunctionName=EXPORT_FUNCTION_NAME,
+        InvocationType="Event",
+        Payload=json.dumps({"exportJob": job}).encode("utf-8"),
+    )
+
+
+def _abort_upload(manifest):
+    if not manifest.get("uploadId"):
+        return
+    try:
+        s3.abort_multipart_upload(Bucket=DOCS_BUCKET, Key=_export_key(manifest["domain"], manifest["jobId"]),
+                                  UploadId=manifest["uploadId"])
+    except Exception as e:
+        print(f"Export abort error ({manifest['domain']}/{manifest['jobId']}): {str(e)}")
+
+
+def _fail(manifest, error):
+    """Abort the upload and turn the manifest into a FAILED one (not written)"""
+    _abort_upload(manifest)
+    for field in INTERNAL_FIELDS:
+        manifest.pop(field, None)
+    manifest.update({"status": "FAILED", "error": error, "finishedAt": int(time.time())})
+    return manifest
+
+
+class _ExportRun:
+    """
+    One invocation's share of an export job.
+
+    Every scan segment uploads its own range of part numbers, each part at
+    least PART_SIZE, and checkpoints its scan position (LastEvaluatedKey)
+    in the manifest after each part. Data scanned since a segment's last
+    part stays in memory; when every segment has finished in the same
+    invocation those tails become the final part. If the invocation runs
+    low on time, segments stop and the next invocation resumes from the
+    checkpoints, rescanning only what was never uploaded.
+    """
+
+    def __init__(self, manifest, storage, context):
+        self.manifest = manifest
+        self.storage = storage
+        self.context = context
+        self.lock = threading.Lock()
+        self.tails = {}         # segment -> (gzip bytes, item count) not yet uploaded
+        self.halted = False     # Out of time, or another segment failed
+
+    def _out_of_time(self):
+        return bool(self.context) and self.context.get_remaining_time_in_millis() < MIN_REMAINING_MS
+
+    def checkpoint(self):
+        with self.lock:
+            self.manifest["updatedAt"] = int(time.time())
+            _write_manifest(self.manifest["domain"], self.manifest["jobId"], self.manifest)
+
+    def _upload_part(self, state, data, count, last_key):
+        first_part = 1 + state["segment"] * PARTS_PER_SEGMENT
+        if state["nextPart"] >= first_part + PARTS_PER_SEGMENT:
+            raise ValueError("Export segment exceeds its multipart part range; use more segments")
+        response = s3.upload_part(
+            Bucket=DOCS_BUCKET, Key=_export_key(self.manifest["domain"], self.manifest["jobId"]),
+            UploadId=self.manifest["uploadId"], PartNumber=state["nextPart"], Body=bytes(data),
+        )
+        with self.lock:
+            state["parts"].append({"PartNumber": state["nextPart"], "ETag": response["ETag"]})
+            state["nextPart"] += 1
+            state["count"] += count
+            state["bytes"] += len(data)
+            state["startKey"] = last_key
+            state["done"] = last_key is None
+        self.checkpoint()
+
+    def export_segment(self, segment):
+        """Scan one segment from its checkpoint; returns True once it has been read to the end"""
+        state = self.manifest["segmentState"][segment]
+        if state["done"]:
+            return True
+        domain, total_segments = self.manifest["domain"], self.manifest["segments"]
+        buffer, count = bytearray(), 0
+        try:
+            for items, last_key in self.storage.scan_pages_from(domain, segment, total_segments, state["startKey"]):
+                if items:
+                    lines = b"".join(json.dumps(item, default=decimal_default).encode("utf-8") + b"\n"
+                                     for item in items)
+                    buffer += gzip.compress(lines)
+                    count += len(items)
+                if len(buffer) >= PART_SIZE:
+                    self._upload_part(state, buffer, count, last_key)
+                    buffer, count = bytearray(), 0
+                if last_key is None:
+                    self.tails[segment] = (bytes(buffer), count)
+                    return True
+                if self.halted or self._out_of_time():
+                    self.halted = True
+                    return False
+        except Exception:
+            self.halted = True
+            raise
+        return True
+
+    def run(self):
+        """Export every segment; returns True when all were read to the end in this invocation"""
+        segments = self.manifest["segments"]
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            finished = list(executor.map(self.export_segment, range(segments)))
+        return all(finished)
+
+    def complete(self):
+        """Upload the segment tails as the last part and complete the upload"""
+        states = self.manifest["segmentState"]
+        parts = [part for state in states for part in state["parts"]]
+        tail = b"".join(self.tails.get(segment, (b"", 0))[0] for segment in range(len(states)))
+        if tail or not parts:
+            response = s3.upload_part(
+                Bucket=DOCS_BUCKET, Key=_export_key(self.manifest["domain"], self.manifest["jobId"]),
+                UploadId=self.manifest["uploadId"], PartNumber=LAST_PART_NUMBER, Body=tail or gzip.compress(b""),
+            )
+            parts.append({"PartNumber": LAST_PART_NUMBER, "ETag": response["ETag"]})
+        s3.complete_multipart_upload(
+            Bucket=DOCS_BUCKET, Key=_export_key(self.manifest["domain"], self.manifest["jobId"]),
+            UploadId=self.manifest["uploadId"],
+            MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])},
+        )
+        count = sum(state["count"] for state in states) + sum(c for _, c in self.tails.values())
+        return count, sum(state["bytes"] for state in states) + len(tail)
+
+
+def start_export(event, domain, storage):
+    """
+    Handle POST /{domain}/export - start an asynchronous export job.
+
+    The job runs in an asynchronous invocation of EXPORT_FUNCTION_NAME (the
+    vertical's long-running worker), or inline when running outside Lambda.
+    Optional body: {"segments": 4}.
+
+    Returns:
+        202 response with the job ID and the URL to poll for status
+    """
+    if not DOCS_BUCKET:
+        return _resp(500, {"error": "export_unavailable", "message": "DOCS_BUCKET is not configured"})
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+        segments = int(body.get("segments", DEFAULT_SEGMENTS))
+    except (ValueError, TypeError, AttributeError):
+        return _resp(400, {"error": "invalid_export", "message": "segments must be an integer"})
+    segments = max(1, min(segments, MAX_SEGMENTS))
+
+    job_id = str(uuid.uuid4())
+    job = {"jobId": job_id, "domain": domain, "segments": segments, "vertical": VERTICAL}
+    _write_manifest(domain, job_id, {**job, "status": "PENDING", "createdAt": int(time.time())})
+
+    if EXPORT_FUNCTION_NAME:
+        _invoke_export(job)
+    else:
+        # Local development: no async invocation available
+        run_export_job(job, storage)
+
+    return _resp(202, {"jobId": job_id, "status": "PENDING", "statusPath": f"/{domain}/export/{job_id}"})
+
+
+def run_export_job(job, storage, context=None):
+    """
+    Run (or resume) an export job: parallel-scan the domain and stream it to
+    exports/{domain}/{jobId}/{domain}.ndjson.gz via multipart upload.
+
+    The multipart upload and each segment's scan position are kept in the
+    manifest, so a continuation (started when this invocation runs low on
+    time) or a Lambda retry of a crashed invocation reuses the upload and
+    resumes the scan. Errors, and jobs still unfinished after
+    MAX_INVOCATIONS, abort the upload and mark the job FAILED.
+
+    Args:
+        job: {"jobId", "domain", "segments", "vertical"} as produced by start_export
+        storage: Storage backend with scan_pages_from support
+        context: Lambda context (None runs without a time limit)
+
+    Returns:
+        The job manifest as last written
+    """
+    domain, job_id, segments = job["domain"], job["jobId"], job["segments"]
+    manifest = _read_manifest(domain, job_id) or {**job, "createdAt": int(time.time())}
+    if manifest.get("status") in ("COMPLETE", "FAILED"):
+        return manifest     # Duplicate or late retry of a finished job
+
+    try:
+        if not manifest.get("uploadId"):
+            manifest.update({
+                "status": "RUNNING",
+                "startedAt": int(time.time()),
+                "uploadId": s3.create_multipart_upload(
+                    Bucket=DOCS_BUCKET, Key=_export_key(domain, job_id), ContentType="application/gzip"
+                )["UploadId"],
+                "segmentState": [
+                    {"segment": segment, "startKey": None, "done": False, "count": 0, "bytes": 0,
+                     "nextPart": 1 + segment * PARTS_PER_SEGMENT, "parts": []}
+                    for segment in range(segments)
+                ],
+            })
+        manifest["invocations"] = manifest.get("invocations", 0) + 1
+        run = _ExportRun(manifest, storage, context)
+        run.checkpoint()
+
+        if not run.run():
+            if manifest["invocations"] >= MAX_INVOCATIONS:
+                raise TimeoutError(f"Export did not finish within {MAX_INVOCATIONS} invocations")
+            print(f"Export {domain}/{job_id} continues in a new invocation")
+            run.checkpoint()
+            _invoke_export(job)
+            return manifest
+
+        count, size = run.complete()
+        for field in INTERNAL_FIELDS:
+            manifest.pop(field, None)
+        manifest.update({
+            "status": "COMPLETE",
+            "s3Key": _export_key(domain, job_id),
+            "count": count,
+            "bytes": size,
+            "finishedAt": int(time.time()),
+        })
+        _emit(f"{domain}.exported", {"jobId": job_id, "count": count, "s3Key": manifest["s3Key"]})
+    except Exception as e:
+        print(f"Export error ({domain}/{job_id}): {str(e)}")
+        _fail(manifest, str(e))
+
+    _write_manifest(domain, job_id, manifest)
+    return manifest
+
+
+def get_export(domain, job_id):
+    """Handle GET /{domain}/export/{jobId} - job status plus a presigned download URL once complete"""
+    manifest = _read_manifest(domain, job_id)
+    if not manifest:
+        return _resp(404, {"error": "not_found", "jobId": job_id})
+
+    if manifest.get("status") in ("PENDING", "RUNNING"):
+        last_seen = manifest.get("updatedAt") or manifest.get("createdAt") or 0
+        if time.time() - last_seen > STALE_AFTER_SECONDS:
+            # The job's invocations crashed or timed out beyond Lambda's retries
+            _write_manifest(domain, job_id, _fail(manifest, "Export stopped without finishing"))
+
+    if manifest.get("status") == "COMPLETE":
+        manifest["downloadUrl"] = s3.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": DOCS_BUCKET, "Key": manifest["s3Key"]},
+            ExpiresIn=DOWNLOAD_URL_TTL,
+        )
+        manifest["downloadUrlExpiresIn"] = DOWNLOAD_URL_TTL
+
+    for field in INTERNAL_FIELDS:
+        manifest.pop(field, None)
+    return _resp(200, manifest)
@@ -0,0 +1,309 @@
+"""Streaming NDJSON bulk import into domain tables"""
+import base64
+import hashlib
+import json
+import os
+import time
+import uuid
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from botocore.exceptions import ClientError
+from .responses import _resp
+from .events import _emit
+from .validators import convert_floats_to_decimal
+from .storage.dynamodb import BATCH_WRITE_LIMIT
+
+
+s3 = boto3.client("s3")
+DOCS_BUCKET = os.environ.get("DOCS_BUCKET", "")
+
+MAX_WORKERS = 4             # Concurrent BatchWriteItem calls
+READ_CHUNK_SIZE = 64 * 1024
+MIN_REMAINING_MS = 5000     # Stop and hand back a checkpoint below this budget
+MAX_ERRORS_REPORTED = 20
+
+# Top-level attributes used as GSI keys; DynamoDB rejects empty strings here
+INDEXED_FIELDS = ["customerId", "email"]
+
+
+class ImportRequestError(ValueError):
+    """Raised for malformed import requests or checkpoints"""
+
+
+def _encode_checkpoint(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode("utf-8")).decode("ascii")
+
+
+def _decode_checkpoint(token):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        int(state["offset"]), int(state["line"]), int(state["imported"]), int(state["failed"])
+        return state
+    except Exception:
+        raise ImportRequestError("Invalid checkpoint token")
+
+
+def _open_source(event):
+    """
+    Resolve the NDJSON source of an import request.
+
+    Supported request shapes:
+        - Content-Type application/x-ndjson: the raw body is the NDJSON payload
+          (checkpoint passed as ?checkpoint=...)
+        - {"ndjson": "<lines>", "checkpoint": "..."}: inline payload
+        - {"s3Key": "imports/policies.ndjson", "checkpoint": "..."}: object in DOCS_BUCKET
+
+    Returns:
+        (fingerprint, checkpoint_token, open_fn) where open_fn(offset) yields byte chunks
+    """
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    query = event.get("queryStringParameters") or {}
+
+    raw = event.get("body") or ""
+    if event.get("isBase64Encoded"):
+        raw = base64.b64decode(raw)
+    elif isinstance(raw, str):
+        raw = raw.encode("utf-8")
+
+    if "ndjson" in headers.get("content-type", ""):
+        payload, checkpoint = raw, query.get("checkpoint")
+    else:
+        try:
+            options = json.loads(raw or b"{}")
+        except ValueError:
+            raise ImportRequestError("Body must be JSON, or NDJSON with Content-Type application/x-ndjson")
+        if not isinstance(options, dict):
+            raise ImportRequestError("Body must be a JSON object")
+        checkpoint = options.get("checkpoint") or query.get("checkpoint")
+
+        if options.get("s3Key"):
+            if not DOCS_BUCKET:
+                raise ImportRequestError("DOCS_BUCKET is not configured")
+            key = options["s3Key"]
+            try:
+                head = s3.head_object(Bucket=DOCS_BUCKET, Key=key)
+            except ClientError:
+                raise ImportRequestError(f"Import object not found: {key}")
+
+            def open_s3(offset):
+                if offset >= head["ContentLength"]:
+                    return
+                obj = s3.get_object(Bucket=DOCS_BUCKET, Key=key, Range=f"bytes={offset}-", IfMatch=head["ETag"])
+                yield from obj["Body"].iter_chunks(READ_CHUNK_SIZE)
+
+            return f"s3:{key}:{head['ETag']}", checkpoint, open_s3
+
+        if not isinstance(options.get("ndjson"), str):
+            raise ImportRequestError("Provide ndjson, s3Key, or an application/x-ndjson body")
+        payload = options["ndjson"].encode("utf-8")
+
+    def open_inline(offset):
+        yield payload[offset:]
+
+    return "inline:" + hashlib.sha256(payload).hexdigest()[:16], checkpoint, open_inline
+
+
+def _iter_lines(chunks, offset):
+    """Split a byte-chunk stream into lines, yielding (line, end_offset)"""
+    buffer = b""
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            newline = buffer.find(b"\n", start)
+            if newline == -1:
+                break
+            offset += newline + 1 - start
+            yield buffer[start:newline], offset
+            start = newline + 1
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer, offset + len(buffer)
+
+
+def _to_item(record, default_status, now, prepare=None):
+    """Validate one NDJSON record and shape it as a domain item
+
+    Records carrying a "data" object are treated as complete items (id,
+    status, createdAt and GSI fields are kept); anything else is treated
+    like a POST body and wrapped the same way storage.create() would.
+    prepare(data), when given, denormalizes the data in place like the
+    vertical's create endpoint and returns the top-level fields to set;
+    fields a complete item already carries are kept. An id is only generated
+    once prepare() has had the chance to resolve an existing record.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("record must be a JSON object")
+
+    if isinstance(record.get("data"), dict):
+        item = dict(record)
+        item.setdefault("createdAt", now)
+        item.setdefault("status", default_status)
+    else:
+        item = {"id": str(uuid.uuid4()), "createdAt": now, "data": record, "status": default_status}
+
+    if prepare:
+        try:
+            top_level_fields = prepare(item["data"])
+        except Exception as e:
+            raise ValueError(f"related records could not be resolved: {str(e)}")
+        if isinstance(record.get("data"), dict):
+            for field, value in top_level_fields.items():
+                item.setdefault(field, value)
+        else:
+            item.update(top_level_fields)
+        # Values computed during denormalization (e.g. order totals) may be floats
+        item["data"] = convert_floats_to_decimal(item["data"])
+    item.setdefault("id", str(uuid.uuid4()))
+
+    if not isinstance(item["id"], str) or not item["id"]:
+        raise ValueError("id must be a non-empty string")
+    if not isinstance(item["status"], str):
+        raise ValueError("status must be a string")
+    for field in INDEXED_FIELDS:
+        if field in item and (not isinstance(item[field], str) or not item[field]):
+            raise ValueError(f"{field} must be a non-empty string")
+    return item
+
+
+class _ImportRun:
+    """Accumulates validated items into batches and writes them a window at a time"""
+
+    def __init__(self, storage, domain, state):
+        self.storage = storage
+        self.domain = domain
+        self.state = dict(state)
+        self.errors = []
+        self.batches = []
+        self.batch = []
+        self.window_ids = set()
+        self.pending_failed = 0
+
+    def add_error(self, line_no, message):
+        self.pending_failed += 1
+        if len(self.errors) < MAX_ERRORS_REPORTED:
+            self.errors.append({"line": line_no, "error": message})
+
+    def has_pending(self, item_id):
+        return item_id in self.window_ids
+
+    def add_item(self, item):
+        self.batch.append(item)
+        self.window_ids.add(item["id"])
+        if len(self.batch) == BATCH_WRITE_LIMIT:
+            self.close_batch()
+
+    def close_batch(self):
+        if self.batch:
+            self.batches.append(self.batch)
+        self.batch = []
+
+    def window_full(self):
+        return len(self.batches) >= MAX_WORKERS
+
+    def commit(self, executor, offset, line_no):
+        """Write all pending batches concurrently, then advance the checkpoint"""
+        self.close_batch()
+        futures = [(batch, executor.submit(self.storage.batch_put, self.domain, batch)) for batch in self.batches]
+        for batch, future in futures:
+            try:
+                unprocessed = future.result()
+            except Exception as e:
+                print(f"Import batch error ({self.domain}): {str(e)}")
+                unprocessed = len(batch)
+                if len(self.errors) < MAX_ERRORS_REPORTED:
+                    self.errors.append({"line": None, "error": f"batch write failed: {str(e)}"})
+            self.state["imported"] += len(batch) - unprocessed
+            self.state["failed"] += unprocessed
+
+        self.state["failed"] += self.pending_failed
+        self.state["offset"] = offset
+        self.state["line"] = line_no
+        self.batches = []
+        self.window_ids = set()
+        self.pending_failed = 0
+
+
+def handle_import(event, context, storage, domain, default_status, prepare=None):
+    """
+    Handle POST /{domain}/import - stream NDJSON records into a domain table.
+
+    Lines are parsed incrementally, validated, and written in BatchWriteItem
+    calls of up to 25 items with at most MAX_WORKERS calls in flight. The
+    checkpoint only advances past lines whose writes have completed. When the
+    invocation runs low on time the response carries a checkpoint token;
+    resubmitting the same source with that token resumes the import.
+
+    Records go through prepare the way create requests go through the
+    vertical's denormalization (related customers upserted, customerId and
+    email stored top-level for the GSIs); it runs once per record, before
+    the batched writes.
+
+    Args:
+        event: API Gateway proxy event
+        context: Lambda context (used for the remaining-time budget)
+        storage: Storage backend with batch_put support
+        domain: Target domain
+        default_status: Status for records that do not carry one
+        prepare: Optional callable (data) -> top-level fields, applied to each record
+
+    Returns:
+        API Gateway response with imported/failed counts, sample errors,
+        a done flag and, if not done, a checkpoint token
+    """
+    try:
+        fingerprint, checkpoint, open_source = _open_source(event)
+        state = {"source": fingerprint, "offset": 0, "line": 0, "imported": 0, "failed": 0}
+        if checkpoint:
+            state = _decode_checkpoint(checkpoint)
+            if state.get("source") != fingerprint:
+                raise ImportRequestError("Checkpoint does not belong to this import source")
+    except ImportRequestError as e:
+        return _resp(400, {"error": "invalid_import", "message": str(e)})
+
+    run = _ImportRun(storage, domain, state)
+    start = dict(state)
+    now = int(time.time())
+    line_no = state["line"]
+    offset = state["offset"]
+    done = True
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for line, end_offset in _iter_lines(open_source(offset), offset):
+            line_no += 1
+            if line.strip():
+                try:
+                    item = _to_item(json.loads(line, parse_float=Decimal), default_status, now, prepare)
+                    # A repeated id must not race its earlier write in a concurrent batch
+                    # (and BatchWriteItem rejects duplicate keys outright), so flush first
+                    if run.has_pending(item["id"]):
+                        run.commit(executor, offset, line_no - 1)
+                    run.add_item(item)
+                except ValueError as e:
+                    run.add_error(line_no, str(e))
+            offset = end_offset
+
+            if run.window_full():
+                run.commit(executor, offset, line_no)
+                if context and context.get_remaining_time_in_millis() < MIN_REMAINING_MS:
+                    done = False
+                    break
+        else:
+            run.commit(executor, offset, line_no)
+
+    result = run.state
+    _emit(f"{domain}.imported", {
+        "imported": result["imported"] - start["imported"],
+        "failed": result["failed"] - start["failed"],
+        "done": done,
+    })
+
+    return _resp(200, {
+        "domain": domain,
+        "imported": result["imported"],
+        "failed": result["failed"],
+        "errors": run.errors,
+        "done": done,
+        "checkpoint": None if done else _encode_checkpoint(result),
+    })
@@ -0,0 +1,278 @@
+"""Tool-use chat loop shared by the vertical chatbots, with optional NDJSON streaming"""
+import os
+import json
+import time
+from .chat_request import build_chat_body
+from .chat_metrics import ChatMetrics
+from .deadline import Deadline
+from .tool_runner import run_tool_calls, TOOL_TIMEOUT_MS
+from .tool_projection import projecting
+from .model_router import ModelRouter, ModelThrottled, THROTTLING_STREAM_EVENTS, is_throttled
+from .responses import _resp, _ndjson_resp, _ndjson_stream_resp
+
+
+MAX_TOOL_ITERATIONS = int(os.environ.get("CHAT_MAX_TOOL_ITERATIONS", "8"))
+# Time kept back for the final answer once the tool loop is cut short
+FINAL_RESERVE_MS = int(os.environ.get("CHAT_FINAL_RESERVE_MS", "8000"))
+FINAL_MAX_TOKENS = int(os.environ.get("CHAT_FINAL_MAX_TOKENS", "1024"))
+# Tool calls get at least this long (or CHAT_TOOL_TIMEOUT_MS if lower), even when the time budget is nearly spent
+MIN_TOOL_TIMEOUT_MS = 1000
+
+FINAL_ANSWER_NOTE = ("The tool-use budget for this request is used up. Do not call any more tools. "
+                     "Answer now using only the information gathered so far, and say briefly "
+                     "what could not be looked up.")
+FALLBACK_ANSWER = "Sorry, I could not finish looking that up in time. Please try a narrower question."
+
+
+def _invoke_streaming(bedrock, model_id, body):
+    """
+    Streaming model call: yields text deltas as they arrive and returns the
+    assembled response body ({"content", "stop_reason", "usage"}), with
+    tool_use inputs rebuilt from their input_json_delta fragments.
+    """
+    response = bedrock.invoke_model_with_response_stream(modelId=model_id, body=body)
+
+    blocks = {}
+    tool_input_parts = {}
+    stop_reason = None
+    usage = {}
+
+    for event in response["body"]:
+        if "chunk" not in event:
+            # Every other event in a Bedrock response stream is an error
+            if not blocks and set(event) & THROTTLING_STREAM_EVENTS:
+                raise ModelThrottled(f"Bedrock stream throttled: {json.dumps(event, default=str)}")
+            raise RuntimeError(f"Bedrock stream error: {json.dumps(event, default=str)}")
+        data = json.loads(event["chunk"]["bytes"])
+        kind = data.get("type")
+
+        if kind == "message_start":
+            usage.update(data["message"].get("usage") or {})
+        elif kind == "content_block_start":
+            blocks[data["index"]] = dict(data["content_block"])
+            if data["content_block"]["type"] == "tool_use":
+                tool_input_parts[data["index"]] = []
+        elif kind == "content_block_delta":
+            index, delta = data["index"], data["delta"]
+            if delta["type"] == "text_delta":
+                blocks[index]["text"] = blocks[index].get("text", "") + delta["text"]
+                yield delta["text"]
+            elif delta["type"] == "input_json_delta":
+                tool_input_parts[index].append(delta["partial_json"])
+        elif kind == "content_block_stop":
+            if data["index"] in tool_input_parts:
+                raw = "".join(tool_input_parts.pop(data["index"]))
+                blocks[data["index"]]["input"] = json.loads(raw) if raw else {}
+        elif kind == "message_delta":
+            stop_reason = data["delta"].get("stop_reason") or stop_reason
+            usage.update(data.get("usage") or {})
+
+    return {"content": [blocks[index] for index in sorted(blocks)], "stop_reason": stop_reason, "usage": usage}
+
+
+def _with_final_note(messages):
+    """Copy of messages whose last (user) message also asks for an immediate answer"""
+    last = messages[-1]
+    content = last["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    return messages[:-1] + [{**last, "content": content + [{"type": "text", "text": FINAL_ANSWER_NOTE}]}]
+
+
+def chat_events(bedrock, model_id, system_prompt, messages, tools, execute, status_tracker,
+                memo=None, max_tokens=4096, stream=False, result_columns=None,
+                deadline=None, max_iterations=MAX_TOOL_ITERATIONS, tool_domain=None):
+    """
+    Run the tool-use loop until the model stops asking for tools, yielding events.
+
+    Events:
+        {"type": "text", "turn": n, "text": "..."}      text delta (stream mode only)
+        {"type": "status", "operation", "message", ...}   status tracker message
+        {"type": "done", "response", "usage", "conversation", "status_messages", "partial", "model_calls", "metrics"}
+
+    The loop stops asking for tools after max_iterations tool rounds or when
+    the deadline no longer leaves FINAL_RESERVE_MS: the last call then gets
+    an instruction to answer from what it has, with FINAL_MAX_TOKENS, so the
+    user gets a partial answer instead of a Lambda timeout.
+
+    Each call's model is chosen by a ModelRouter (with CHAT_FAST_MODEL_ID
+    set, the fast model dispatches the first turn's tools and model_id
+    writes every answer; a fallback model on throttling); "model_calls"
+    lists every decision with its latency.
+
+    "usage" sums the tokens of every model call. "metrics" adds model and
+    tool wall time and the tool_result bytes each tool added to the
+    context; the same totals are logged as one chat_metrics JSON line.
+
+    Args:
+        bedrock: bedrock-runtime client
+        model_id: Bedrock model ID of the large model
+        system_prompt: System prompt text
+        messages: Conversation so far, ending with the new user message (extended in place)
+        tools: Tool definitions
+        execute: Callable (tool_name, tool_input) -> JSON-serializable result
+        status_tracker: StatusTracker for this request
+        memo: Optional RequestMemo for tool-call memoization
+        max_tokens: Output token limit per model call
+        stream: Use invoke_model_with_response_stream and yield text deltas
+        result_columns: Optional {tool_name: [columns]}; when given, item lists in
+                        tool results are sent to the model as compact tables
+        deadline: Deadline for this invocation (defaults to the fallback budget)
+        max_iterations: Maximum number of tool rounds
+        tool_domain: Optional callable (tool_name, tool_input) -> domain, the key
+                     of the per-domain circuit breaker (see run_tool_calls)
+    """
+    if result_columns is not None:
+        execute = projecting(execute, result_columns)
+    deadline = deadline or Deadline()
+    router = ModelRouter(model_id, messages[-1]["content"])
+
+    metrics = ChatMetrics()
+    start_time = time.time()
+    status_sent = 0
+    turn = 0
+    final = False
+
+    while True:
+        if turn and (turn >= max_iterations or not deadline.has_time(FINAL_RESERVE_MS)):
+            final = True
+            reason = "iteration limit" if turn >= max_iterations else "time budget"
+            status_tracker.add("ai_processing", f"Stopping tool use ({reason}); answering with partial results",
+                               {"iterations": turn, "remaining_ms": deadline.remaining_ms()})
+        routed_model, route_reason = router.route(turn, final)
+
+        while True:
+            candidates = router.candidates(routed_model)
+            fallback_from = None
+            held = []       # Text of a fast-model reply, released once it turns out to dispatch tools
+            for candidate in candidates:
+                fast = router.tier_of(candidate) == "fast"
+                if final:
+                    body = build_chat_body(candidate, system_prompt, _with_final_note(messages), tools,
+                                           min(max_tokens, FINAL_MAX_TOKENS))
+                else:
+                    body = build_chat_body(candidate, system_prompt, messages, tools, max_tokens)
+                call_start = time.time()
+                produced_text = False
+                try:
+                    if stream:
+                        deltas = _invoke_streaming(bedrock, candidate, body)
+                        while True:
+                            try:
+                                text = next(deltas)
+                            except StopIteration as stop:
+                                response_body = stop.value
+                                break
+                            if fast:
+                                held.append(text)
+                                continue
+                            produced_text = True
+                            yield {"type": "text", "turn": turn, "text": text}
+                    else:
+                        response = bedrock.invoke_model(modelId=candidate, body=body)
+                        response_body = json.loads(response["body"].read())
+                except Exception as e:
+                    # Before any output, capacity errors (and any fast-model error) move on to the next
+                    # model; anything else fails the request
+                    if produced_text or candidate == candidates[-1] or not (fast or is_throttled(e)):
+                        raise
+                    held = []
+                    call_ms = int((time.time() - call_start) * 1000)
+                    metrics.record_model(None, call_ms)
+                    router.record(status_tracker, turn, candidate, route_reason, call_ms, error=type(e).__name__)
+                    fallback_from = fallback_from or candidate
+                    continue
+                call_ms = int((time.time() - call_start) * 1000)
+                metrics.record_model(response_body.get("usage"), call_ms)
+                router.record(status_tracker, turn, candidate, route_reason, call_ms, fallback_from=fallback_from)
+                break
+
+            if router.is_dispatch(candidate, response_body):
+                break
+            # The fast model answered instead of calling tools: answers come from the large model
+            routed_model, route_reason = router.model_id, "fast model answered; repeated on the large model"
+
+        for text in held:
+            yield {"type": "text", "turn": turn, "text": text}
+
+        if response_body.get("stop_reason") != "tool_use":
+            break
+        if final:
+            # Tools are not run any more: keep only the text so the returned conversation stays valid
+            text_blocks = [block for block in response_body["content"] if block.get("type") == "text"]
+            response_body["content"] = text_blocks or [{"type": "text", "text": FALLBACK_ANSWER}]
+            break
+
+        messages.append({"role": "assistant", "content": response_body["content"]})
+        tool_names = [block["name"] for block in response_body["content"] if block.get("type") == "tool_use"]
+        status_tracker.add("tool_execution", f"Running {', '.join(tool_names)}", {"tools": tool_names})
+
+        # Let clients see which tools are running before they finish
+        for message in status_tracker.messages[status_sent:]:
+            yield {"type": "status", **message}
+        status_sent = len(status_tracker.messages)
+
+        tools_start = time.time()
+        # Tools may use CHAT_TOOL_TIMEOUT_MS, but not the time kept back for the answer
+        timeout_ms = min(TOOL_TIMEOUT_MS, max(MIN_TOOL_TIMEOUT_MS, deadline.remaining_ms() - FINAL_RESERVE_MS))
+        tool_results = run_tool_calls(response_body["content"], execute, status_tracker, memo, metrics,
+                                      timeout_ms=timeout_ms, tool_domain=tool_domain)
+        metrics.record_tool_turn(int((time.time() - tools_start) * 1000))
+        messages.append({"role": "user", "content": tool_results})
+
+        for message in status_tracker.messages[status_sent:]:
+            yield {"type": "status", **message}
+        status_sent = len(status_tracker.messages)
+        turn += 1
+
+    for message in status_tracker.messages[status_sent:]:
+        yield {"type": "status", **message}
+
+    summary = metrics.summary(int((time.time() - start_time) * 1000))
+    metrics.log(summary, model_id=model_id, iterations=turn, partial=final, stream=stream)
+
+    assistant_content = response_body["content"]
+    yield {
+        "type": "done",
+        "response": next((block["text"] for block in assistant_content if block["type"] == "text"), ""),
+        "usage": summary["usage"],
+        "conversation": messages + [{"role": "assistant", "content": assistant_content}],
+        "status_messages": status_tracker.get_messages(),
+        "partial": final,
+        "model_calls": router.calls,
+        "metrics": summary,
+    }
+
+
+def chat_response(events, stream=False, live=False):
+    """
+    Turn chat events into an API Gateway response.
+
+    Non-streaming requests get the final result as JSON. Streaming requests
+    get every event as NDJSON, in order; a failure after events have been
+    produced is reported as a final {"type": "error"} line.
+
+    With `live` (requests served by shared.chat_stream through a streaming
+    function URL) the body is a generator and each event is sent as soon as
+    it is produced. Otherwise the API Gateway proxy integration buffers the
+    response, so the NDJSON body is only the ordered record of the request.
+    """
+    if not stream:
+        result = None
+        for event in events:
+            if event["type"] == "done":
+                result = {k: v for k, v in event.items() if k != "type"}
+        return _resp(200, result)
+
+    if live:
+        return _ndjson_stream_resp(200, _with_error_line(events))
+    return _ndjson_resp(200, list(_with_error_line(events)))
+
+
+def _with_error_line(events):
+    """Pass events through, ending with an error event if producing them fails"""
+    try:
+        yield from events
+    except Exception as e:
+        print(f"Chat stream error: {str(e)}")
+        yield {"type": "error", "error": "chat_error", "message": str(e)}
@@ -0,0 +1,127 @@
+"""Token-budgeted compaction of client-supplied chat history"""
+import os
+import json
+from .responses import decimal_default
+
+
+HISTORY_TOKEN_BUDGET = int(os.environ.get("CHAT_HISTORY_TOKEN_BUDGET", "8000"))
+KEEP_RECENT_TURNS = int(os.environ.get("CHAT_HISTORY_KEEP_TURNS", "2"))
+
+CHARS_PER_TOKEN = 4     # Rough average for English text and JSON
+MAX_SUMMARY_IDS = 10
+
+
+def estimate_tokens(value):
+    """Fast local token estimate for a string or JSON-like value (~4 characters per token)"""
+    if not isinstance(value, str):
+        value = json.dumps(value, default=decimal_default)
+    return len(value) // CHARS_PER_TOKEN + 1
+
+
+def _is_turn_start(message):
+    """A turn starts with a user message carrying text rather than tool results"""
+    if message.get("role") != "user":
+        return False
+    content = message.get("content")
+    if isinstance(content, str):
+        return True
+    return not any(isinstance(block, dict) and block.get("type") == "tool_result" for block in content or [])
+
+
+def _split_turns(history):
+    turns = []
+    for message in history:
+        if not turns or _is_turn_start(message):
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _summarize_result(content):
+    """Short stand-in for a tool_result payload: list sizes, counts, errors and item ids"""
+    if isinstance(content, list):
+        content = "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return f"[earlier tool result compacted: {len(content or '')} characters]"
+    if not isinstance(data, dict):
+        return "[earlier tool result compacted]"
+
+    parts = []
+    for key, value in data.items():
+        if isinstance(value, list):
+            ids = [str(item["id"]) for item in value if isinstance(item, dict) and "id" in item][:MAX_SUMMARY_IDS]
+            parts.append(f"{key}: {len(value)} items" + (f" (ids: {', '.join(ids)})" if ids else ""))
+        elif isinstance(value, dict) and "columns" in value and "rows" in value:
+            # Table-encoded item list (see tool_projection); id is always the first column
+            ids = [str(row[0]) for row in value["rows"]][:MAX_SUMMARY_IDS]
+            parts.append(f"{key}: {len(value['rows'])} items" + (f" (ids: {', '.join(ids)})" if ids else ""))
+        elif isinstance(value, dict):
+            parts.append(f"{key}: {value['id']}" if "id" in value else f"{key}: object")
+        elif key in ("count", "error", "total"):
+            parts.append(f"{key}: {value}")
+    return f"[earlier tool result compacted; {'; '.join(parts) or 'no details'}]"
+
+
+def _compact_message(message):
+    content = message.get("content")
+    if isinstance(content, str):
+        return message
+    compacted = []
+    for block in content or []:
+        if isinstance(block, dict) and block.get("type") == "tool_result":
+            block = {**block, "content": _summarize_result(block.get("content"))}
+        compacted.append(block)
+    return {**message, "content": compacted}
+
+
+def compact_history(history, budget=HISTORY_TOKEN_BUDGET, keep_recent_turns=KEEP_RECENT_TURNS, status_tracker=None):
+    """
+    Fit client-supplied conversation history into a token budget.
+
+    The most recent turns are kept verbatim. In older turns, tool_result
+    payloads are replaced by a one-line summary (tool_use/tool_result pairs
+    stay intact so the transcript remains valid). If that is still over
+    budget, the oldest whole turns are dropped. Leading messages that do not
+    open a turn (e.g. tool results whose tool_use was cut off when history
+    was loaded in chunks) are always removed, even under budget.
+
+    Args:
+        history: Messages from the client (Anthropic messages format)
+        budget: Token budget for the history
+        keep_recent_turns: Number of trailing turns never compacted
+        status_tracker: Optional StatusTracker to report compaction
+
+    Returns:
+        The compacted list of messages (history itself is not modified)
+    """
+    if not isinstance(history, list):
+        return []
+    history = [m for m in history if isinstance(m, dict) and m.get("role") in ("user", "assistant")]
+    # The transcript must open with a real user turn (not orphaned tool results)
+    while history and not _is_turn_start(history[0]):
+        history.pop(0)
+
+    before = estimate_tokens(history)
+    if before <= budget:
+        return history
+
+    turns = _split_turns(history)
+    keep = max(keep_recent_turns, 0)
+    old, recent = (turns[:-keep], turns[-keep:]) if keep else (turns, [])
+    old = [[_compact_message(message) for message in turn] for turn in old]
+
+    recent_tokens = sum(estimate_tokens(turn) for turn in recent)
+    old_tokens = [estimate_tokens(turn) for turn in old]
+    while old and recent_tokens + sum(old_tokens) > budget:
+        old.pop(0)
+        old_tokens.pop(0)
+
+    compacted = [message for turn in old + recent for message in turn]
+
+    if status_tracker:
+        after = estimate_tokens(compacted)
+        status_tracker.add("history_compaction", f"Compacted history from ~{before} to ~{after} tokens",
+                           {"tokens_before": before, "tokens_after": after, "budget": budget})
+    return compacted
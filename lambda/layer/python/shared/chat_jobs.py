@@ -0,0 +1,267 @@
+"""Asynchronous staff chat jobs: queued on SQS, run by a worker, polled via GET /chat/{jobId}"""
+import json
+import os
+import time
+import uuid
+import boto3
+from botocore.exceptions import ClientError
+from .responses import _resp, decimal_default
+
+
+ddb = boto3.client("dynamodb")
+sqs = boto3.client("sqs")
+s3 = boto3.client("s3")
+CHAT_JOBS_TABLE = os.environ.get("CHAT_JOBS_TABLE", "")
+CHAT_JOBS_QUEUE_URL = os.environ.get("CHAT_JOBS_QUEUE_URL", "")
+DOCS_BUCKET = os.environ.get("DOCS_BUCKET", "")
+# Recorded on each job so that a multi-vertical gateway can route the queued message
+VERTICAL = os.environ.get("VERTICAL", "")
+
+CHAT_JOB_TTL_SECONDS = int(os.environ.get("CHAT_JOB_TTL_SECONDS", str(24 * 60 * 60)))
+MAX_JOB_ATTEMPTS = 2            # A worker that timed out gets one redelivery before the job fails
+MAX_INLINE_BYTES = 350 * 1024   # DynamoDB items are capped at 400 KB; larger results go to the docs bucket
+RESULT_PREFIX = "chat-jobs"
+
+
+def _dumps(value):
+    return json.dumps(value, default=decimal_default)
+
+
+def _update(job_id, expression, values, **kwargs):
+    """update_item on a job; #status, #result and #error stand for the reserved attribute names"""
+    used = expression + kwargs.get("ConditionExpression", "")
+    names = {name: name[1:] for name in ("#status", "#result", "#error") if name in used}
+    return ddb.update_item(
+        TableName=CHAT_JOBS_TABLE,
+        Key={"jobId": {"S": job_id}},
+        UpdateExpression=expression,
+        ExpressionAttributeValues=values,
+        **({"ExpressionAttributeNames": names} if names else {}),
+        **kwargs,
+    )
+
+
+def wants_chat_job(event):
+    """Whether a POST /chat request asks for async mode ("async": true)"""
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except (ValueError, TypeError):
+        return False
+    return isinstance(body, dict) and body.get("async") is True
+
+
+def start_chat_job(event, handle_chat, storage, context=None):
+    """
+    Handle POST /chat with "async": true - queue the request as a chat job.
+
+    The request (minus "async" and "stream") is stored with the job and the
+    job ID is sent to CHAT_JOBS_QUEUE_URL; the chat job worker runs it with
+    the same handle_chat. Without a queue (local development) the job runs
+    inline before returning.
+
+    Args:
+        event: API Gateway event of the POST /chat request
+        handle_chat: The vertical's staff handle_chat(event, storage, context)
+        storage: Storage backend
+        context: Lambda context
+
+    Returns:
+        202 response with the job ID and the path to poll
+    """
+    if not CHAT_JOBS_TABLE:
+        return _resp(400, {"error": "chat_jobs_unavailable", "message": "Asynchronous chat is not enabled"})
+
+    body = json.loads(event.get("body") or "{}")
+    if not body.get("message"):
+        return _resp(400, {"error": "message_required", "message": "Message is required"})
+    request = _dumps({k: v for k, v in body.items() if k not in ("async", "stream")})
+    if len(request.encode("utf-8")) > MAX_INLINE_BYTES:
+        return _resp(413, {"error": "request_too_large",
+                           "message": "Chat history is too large for a job; use a session (\"session\": true) instead"})
+
+    job_id = str(uuid.uuid4())
+    now = int(time.time())
+    ddb.put_item(
+        TableName=CHAT_JOBS_TABLE,
+        Item={
+            "jobId": {"S": job_id},
+            "status": {"S": "QUEUED"},
+            "request": {"S": request},
+            "progress": {"L": []},
+            "attempts": {"N": "0"},
+            "createdAt": {"N": str(now)},
+            "updatedAt": {"N": str(now)},
+            "expiresAt": {"N": str(now + CHAT_JOB_TTL_SECONDS)},
+        },
+    )
+
+    job = {"jobId": job_id, "vertical": VERTICAL}
+    if CHAT_JOBS_QUEUE_URL:
+        sqs.send_message(QueueUrl=CHAT_JOBS_QUEUE_URL, MessageBody=json.dumps({"chatJob": job}))
+    else:
+        # Local development: no queue available
+        run_chat_job(job, handle_chat, storage, context)
+
+    return _resp(202, {"jobId": job_id, "status": "QUEUED", "statusPath": f"/chat/{job_id}"})
+
+
+def _claim(job_id):
+    """Mark a job RUNNING; returns its stored request, or None if it is finished or out of attempts"""
+    try:
+        item = _update(
+            job_id,
+            "SET #status = :running, startedAt = :now, updatedAt = :now ADD attempts :one",
+            {":running": {"S": "RUNNING"}, ":queued": {"S": "QUEUED"},
+             ":now": {"N": str(int(time.time()))}, ":one": {"N": "1"}},
+            ConditionExpression="#status IN (:queued, :running)",
+            ReturnValues="ALL_NEW",
+        )["Attributes"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return None     # Finished already (duplicate delivery) or expired
+        raise
+    if int(item["attempts"]["N"]) > MAX_JOB_ATTEMPTS:
+        _finish(job_id, "FAILED", error={"error": "chat_job_abandoned",
+                                         "message": f"Chat job did not finish in {MAX_JOB_ATTEMPTS} attempts"})
+        return None
+    return json.loads(item["request"]["S"])
+
+
+def _finish(job_id, status, result=None, error=None):
+    """Store the outcome; results too large for the item are written to the docs bucket"""
+    values = {":status": {"S": status}, ":now": {"N": str(int(time.time()))}}
+    expression = "SET #status = :status, finishedAt = :now, updatedAt = :now"
+    if result is not None:
+        payload = _dumps(result)
+        if len(payload.encode("utf-8")) > MAX_INLINE_BYTES and DOCS_BUCKET:
+            key = f"{RESULT_PREFIX}/{job_id}.json"
+            s3.put_object(Bucket=DOCS_BUCKET, Key=key, Body=payload.encode("utf-8"), ContentType="application/json")
+            expression += ", resultKey = :key"
+            values[":key"] = {"S": key}
+        else:
+            expression += ", #result = :result"
+            values[":result"] = {"S": payload}
+    if error is not None:
+        expression += ", #error = :error"
+        values[":error"] = {"S": _dumps(error)}
+    _update(job_id, expression, values)
+
+
+def run_chat_job(job, handle_chat, storage, context=None):
+    """
+    Run one chat job: the stored request through handle_chat, with status
+    messages appended to the job as progress and the response stored as its result.
+
+    Args:
+        job: {"jobId", "vertical"} as queued by start_chat_job
+        handle_chat: The vertical's staff handle_chat(event, storage, context)
+        storage: Storage backend
+        context: Lambda context of the worker (its remaining time is the chat's time budget)
+
+    Returns:
+        Final job status, or None when the job was not run
+    """
+    job_id = job["jobId"]
+    request = _claim(job_id)
+    if request is None:
+        print(f"Chat job {job_id} not run (finished or out of attempts)")
+        return None
+
+    job_event = {"httpMethod": "POST", "path": "/chat", "body": _dumps(request), "chatJob": job}
+    try:
+        response = handle_chat(job_event, storage, context)
+        body = json.loads(response["body"])
+        status = "COMPLETE" if response["statusCode"] == 200 else "FAILED"
+    except Exception as e:
+        print(f"Chat job error ({job_id}): {str(e)}")
+        body, status = {"error": "chat_error", "message": str(e)}, "FAILED"
+
+    if status == "COMPLETE":
+        _finish(job_id, status, result=body)
+    else:
+        _finish(job_id, status, error=body)
+    print(f"Chat job {job_id} {status.lower()}")
+    return status
+
+
+def handle_chat_job_records(event, handle_chat, storage, context=None):
+    """
+    Chat job worker entry point for an SQS event.
+
+    Jobs that fail inside the chat are recorded as FAILED and acknowledged;
+    only infrastructure errors leave a message for redelivery.
+
+    Returns:
+        {"batchItemFailures": [...]} for partial batch responses
+    """
+    failures = []
+    for record in event["Records"]:
+        try:
+            run_chat_job(json.loads(record["body"])["chatJob"], handle_chat, storage, context)
+        except Exception as e:
+            print(f"Chat job worker error ({record.get('messageId')}): {str(e)}")
+            failures.append({"itemIdentifier": record["messageId"]})
+    return {"batchItemFailures": failures}
+
+
+def get_chat_job(job_id):
+    """Handle GET /chat/{jobId} - job status, progress messages and, once finished, the result"""
+    if not CHAT_JOBS_TABLE:
+        return _resp(400, {"error": "chat_jobs_unavailable", "message": "Asynchronous chat is not enabled"})
+    item = ddb.get_item(TableName=CHAT_JOBS_TABLE, Key={"jobId": {"S": job_id}}, ConsistentRead=True).get("Item")
+    if not item or int(item["expiresAt"]["N"]) <= time.time():
+        return _resp(404, {"error": "not_found", "jobId": job_id})
+
+    job = {
+        "jobId": job_id,
+        "status": item["status"]["S"],
+        "progress": [json.loads(message["S"]) for message in item.get("progress", {}).get("L", [])],
+    }
+    for field in ("createdAt", "startedAt", "finishedAt"):
+        if field in item:
+            job[field] = int(item[field]["N"])
+    if "resultKey" in item:
+        job["result"] = json.loads(s3.get_object(Bucket=DOCS_BUCKET, Key=item["resultKey"]["S"])["Body"].read())
+    elif "result" in item:
+        job["result"] = json.loads(item["result"]["S"])
+    if "error" in item:
+        job["error"] = json.loads(item["error"]["S"])
+    return _resp(200, job)
+
+
+class ChatJobProgress:
+    """Appends a running job's status messages to its item as they are produced"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def record(self, events):
+        """
+        Pass chat events through, storing each status message as progress.
+
+        Failures are logged, not raised: progress is informational and the
+        result is still stored when the chat finishes.
+
+        Yields:
+            The same events
+        """
+        for event in events:
+            if event["type"] == "status":
+                message = {k: v for k, v in event.items() if k != "type"}
+                try:
+                    _update(
+                        self.job_id,
+                        "SET progress = list_append(progress, :message), updatedAt = :now",
+                        {":message": {"L": [{"S": _dumps(message)}]}, ":now": {"N": str(int(time.time()))}},
+                    )
+                except Exception as e:
+                    print(f"Chat job progress update failed ({self.job_id}): {str(e)}")
+            yield event
+
+
+def open_chat_job(event):
+    """ChatJobProgress for an invocation made by the chat job worker, else None"""
+    job = event.get("chatJob")
+    if not job or not CHAT_JOBS_TABLE:
+        return None
+    return ChatJobProgress(job["jobId"])
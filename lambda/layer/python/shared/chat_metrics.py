@@ -0,0 +1,68 @@
+"""Per-request accounting for the chat tool loop: tokens, model time, tool time and result sizes"""
+import json
+import threading
+from .chat_request import add_usage, USAGE_FIELDS
+
+
+class ChatMetrics:
+    """
+    Totals for one chat request, summed over every model call and tool call.
+
+    Tool calls of one turn run concurrently, so recording is locked. Tool
+    time is kept both as wall time per turn (what the request waited) and
+    per tool (what each tool cost, summed over its calls).
+    """
+
+    def __init__(self):
+        self.usage = add_usage({}, None)
+        self.model_calls = 0
+        self.model_ms = 0
+        self.tool_ms = 0
+        self.tools = {}
+        self.lock = threading.Lock()
+
+    def record_model(self, usage, elapsed_ms):
+        """One model call (failed attempts count towards time, with no usage)"""
+        self.model_calls += 1
+        self.model_ms += elapsed_ms
+        add_usage(self.usage, usage)
+
+    def record_tool_turn(self, elapsed_ms):
+        """Wall time of one turn's tool calls"""
+        self.tool_ms += elapsed_ms
+
+    def record_tool(self, tool_name, result_bytes, elapsed_ms, failed=False, cached=False):
+        """One tool call and the size of the tool_result content it adds to the context"""
+        with self.lock:
+            totals = self.tools.setdefault(tool_name, {"calls": 0, "result_bytes": 0, "ms": 0, "errors": 0, "cached": 0})
+            totals["calls"] += 1
+            totals["result_bytes"] += result_bytes
+            totals["ms"] += elapsed_ms
+            totals["errors"] += int(failed)
+            totals["cached"] += int(cached)
+
+    def summary(self, total_ms):
+        """
+        Request totals.
+
+        Args:
+            total_ms: Wall time of the whole tool loop
+
+        Returns:
+            {"usage", "model_calls", "model_ms", "tool_ms", "other_ms", "tool_result_bytes", "tools"}
+        """
+        return {
+            "usage": dict(self.usage),
+            "model_calls": self.model_calls,
+            "model_ms": self.model_ms,
+            "tool_ms": self.tool_ms,
+            "other_ms": max(0, total_ms - self.model_ms - self.tool_ms),
+            "tool_result_bytes": sum(totals["result_bytes"] for totals in self.tools.values()),
+            "tools": {name: dict(totals) for name, totals in self.tools.items()},
+        }
+
+    def log(self, summary, **fields):
+        """One JSON log line per request (queryable with CloudWatch Logs Insights)"""
+        record = {"event": "chat_metrics", **fields, **{key: value for key, value in summary.items() if key != "usage"}}
+        record.update({field: summary["usage"].get(field, 0) for field in USAGE_FIELDS})
+        print(json.dumps(record, default=str))
@@ -0,0 +1,88 @@
+"""Bedrock request building for the Anthropic messages API, with prompt caching"""
+import os
+import json
+from .responses import decimal_default
+
+
+ANTHROPIC_VERSION = "bedrock-2023-05-31"
+
+# "auto" enables cache_control only for models that support prompt caching on Bedrock
+PROMPT_CACHING = os.environ.get("BEDROCK_PROMPT_CACHING", "auto").lower()
+CACHING_MODELS = [
+    "claude-3-5-haiku",
+    "claude-3-5-sonnet-20241022",
+    "claude-3-7-sonnet",
+    "claude-sonnet-4",
+    "claude-opus-4",
+    "claude-haiku-4",
+]
+
+USAGE_FIELDS = ["input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"]
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def prompt_caching_enabled(model_id):
+    """Whether requests for this model should carry cache_control breakpoints"""
+    if PROMPT_CACHING in ("true", "1", "yes"):
+        return True
+    if PROMPT_CACHING == "auto":
+        return any(name in model_id for name in CACHING_MODELS)
+    return False
+
+
+def _with_cache_breakpoint(message):
+    """Copy of a message whose last content block carries cache_control"""
+    content = message["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    if not content:
+        return message
+    return {**message, "content": content[:-1] + [{**content[-1], "cache_control": CACHE_CONTROL}]}
+
+
+def build_chat_body(model_id, system_prompt, messages, tools, max_tokens=4096, temperature=0.7):
+    """
+    Build the invoke_model body for one step of a chat tool loop.
+
+    With prompt caching enabled, breakpoints are placed on the tool schemas,
+    the system prompt and the latest message, so each loop iteration reads
+    the previous iteration's prefix from cache instead of re-sending it as
+    fresh input tokens. The caller's messages list is not modified.
+
+    Args:
+        model_id: Bedrock model ID (decides whether caching applies)
+        system_prompt: System prompt text
+        messages: Conversation so far (Anthropic messages format)
+        tools: Tool definitions
+        max_tokens: Output token limit
+        temperature: Sampling temperature
+
+    Returns:
+        JSON request body string
+    """
+    body = {
+        "anthropic_version": ANTHROPIC_VERSION,
+        "max_tokens": max_tokens,
+        "system": system_prompt,
+        "messages": messages,
+        "tools": tools,
+        "temperature": temperature,
+    }
+
+    if prompt_caching_enabled(model_id):
+        # Cache prefix order is tools -> system -> messages
+        if tools:
+            body["tools"] = tools[:-1] + [{**tools[-1], "cache_control": CACHE_CONTROL}]
+        body["system"] = [{"type": "text", "text": system_prompt, "cache_control": CACHE_CONTROL}]
+        if messages:
+            body["messages"] = messages[:-1] + [_with_cache_breakpoint(messages[-1])]
+
+    return json.dumps(body, default=decimal_default)
+
+
+def add_usage(total, usage):
+    """Accumulate one response's token usage (including cache reads/writes) into total"""
+    for field in USAGE_FIELDS:
+        total[field] = total.get(field, 0) + (usage or {}).get(field, 0)
+    return total
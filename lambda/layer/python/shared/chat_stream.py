@@ -0,0 +1,109 @@
+"""Live chat streaming through a Lambda function URL in RESPONSE_STREAM mode
+
+The Python managed runtime cannot stream a response itself, and the API
+Gateway proxy integration buffers whole responses. Each vertical therefore
+also deploys a chat stream function that runs behind the Lambda Web Adapter
+layer: its run.sh starts `python -m shared.chat_stream`, a small HTTP
+server that turns each request into an API Gateway proxy event for the
+vertical's handler. Chat responses to {"stream": true} requests come back
+with a generator body (see chat_engine.chat_response), which is written as
+chunked NDJSON while the events are produced; the adapter forwards every
+chunk to the client, so text deltas arrive as the model emits them.
+"""
+import os
+import json
+import time
+import importlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+from .responses import _resp
+
+
+# The adapter forwards requests to this port (AWS_LWA_PORT, else PORT)
+PORT = int(os.environ.get("AWS_LWA_PORT") or os.environ.get("PORT", "8080"))
+HANDLER_MODULE = os.environ.get("CHAT_STREAM_HANDLER", "handler")
+
+# Marks events received by this server: only it can write a generator body
+LIVE_STREAM_KEY = "liveStream"
+
+
+def wants_live_stream(event):
+    """Whether the response to this event may be a live stream (generator body)"""
+    return bool(event.get(LIVE_STREAM_KEY))
+
+
+class _Context:
+    """The part of the Lambda context the handlers use, from the adapter's x-amzn-lambda-context header"""
+
+    def __init__(self, header):
+        try:
+            self.deadline_ms = int(json.loads(header)["deadline"]) if header else None
+        except (ValueError, KeyError, TypeError):
+            self.deadline_ms = None
+
+    def get_remaining_time_in_millis(self):
+        if self.deadline_ms is None:
+            return 2 ** 31
+        return max(self.deadline_ms - int(time.time() * 1000), 0)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    handler = None      # The vertical's Lambda handler, set by serve()
+
+    def _event(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("content-length") or 0)
+        return {
+            "httpMethod": self.command,
+            "path": url.path or "/",
+            "queryStringParameters": dict(parse_qsl(url.query)) or None,
+            "headers": dict(self.headers.items()),
+            "body": self.rfile.read(length).decode("utf-8") if length else None,
+            LIVE_STREAM_KEY: True,
+        }
+
+    def _handle(self):
+        try:
+            response = self.handler(self._event(), _Context(self.headers.get("x-amzn-lambda-context")))
+        except Exception as e:
+            print(f"Chat stream handler error: {str(e)}")
+            response = _resp(500, {"error": "internal_error", "message": str(e)})
+
+        body = response.get("body") or ""
+        self.send_response(response.get("statusCode", 200))
+        for key, value in (response.get("headers") or {}).items():
+            self.send_header(key, value)
+        if isinstance(body, str):
+            payload = body.encode("utf-8")
+            self.send_header("content-length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        # One chunk per NDJSON line, flushed as soon as it is produced
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+        for line in body:
+            data = line.encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = _handle
+
+    def log_message(self, format, *args):
+        pass    # The handlers log their own requests
+
+
+def serve(handler, port=PORT):
+    """Serve a Lambda handler over HTTP until the process ends"""
+    request_handler = type("RequestHandler", (_RequestHandler,), {"handler": staticmethod(handler)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), request_handler)
+    server.daemon_threads = True
+    print(f"Chat stream server listening on port {port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve(importlib.import_module(HANDLER_MODULE).handler)
@@ -0,0 +1,66 @@
+"""Per-key circuit breaker kept in the warm container (shared by all requests it serves)"""
+import os
+import threading
+import time
+
+
+FAILURE_THRESHOLD = int(os.environ.get("CHAT_TOOL_BREAKER_FAILURES", "3"))
+RESET_SECONDS = float(os.environ.get("CHAT_TOOL_BREAKER_RESET_SECONDS", "30"))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row a key is open: calls are
+    refused for `reset_seconds`. Then one trial call is let through
+    (half-open); its success closes the key, its failure opens it again.
+
+    Args:
+        failure_threshold: Consecutive failures that open a key
+        reset_seconds: How long an open key refuses calls before a trial
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_seconds=RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = {}     # key -> {"failures", "opened_at", "trial"}
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        """
+        Whether a call for key may run now.
+
+        Returns:
+            (allowed, retry_after_seconds); retry_after is 0 when allowed
+        """
+        with self.lock:
+            entry = self.state.get(key)
+            if not entry or entry["opened_at"] is None:
+                return True, 0
+            waited = time.time() - entry["opened_at"]
+            if waited < self.reset_seconds or entry["trial"]:
+                return False, max(1, int(self.reset_seconds - waited))
+            entry["trial"] = True
+            return True, 0
+
+    def record_success(self, key):
+        with self.lock:
+            self.state.pop(key, None)
+
+    def record_failure(self, key):
+        """Count a failure; returns True when the key is (now) open"""
+        with self.lock:
+            entry = self.state.setdefault(key, {"failures": 0, "opened_at": None, "trial": False})
+            entry["failures"] += 1
+            if entry["trial"] or entry["failures"] >= self.failure_threshold:
+                if entry["opened_at"] is None or entry["trial"]:
+                    print(f"Circuit opened for {key} after {entry['failures']} consecutive failures")
+                entry["opened_at"] = time.time()
+                entry["trial"] = False
+                return True
+            return False
+
+
+# Chat tool calls, keyed by the domain they read
+TOOL_BREAKER = CircuitBreaker()
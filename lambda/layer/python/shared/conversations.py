@@ -0,0 +1,158 @@
+"""Server-side chat sessions: conversation history persisted in DynamoDB"""
+import json
+import os
+import time
+import uuid
+import boto3
+from botocore.exceptions import ClientError
+from .chat_history import _compact_message
+from .responses import decimal_default
+
+
+ddb = boto3.client("dynamodb")
+CONVERSATIONS_TABLE = os.environ.get("CONVERSATIONS_TABLE", "")
+
+CONVERSATION_TTL_SECONDS = int(os.environ.get("CONVERSATION_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+MAX_CHUNK_BYTES = 350 * 1024    # DynamoDB items are capped at 400 KB
+MAX_LOADED_CHUNKS = 20          # Older chunks are not read back (and expire via TTL)
+
+
+class ConversationError(ValueError):
+    """Raised for session requests that cannot be served"""
+
+    def __init__(self, status_code, error, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.error = error
+
+
+def _dumps(value):
+    return json.dumps(value, default=decimal_default)
+
+
+def _chunks(messages):
+    """
+    Split messages into lists whose JSON stays under MAX_CHUNK_BYTES.
+    A single oversized message has its tool results summarized first.
+    """
+    chunks, current, size = [], [], 0
+    for message in messages:
+        message_size = len(_dumps(message).encode("utf-8"))
+        if message_size > MAX_CHUNK_BYTES:
+            message = _compact_message(message)
+            message_size = len(_dumps(message).encode("utf-8"))
+        if current and size + message_size > MAX_CHUNK_BYTES:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(message)
+        size += message_size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class ConversationSession:
+    """
+    One server-side conversation.
+
+    Stored as chunk items (conversationId, seq) holding a JSON list of
+    messages; every request appends new chunks with a fresh TTL, so the
+    oldest chunks expire first and a session naturally keeps its recent
+    history only.
+    """
+
+    def __init__(self, conversation_id, owner, history, next_seq):
+        self.conversation_id = conversation_id
+        self.owner = owner
+        self.history = history
+        self.next_seq = next_seq
+
+    @classmethod
+    def load(cls, conversation_id, owner):
+        """Read the most recent chunks of a conversation owned by owner"""
+        response = ddb.query(
+            TableName=CONVERSATIONS_TABLE,
+            KeyConditionExpression="conversationId = :id",
+            ExpressionAttributeValues={":id": {"S": conversation_id}},
+            ScanIndexForward=False,
+            Limit=MAX_LOADED_CHUNKS,
+        )
+        items = response.get("Items", [])
+        # Another owner's conversation is reported exactly like a missing one
+        if not items or any(item["owner"]["S"] != owner for item in items):
+            raise ConversationError(404, "conversation_not_found", f"Conversation {conversation_id} not found or expired")
+
+        history = []
+        for item in reversed(items):
+            history.extend(json.loads(item["messages"]["S"]))
+        return cls(conversation_id, owner, history, int(items[0]["seq"]["N"]) + 1)
+
+    def append(self, messages):
+        """Persist new messages as one or more chunks"""
+        expires_at = int(time.time()) + CONVERSATION_TTL_SECONDS
+        for chunk in _chunks(messages):
+            try:
+                ddb.put_item(
+                    TableName=CONVERSATIONS_TABLE,
+                    Item={
+                        "conversationId": {"S": self.conversation_id},
+                        "seq": {"N": str(self.next_seq)},
+                        "owner": {"S": self.owner},
+                        "messages": {"S": _dumps(chunk)},
+                        "expiresAt": {"N": str(expires_at)},
+                    },
+                    ConditionExpression="attribute_not_exists(seq)",
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                    raise ConversationError(409, "conversation_conflict",
+                                            "Conversation was updated by another request; please retry")
+                raise
+            self.next_seq += 1
+
+    def record(self, events, first_new):
+        """
+        Persist the turn produced by chat events and strip the full transcript.
+
+        Args:
+            events: Events from chat_events
+            first_new: Index in the conversation of this request's user message
+
+        Yields:
+            The same events; "done" carries conversationId instead of conversation
+        """
+        for event in events:
+            if event["type"] == "done":
+                self.append(event["conversation"][first_new:])
+                event = {k: v for k, v in event.items() if k != "conversation"}
+                event["conversationId"] = self.conversation_id
+            yield event
+
+
+def open_session(body, owner):
+    """
+    Start or resume a server-side session for a chat request.
+
+    Session mode is used when the request carries a conversationId (resume)
+    or "session": true (start). Clients then send only the new message and
+    receive only the new answer; history is read from and appended to
+    CONVERSATIONS_TABLE.
+
+    Args:
+        body: Parsed chat request body
+        owner: Identity the conversation belongs to (customer email, or "staff")
+
+    Returns:
+        ConversationSession, or None for a stateless request
+
+    Raises:
+        ConversationError: Sessions not configured, or conversation missing/expired
+    """
+    conversation_id = body.get("conversationId")
+    if not conversation_id and not body.get("session"):
+        return None
+    if not CONVERSATIONS_TABLE:
+        raise ConversationError(400, "sessions_unavailable", "Server-side conversations are not enabled")
+    if not conversation_id:
+        return ConversationSession(str(uuid.uuid4()), owner, [], 1)
+    return ConversationSession.load(str(conversation_id), owner)
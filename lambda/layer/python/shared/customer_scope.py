@@ -0,0 +1,53 @@
+"""Per-request customer context for customer-facing chatbots"""
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CustomerScope:
+    """
+    The signed-in customer of one chat request, resolved once.
+
+    Holds the customer record and the customer's items in the owned domains
+    (read through the customerId GSI), so tools can reuse them and ownership
+    checks are set lookups instead of storage reads.
+    """
+
+    def __init__(self, customer, owned_items):
+        self.customer = customer
+        self.customer_id = customer["id"]
+        self.owned_items = owned_items
+        self.owned_ids = {domain: {item["id"] for item in items} for domain, items in owned_items.items()}
+
+    def items(self, domain):
+        """The customer's items in a prefetched domain"""
+        return self.owned_items[domain]
+
+    def ids(self, domain):
+        """IDs of the customer's items in a prefetched domain"""
+        return self.owned_ids[domain]
+
+    def owns(self, domain, item_id):
+        """Whether the item belongs to this customer"""
+        return item_id in self.owned_ids.get(domain, ())
+
+
+def resolve_customer(storage, email, owned_domains, customer_domain="customer"):
+    """
+    Look up the customer by email and prefetch their items concurrently.
+
+    Args:
+        storage: Storage backend (ideally the request-cached one)
+        email: Customer email from the chat request
+        owned_domains: Domains to prefetch by customerId (e.g. ["policy", "claim"])
+        customer_domain: Domain holding the customer records ("patient" for healthcare)
+
+    Returns:
+        CustomerScope, or None if no customer has this email
+    """
+    customers = storage.query_by_email(customer_domain, email)
+    if not customers:
+        return None
+    customer_id = customers[0]["id"]
+
+    with ThreadPoolExecutor(max_workers=max(len(owned_domains), 1)) as pool:
+        futures = {domain: pool.submit(storage.query_by_customer_id, domain, customer_id) for domain in owned_domains}
+    return CustomerScope(customers[0], {domain: future.result() for domain, future in futures.items()})
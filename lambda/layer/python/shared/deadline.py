@@ -0,0 +1,32 @@
+"""Request time budget derived from the Lambda context"""
+import os
+import time
+
+
+# Used when there is no Lambda context (local runs, tests); stays under the 30s function timeout
+DEFAULT_BUDGET_MS = int(os.environ.get("CHAT_TIME_BUDGET_MS", "25000"))
+
+
+class Deadline:
+    """Remaining-time tracker for one invocation"""
+
+    def __init__(self, context=None, budget_ms=DEFAULT_BUDGET_MS):
+        """
+        Args:
+            context: Lambda context (get_remaining_time_in_millis); optional
+            budget_ms: Upper bound measured from now, also applied when a context is given
+        """
+        self.context = context
+        self.expires_at = time.time() + budget_ms / 1000
+
+    def remaining_ms(self):
+        """Milliseconds left before the invocation must have returned"""
+        remaining = int((self.expires_at - time.time()) * 1000)
+        get_remaining = getattr(self.context, "get_remaining_time_in_millis", None)
+        if get_remaining:
+            remaining = min(remaining, get_remaining())
+        return max(remaining, 0)
+
+    def has_time(self, needed_ms):
+        """Whether at least needed_ms remain"""
+        return self.remaining_ms() >= needed_ms
@@ -9,9 +9,23 @@ eb = boto3.client("events")
 sns = boto3.client("sns")
 TOPIC = os.environ.get("SNS_TOPIC_ARN", "")
 
+# In-process listeners (e.g. the chatbot text index), called before publishing
+_listeners = []
+
+
+def subscribe(listener):
+    """Call listener(detail_type, detail) for every event emitted by this process"""
+    _listeners.append(listener)
+
 
 def _emit(detail_type, detail):
     """Emit events to EventBridge and SNS (best-effort)"""
+    for listener in _listeners:
+        try:
+            listener(detail_type, detail)
+        except Exception as e:
+            print(f"Event listener failed for {detail_type}: {str(e)}")
+
     # Best-effort: events + demo notifications
     try:
         eb.put_events(Entries=[{
@@ -0,0 +1,114 @@
+"""Idempotency-Key support for create endpoints"""
+import hashlib
+import json
+import os
+import time
+import boto3
+from botocore.exceptions import ClientError
+from .responses import _resp
+
+
+ddb = boto3.client("dynamodb")
+IDEMPOTENCY_TABLE = os.environ.get("IDEMPOTENCY_TABLE", "")
+
+RECORD_TTL_SECONDS = 24 * 60 * 60
+LOCK_TIMEOUT_SECONDS = 60   # An in-progress record older than this is considered abandoned
+
+
+def _get_header(event, name):
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _request_hash(event):
+    return hashlib.sha256((event.get("body") or "").encode("utf-8")).hexdigest()
+
+
+def with_idempotency(event, scope, operation):
+    """
+    Run a create operation at most once per Idempotency-Key header.
+
+    The first request with a key claims a TTL'd record (conditional put) and
+    stores the response once the operation finishes. Repeats with the same key
+    and body replay the stored response without running the operation again,
+    so retries never touch the domain tables or the event bus twice.
+
+    Requests without the header, or without IDEMPOTENCY_TABLE configured,
+    run the operation directly.
+
+    Args:
+        event: API Gateway proxy event
+        scope: Namespace for the key (e.g. "policy.create")
+        operation: Zero-argument callable returning an API Gateway response
+
+    Returns:
+        The operation's response, a replayed response, 409 while the first
+        request is still in flight, or 422 if the key was used with another body
+    """
+    key = _get_header(event, "idempotency-key")
+    if not key or not IDEMPOTENCY_TABLE:
+        return operation()
+
+    record_id = {"S": f"{scope}#{key}"}
+    request_hash = _request_hash(event)
+    now = int(time.time())
+
+    try:
+        ddb.put_item(
+            TableName=IDEMPOTENCY_TABLE,
+            Item={
+                "id": record_id,
+                "status": {"S": "IN_PROGRESS"},
+                "requestHash": {"S": request_hash},
+                "lockedUntil": {"N": str(now + LOCK_TIMEOUT_SECONDS)},
+                "expiresAt": {"N": str(now + RECORD_TTL_SECONDS)},
+            },
+            # TTL deletion is lazy, so expired records are treated as absent
+            ConditionExpression=(
+                "attribute_not_exists(id) OR expiresAt < :now "
+                "OR (#s = :in_progress AND lockedUntil < :now)"
+            ),
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={":now": {"N": str(now)}, ":in_progress": {"S": "IN_PROGRESS"}},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        existing = ddb.get_item(TableName=IDEMPOTENCY_TABLE, Key={"id": record_id}, ConsistentRead=True).get("Item")
+        if not existing:
+            # Record expired and was removed between our put and get; let the client retry
+            return _resp(409, {"error": "idempotency_conflict", "message": "Retry the request"})
+        if existing["requestHash"]["S"] != request_hash:
+            return _resp(422, {"error": "idempotency_key_reused",
+                               "message": "Idempotency-Key was already used with a different request body"})
+        if existing["status"]["S"] != "COMPLETE":
+            return _resp(409, {"error": "request_in_progress",
+                               "message": "A request with this Idempotency-Key is still being processed"})
+
+        response = json.loads(existing["response"]["S"])
+        response["headers"] = {**response.get("headers", {}), "Idempotent-Replayed": "true"}
+        return response
+
+    try:
+        response = operation()
+    except Exception:
+        ddb.delete_item(TableName=IDEMPOTENCY_TABLE, Key={"id": record_id})
+        raise
+
+    if response.get("statusCode", 500) >= 500:
+        # Server errors are not final; release the key so a retry can run
+        ddb.delete_item(TableName=IDEMPOTENCY_TABLE, Key={"id": record_id})
+    else:
+        ddb.update_item(
+            TableName=IDEMPOTENCY_TABLE,
+            Key={"id": record_id},
+            UpdateExpression="SET #s = :complete, #r = :response REMOVE lockedUntil",
+            ExpressionAttributeNames={"#s": "status", "#r": "response"},
+            ExpressionAttributeValues={
+                ":complete": {"S": "COMPLETE"},
+                ":response": {"S": json.dumps(response)},
+            },
+        )
+    return response
@@ -0,0 +1,151 @@
+"""Rule-based fast path for direct ID lookups in staff chats"""
+import re
+from .chat_request import add_usage
+from .tool_projection import _default_columns, _value
+
+
+UUID_PATTERN = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+
+# A lookup-only message: optional verb and entity word around a single ID, nothing else
+LOOKUP_TEMPLATE = (
+    r"^\s*(?:please\s+)?(?:(?:show|find|get|open|view|display|look\s*up|lookup|pull\s+up)\s+)?(?:me\s+)?"
+    r"(?:(?:the|details\s+(?:for|of|on))\s+)*(?:(?P<entity>{entities})\s+)?(?:#\s*)?(?P<id>{id})"
+    r"(?:\s+details)?\s*(?:please)?\s*[.!?]*\s*$"
+)
+
+# Per-container counters for the hit-rate log line
+_stats = {"hits": 0, "total": 0}
+
+
+def _label(field):
+    """camelCase field name -> "Camel case" label"""
+    words = re.sub(r"(?<!^)(?=[A-Z])", " ", field).lower()
+    return words[:1].upper() + words[1:]
+
+
+def _entity_name(domain):
+    return domain.replace("_", " ")
+
+
+def _entity_aliases(domain):
+    """Singular and plural spellings of a domain name ("policy", "policies")"""
+    name = _entity_name(domain)
+    plural = name[:-1] + "ies" if name.endswith("y") else name + "s"
+    return [name, plural]
+
+
+class IntentParser:
+    """
+    Recognizes messages that are nothing but a lookup of one seeded ID and
+    answers them from storage with a templated response.
+
+    Args:
+        registry: ToolRegistry with the vertical's search tools
+        id_lookups: [(regex, tool_name, input_name)] for business IDs such as
+                    POL-####-####; the tool runs with that input and the item
+                    whose field equals the ID is returned
+        entity_tools: {domain: search tool name} for UUID lookups; the tool's
+                      columns decide which fields the answer lists
+    """
+
+    def __init__(self, registry, id_lookups, entity_tools):
+        self.registry = registry
+        self.entity_tools = entity_tools
+        self.aliases = {alias: domain for domain in entity_tools for alias in _entity_aliases(domain)}
+        entities = "|".join(re.escape(alias).replace(r"\ ", r"\s+") for alias in sorted(self.aliases, key=len, reverse=True))
+        self.rules = [
+            (re.compile(LOOKUP_TEMPLATE.format(entities=entities, id=pattern), re.IGNORECASE), tool_name, input_name)
+            for pattern, tool_name, input_name in id_lookups
+        ]
+        self.uuid_rule = re.compile(LOOKUP_TEMPLATE.format(entities=entities, id=UUID_PATTERN), re.IGNORECASE)
+
+    def match(self, message):
+        """Return ("tool", tool_name, input_name, id) / ("entity", domain or None, None, id), or None"""
+        if not isinstance(message, str) or len(message) > 200:
+            return None
+        for rule, tool_name, input_name in self.rules:
+            found = rule.match(message)
+            if found:
+                return ("tool", tool_name, input_name, found.group("id").upper())
+        found = self.uuid_rule.match(message)
+        if found:
+            entity = " ".join((found.group("entity") or "").lower().split())
+            domain = self.aliases.get(entity)
+            return ("entity", domain, None, found.group("id").lower())
+        return None
+
+    def _lookup_tool(self, storage, tool_name, input_name, value):
+        tool = self.registry.tools[tool_name]
+        field = tool.criteria[input_name].fields[0]
+        result = tool.run(storage, {input_name: value})
+        items = [item for item in result[tool.result_key] if str(_value(item, field) or "").upper() == value]
+        return tool.domain, items[:1], tool.columns
+
+    def _lookup_entity(self, storage, domain, item_id):
+        for candidate in ([domain] if domain else list(self.entity_tools)):
+            item = storage.get(candidate, item_id)
+            if item:
+                return candidate, [item], self.registry.tools[self.entity_tools[candidate]].columns
+        return domain, [], None
+
+    def _render(self, domain, items, columns, value):
+        name = _entity_name(domain) if domain else "record"
+        if not items:
+            return f"I couldn't find a {name} matching {value}."
+        item = items[0]
+        columns = columns or _default_columns([item])
+        lines = [f"Here is {name} {value} (status: {item.get('status', 'unknown')}):"]
+        for column in columns:
+            if column in ("id", "status"):
+                continue
+            cell = _value(item, column)
+            if cell is not None and cell != "" and not isinstance(cell, (list, dict)):
+                lines.append(f"- {_label(column)}: {cell}")
+        lines.append(f"- ID: {item['id']}")
+        return "\n".join(lines)
+
+    def answer(self, message, messages, storage, status_tracker):
+        """
+        Answer a direct lookup without the model.
+
+        Args:
+            message: The user's message
+            messages: Conversation so far, ending with the new user message
+            storage: Storage backend
+            status_tracker: StatusTracker for this request
+
+        Returns:
+            A chat event generator (same events as chat_events), or None when
+            the message is not a direct lookup and the model should handle it
+        """
+        intent = self.match(message)
+        _stats["total"] += 1
+        if intent:
+            _stats["hits"] += 1
+        print(f"Intent fast path {'hit' if intent else 'miss'}"
+              f"{': ' + (intent[1] or 'uuid') if intent else ''} "
+              f"(hit rate {_stats['hits']}/{_stats['total']} = {_stats['hits'] / _stats['total']:.0%})")
+        if not intent:
+            return None
+        return self._events(intent, messages, storage, status_tracker)
+
+    def _events(self, intent, messages, storage, status_tracker):
+        kind, target, input_name, value = intent
+        if kind == "tool":
+            domain, items, columns = self._lookup_tool(storage, target, input_name, value)
+        else:
+            domain, items, columns = self._lookup_entity(storage, target, value)
+        text = self._render(domain, items, columns, value)
+
+        status_tracker.add("intent_fast_path", f"Answered {value} directly from storage",
+                           {"intent": target or "uuid", "found": bool(items)})
+        for message in status_tracker.messages:
+            yield {"type": "status", **message}
+        yield {
+            "type": "done",
+            "response": text,
+            "usage": add_usage({}, None),
+            "conversation": messages + [{"role": "assistant", "content": [{"type": "text", "text": text}]}],
+            "status_messages": status_tracker.get_messages(),
+            "partial": False,
+        }
@@ -0,0 +1,51 @@
+"""Request-scoped memoization"""
+import json
+import threading
+from concurrent.futures import Future
+
+
+def canonical_key(value):
+    """Stable string key for a JSON-like value (dict key order and empty filters ignored)
+
+    Top-level None/"" values are dropped: tools treat a missing filter and an
+    empty one the same way, so both spellings should share a memo entry.
+    """
+    if isinstance(value, dict):
+        value = {k: v for k, v in value.items() if v is not None and v != ""}
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class RequestMemo:
+    """Memo for the lifetime of one request
+
+    Concurrent callers asking for the same key share a single computation;
+    failures are not cached, so a later call retries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        """Return the memoized value for key, computing it on first use"""
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._futures[key] = future
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if owner:
+            try:
+                future.set_result(compute())
+            except Exception as e:
+                with self._lock:
+                    self._futures.pop(key, None)
+                future.set_exception(e)
+        return future.result()
+
@@ -0,0 +1,133 @@
+"""Model clients for the chat loop: Bedrock, or a scripted local stand-in"""
+import os
+import json
+import time
+import threading
+import boto3
+
+
+# Path to a JSON script (see ScriptedModelClient); when set, chatbots never call Bedrock
+MODEL_SCRIPT = os.environ.get("CHAT_MODEL_SCRIPT", "")
+MODEL_LATENCY_MS = float(os.environ.get("CHAT_MODEL_LATENCY_MS", "0"))
+
+
+def _request_turn(messages):
+    """Number of tool rounds since the last user message that was not tool results"""
+    turn = 0
+    for message in reversed(messages):
+        content = message["content"]
+        if message["role"] == "user":
+            if isinstance(content, str) or not any(block.get("type") == "tool_result" for block in content):
+                return turn
+            turn += 1
+    return turn
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class ScriptedModelClient:
+    """
+    Deterministic stand-in for a bedrock-runtime client.
+
+    Implements the two calls the chat loop makes (invoke_model and
+    invoke_model_with_response_stream) and replays scripted responses, so
+    the tool loop, storage reads and serialization can be exercised and
+    timed offline.
+
+    The script is a list of steps; step n answers the n-th model call of a
+    chat request (the turn is derived from the messages, so one client
+    serves any number of requests, also concurrently). A step is either
+        {"tool_use": [{"name": "search_claims", "input": {...}}, ...], "text": "optional preamble"}
+    or
+        {"text": "final answer"}
+    Requests with more turns than steps get the last step again.
+
+    Args:
+        script: List of steps
+        latency_ms: Simulated model time per call
+    """
+
+    def __init__(self, script, latency_ms=MODEL_LATENCY_MS):
+        if not script:
+            raise ValueError("Model script needs at least one step")
+        self.script = script
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self.model_seconds = 0.0    # Time spent inside model calls, for "latency minus model time"
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path, latency_ms=MODEL_LATENCY_MS):
+        with open(path) as f:
+            return cls(json.load(f), latency_ms)
+
+    def _respond(self, body):
+        start = time.perf_counter()
+        request = json.loads(body)
+        step = self.script[min(_request_turn(request["messages"]), len(self.script) - 1)]
+
+        content = []
+        if step.get("text"):
+            content.append({"type": "text", "text": step["text"]})
+        for n, call in enumerate(step.get("tool_use", [])):
+            content.append({"type": "tool_use", "id": f"toolu_{n}", "name": call["name"], "input": call.get("input", {})})
+        response = {
+            "content": content,
+            "stop_reason": "tool_use" if step.get("tool_use") else "end_turn",
+            "usage": {"input_tokens": _estimate_tokens(body),
+                      "output_tokens": _estimate_tokens(json.dumps(content))},
+        }
+
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            self.calls += 1
+            self.model_seconds += time.perf_counter() - start
+        return response
+
+    def invoke_model(self, modelId, body, **kwargs):
+        response = self._respond(body)
+        return {"body": _Body(json.dumps(response).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        response = self._respond(body)
+        events = [{"type": "message_start", "message": {"usage": {"input_tokens": response["usage"]["input_tokens"]}}}]
+        for index, block in enumerate(response["content"]):
+            if block["type"] == "text":
+                events.append({"type": "content_block_start", "index": index, "content_block": {"type": "text", "text": ""}})
+                events.append({"type": "content_block_delta", "index": index, "delta": {"type": "text_delta", "text": block["text"]}})
+            else:
+                start_block = {"type": "tool_use", "id": block["id"], "name": block["name"], "input": {}}
+                events.append({"type": "content_block_start", "index": index, "content_block": start_block})
+                events.append({"type": "content_block_delta", "index": index,
+                               "delta": {"type": "input_json_delta", "partial_json": json.dumps(block["input"])}})
+            events.append({"type": "content_block_stop", "index": index})
+        events.append({"type": "message_delta", "delta": {"stop_reason": response["stop_reason"]},
+                       "usage": {"output_tokens": response["usage"]["output_tokens"]}})
+        return {"body": [{"chunk": {"bytes": json.dumps(event).encode("utf-8")}} for event in events]}
+
+
+class _Body:
+    """Minimal StreamingBody: read() returns the payload"""
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def read(self):
+        return self.payload
+
+
+def model_client():
+    """
+    Client for the chatbot modules' model calls.
+
+    Anything with bedrock-runtime's invoke_model and
+    invoke_model_with_response_stream can be plugged in (chatbots keep it
+    in their module-level `bedrock`). Returns a ScriptedModelClient when
+    CHAT_MODEL_SCRIPT is set, else a bedrock-runtime client.
+    """
+    if MODEL_SCRIPT:
+        return ScriptedModelClient.from_file(MODEL_SCRIPT)
+    return boto3.client("bedrock-runtime", region_name=os.environ.get("BEDROCK_REGION", "us-east-1"))
@@ -0,0 +1,117 @@
+"""Per-turn model selection for the chat loop: fast model for tool dispatch, large model for answers"""
+import os
+import re
+from botocore.exceptions import ClientError
+
+
+# Small model for the first turn, which picks and calls tools; empty (the default) disables routing
+FAST_MODEL_ID = os.environ.get("CHAT_FAST_MODEL_ID", "")
+# Tried after the large model when it is throttled; empty for none
+FALLBACK_MODEL_ID = os.environ.get("CHAT_FALLBACK_MODEL_ID", "")
+
+# Questions asking for a written analysis rather than a lookup
+REPORT_PATTERN = re.compile(
+    r"\b(summar\w*|reports?|overview|analy[sz]\w*|breakdown|compar\w*|trends?|explain\w*|insights?|recommend\w*)\b",
+    re.IGNORECASE,
+)
+
+THROTTLING_CODES = {"ThrottlingException", "ServiceUnavailableException", "ModelNotReadyException", "TooManyRequestsException"}
+# Error events of a response stream that mean "try another model"
+THROTTLING_STREAM_EVENTS = {"throttlingException", "serviceUnavailableException", "modelNotReadyException"}
+
+
+class ModelThrottled(RuntimeError):
+    """A response stream was rejected for capacity reasons before producing output"""
+
+
+def is_throttled(error):
+    """Whether a model call failed for capacity reasons, so another model may succeed"""
+    if isinstance(error, ModelThrottled):
+        return True
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in THROTTLING_CODES
+
+
+def _text(content):
+    if isinstance(content, str):
+        return content
+    return " ".join(block.get("text", "") for block in content if block.get("type") == "text")
+
+
+class ModelRouter:
+    """
+    Chooses the model for each call of one chat request and records the decisions.
+
+    Routing is opt-in (CHAT_FAST_MODEL_ID). The fast model only dispatches
+    tools: it gets the first turn, unless the question asks for a written
+    analysis (summaries, comparisons, reports), and its reply is only used
+    when it calls tools - an answer from it is discarded and the turn is
+    repeated on the large model (see is_dispatch). Every turn after tool
+    results, and so every answer, goes to the large model. A fast-model
+    call that fails before output moves on to the large model; a throttled
+    large-model call is retried on FALLBACK_MODEL_ID, never on the fast model.
+
+    Args:
+        model_id: The large model (the chatbot's BEDROCK_MODEL_ID)
+        question: The user's message for this request
+        fast_model_id: Small model; empty or equal to model_id disables routing
+        fallback_model_id: Extra model tried when the large model is throttled
+    """
+
+    def __init__(self, model_id, question, fast_model_id=FAST_MODEL_ID, fallback_model_id=FALLBACK_MODEL_ID):
+        self.model_id = model_id
+        self.fast_model_id = fast_model_id if fast_model_id != model_id else ""
+        self.fallback_model_id = fallback_model_id
+        self.report_style = bool(REPORT_PATTERN.search(_text(question)))
+        self.calls = []
+
+    def route(self, turn, final=False):
+        """
+        Pick the model for the next call.
+
+        Returns:
+            (model_id, reason)
+        """
+        if not self.fast_model_id:
+            return self.model_id, "routing disabled"
+        if final:
+            return self.model_id, "final answer"
+        if self.report_style:
+            return self.model_id, "report-style question"
+        if turn == 0:
+            return self.fast_model_id, "tool dispatch"
+        return self.model_id, "answer from tool results"
+
+    def is_dispatch(self, model_id, response_body):
+        """Whether a reply may be used: large-model replies always, fast-model replies only when they call tools"""
+        return model_id != self.fast_model_id or response_body.get("stop_reason") == "tool_use"
+
+    def candidates(self, model_id):
+        """Models to try in order: the chosen one, the large model after the fast one, then the fallback"""
+        others = [self.model_id if model_id == self.fast_model_id else "", self.fallback_model_id]
+        ordered = [model_id]
+        for candidate in others:
+            if candidate and candidate not in ordered:
+                ordered.append(candidate)
+        return ordered
+
+    def tier_of(self, model_id):
+        if model_id == self.model_id:
+            return "large"
+        return "fast" if model_id == self.fast_model_id else "fallback"
+
+    def record(self, status_tracker, turn, model_id, reason, latency_ms, error=None, fallback_from=None):
+        """Keep one call's routing decision and latency, and report it as a status message"""
+        tier = self.tier_of(model_id)
+        call = {"turn": turn, "model": model_id, "tier": tier, "reason": reason, "latency_ms": latency_ms}
+        if fallback_from:
+            call["fallback_from"] = fallback_from
+        if error:
+            call["error"] = error
+        self.calls.append(call)
+
+        if error:
+            message = f"{model_id} unavailable ({error}) after {latency_ms}ms"
+        else:
+            via = f", fallback from {fallback_from}" if fallback_from else ""
+            message = f"Turn {turn}: {tier} model ({reason}{via}) answered in {latency_ms}ms"
+        status_tracker.add("model_routing", message, call)
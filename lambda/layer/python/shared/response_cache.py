@@ -0,0 +1,224 @@
+"""Opt-in cache of staff chat answers, invalidated by per-domain data versions"""
+import hashlib
+import json
+import os
+import re
+import time
+import boto3
+from .chat_request import add_usage
+from .responses import decimal_default
+
+
+ddb = boto3.client("dynamodb")
+RESPONSE_CACHE_TABLE = os.environ.get("RESPONSE_CACHE_TABLE", "")
+
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", str(60 * 60)))
+
+# Per-container counters for the hit-rate log line
+_stats = {"hits": 0, "total": 0}
+
+
+def _version_key(domain):
+    return {"id": {"S": f"version#{domain}"}}
+
+
+def bump_version(domain):
+    """
+    Invalidate cached answers that read this domain.
+
+    Passed to the storage backend as its on_write hook. A no-op unless the
+    response cache is enabled. Failures are logged, not raised: the write
+    itself has succeeded, and a stale answer still expires via TTL.
+    """
+    if not RESPONSE_CACHE_TABLE:
+        return
+    try:
+        ddb.update_item(
+            TableName=RESPONSE_CACHE_TABLE,
+            Key=_version_key(domain),
+            UpdateExpression="ADD version :one",
+            ExpressionAttributeValues={":one": {"N": "1"}},
+        )
+    except Exception as e:
+        print(f"Response cache version bump failed for {domain}: {str(e)}")
+
+
+def normalize_message(message):
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"[\s?.!]+$", "", " ".join(message.lower().split()))
+
+
+class DomainRecorder:
+    """Storage wrapper noting which domains a chat answer read"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.domains = set()
+
+    def scan(self, domain: str) -> list:
+        self.domains.add(domain)
+        return self.storage.scan(domain)
+
+    def scan_pages(self, domain: str, segment: int = None, total_segments: int = None):
+        self.domains.add(domain)
+        return self.storage.scan_pages(domain, segment, total_segments)
+
+    def get(self, domain: str, item_id: str) -> dict:
+        self.domains.add(domain)
+        return self.storage.get(domain, item_id)
+
+    def list(self, domain: str) -> list:
+        self.domains.add(domain)
+        return self.storage.list(domain)
+
+    def batch_get(self, domain: str, item_ids: list) -> list:
+        self.domains.add(domain)
+        return self.storage.batch_get(domain, item_ids)
+
+    def query_by_email(self, domain: str, email: str) -> list:
+        self.domains.add(domain)
+        return self.storage.query_by_email(domain, email)
+
+    def query_by_customer_id(self, domain: str, customer_id: str) -> list:
+        self.domains.add(domain)
+        return self.storage.query_by_customer_id(domain, customer_id)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+class ResponseCache:
+    """
+    Cached answer for one staff chat question.
+
+    Answers are stored under a hash of the normalized message and the
+    empty-history flag, together with the version of every domain the answer
+    read. Versions are counters in the same table, bumped on each write to a
+    domain, so an answer is served only while none of its data has changed
+    (and until its TTL expires). Versions are read before the model runs, so
+    a write made while answering leaves the stored answer already outdated.
+
+    Args:
+        message: The user's message
+        domains: All domains of the vertical (their versions are read up front)
+    """
+
+    def __init__(self, message, domains):
+        self.domains = list(domains)
+        key_source = json.dumps({"message": normalize_message(message), "empty_history": True})
+        self.key = {"id": {"S": "answer#" + hashlib.sha256(key_source.encode("utf-8")).hexdigest()}}
+        self.versions = {}
+        self.recorder = None
+
+    def lookup(self):
+        """
+        Read the cached answer and the current domain versions in one BatchGetItem.
+
+        Returns:
+            The cached response text, or None on a miss
+        """
+        keys = [self.key] + [_version_key(domain) for domain in self.domains]
+        try:
+            response = ddb.batch_get_item(RequestItems={RESPONSE_CACHE_TABLE: {"Keys": keys}})
+        except Exception as e:
+            print(f"Response cache lookup failed: {str(e)}")
+            self.versions = None
+            return None
+        cached = None
+        for item in response.get("Responses", {}).get(RESPONSE_CACHE_TABLE, []):
+            item_id = item["id"]["S"]
+            if item_id.startswith("version#"):
+                self.versions[item_id[len("version#"):]] = int(item["version"]["N"])
+            else:
+                cached = item
+        if response.get("UnprocessedKeys"):
+            self.versions = None    # Unknown versions: neither serve nor store
+
+        hit = (
+            cached is not None
+            and self.versions is not None
+            and int(cached["expiresAt"]["N"]) > time.time()
+            and all(self.versions.get(domain, 0) == int(version)
+                    for domain, version in json.loads(cached["versions"]["S"]).items())
+        )
+        _stats["total"] += 1
+        if hit:
+            _stats["hits"] += 1
+        print(f"Response cache {'hit' if hit else 'miss'} "
+              f"(hit rate {_stats['hits']}/{_stats['total']} = {_stats['hits'] / _stats['total']:.0%})")
+        return cached["response"]["S"] if hit else None
+
+    def track(self, storage):
+        """Wrap storage so the domains read while answering are recorded"""
+        self.recorder = DomainRecorder(storage)
+        return self.recorder
+
+    def events(self, response, messages, status_tracker):
+        """Chat events (as from chat_events) replaying a cached answer"""
+        status_tracker.add("response_cache", "Answered from cache (data unchanged)", {"cached": True})
+        for message in status_tracker.messages:
+            yield {"type": "status", **message}
+        yield {
+            "type": "done",
+            "response": response,
+            "usage": add_usage({}, None),
+            "conversation": messages + [{"role": "assistant", "content": [{"type": "text", "text": response}]}],
+            "status_messages": status_tracker.get_messages(),
+            "partial": False,
+            "cached": True,
+        }
+
+    def record(self, events):
+        """
+        Pass chat events through and store the final answer.
+
+        Partial answers (tool-use budget exhausted) are not cached.
+
+        Yields:
+            The same events
+        """
+        for event in events:
+            if event["type"] == "done" and not event.get("partial") and event.get("response"):
+                self._store(event["response"])
+            yield event
+
+    def _store(self, response):
+        if self.versions is None:
+            return
+        touched = self.recorder.domains if self.recorder else set()
+        versions = {domain: self.versions.get(domain, 0) for domain in sorted(touched)}
+        try:
+            ddb.put_item(
+                TableName=RESPONSE_CACHE_TABLE,
+                Item={
+                    **self.key,
+                    "response": {"S": response},
+                    "versions": {"S": json.dumps(versions, default=decimal_default)},
+                    "expiresAt": {"N": str(int(time.time()) + RESPONSE_CACHE_TTL_SECONDS)},
+                },
+            )
+        except Exception as e:
+            print(f"Response cache store failed: {str(e)}")
+
+
+def open_response_cache(body, message, history, session, domains):
+    """
+    Decide whether a staff chat request may use the response cache.
+
+    Only enabled deployments (RESPONSE_CACHE_TABLE set) cache, and only
+    stateless first questions: answers to follow-ups depend on the earlier
+    turns. Clients can skip the cache with "cache": false.
+
+    Args:
+        body: Parsed chat request body
+        message: The user's message
+        history: Conversation history sent with the request
+        session: ConversationSession, or None
+        domains: All domains of the vertical
+
+    Returns:
+        ResponseCache, or None when the request is not cacheable
+    """
+    if not RESPONSE_CACHE_TABLE or session or history or body.get("cache") is False:
+        return None
+    return ResponseCache(message, domains)
@@ -10,15 +10,37 @@ def decimal_default(obj):
     raise TypeError
 
 
+def _headers(content_type):
+    return {
+        "content-type": content_type,
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "GET,POST,DELETE,OPTIONS",
+        "Access-Control-Allow-Headers": "Content-Type,Idempotency-Key"
+    }
+
+
 def _resp(code, body):
     """Create API Gateway proxy response with CORS headers"""
     return {
         "statusCode": code,
-        "headers": {
-            "content-type": "application/json",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,POST,DELETE,OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type"
-        },
+        "headers": _headers("application/json"),
         "body": json.dumps(body, default=decimal_default),
     }
+
+
+def _ndjson_resp(code, records):
+    """Create API Gateway proxy response with one JSON record per line"""
+    return {
+        "statusCode": code,
+        "headers": _headers("application/x-ndjson"),
+        "body": "".join(json.dumps(record, default=decimal_default) + "\n" for record in records),
+    }
+
+
+def _ndjson_stream_resp(code, records):
+    """Create a response whose body yields one JSON line per record as it is produced (shared.chat_stream only)"""
+    return {
+        "statusCode": code,
+        "headers": _headers("application/x-ndjson"),
+        "body": (json.dumps(record, default=decimal_default) + "\n" for record in records),
+    }
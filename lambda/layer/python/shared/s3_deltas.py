@@ -0,0 +1,47 @@
+"""Append-only change logs in the docs bucket: one small object per change"""
+import os
+import json
+import time
+import uuid
+import boto3
+from botocore.exceptions import ClientError
+
+
+s3 = boto3.client("s3")
+DOCS_BUCKET = os.environ.get("DOCS_BUCKET", "")
+
+
+def write_delta(prefix, delta):
+    """Store one change as its own object (no read, no condition); keys sort by write time"""
+    key = f"{prefix}{time.time_ns():020d}-{uuid.uuid4().hex}.json"
+    s3.put_object(Bucket=DOCS_BUCKET, Key=key, Body=json.dumps(delta).encode("utf-8"),
+                  ContentType="application/json")
+    return key
+
+
+def list_deltas(prefix):
+    """Keys of the change objects under prefix, oldest first"""
+    keys = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=DOCS_BUCKET, Prefix=prefix):
+        keys.extend(obj["Key"] for obj in page.get("Contents", []))
+    return sorted(keys)
+
+
+def read_delta(key):
+    """One change, or None if it was deleted (compacted) meanwhile"""
+    try:
+        return json.loads(s3.get_object(Bucket=DOCS_BUCKET, Key=key)["Body"].read())
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None
+        raise
+
+
+def delete_deltas(keys):
+    """Delete change objects, 1000 keys per request"""
+    keys = sorted(keys)
+    for n in range(0, len(keys), 1000):
+        s3.delete_objects(Bucket=DOCS_BUCKET, Delete={
+            "Objects": [{"Key": key} for key in keys[n:n + 1000]], "Quiet": True,
+        })
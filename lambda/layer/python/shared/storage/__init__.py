@@ -1,5 +1,6 @@
 """Storage abstraction layer for data persistence"""
 from .base import StorageBackend
 from .dynamodb import DynamoDBBackend
+from .request_cache import RequestCachedStorage
 
-__all__ = ['StorageBackend', 'DynamoDBBackend']
+__all__ = ['StorageBackend', 'DynamoDBBackend', 'RequestCachedStorage']
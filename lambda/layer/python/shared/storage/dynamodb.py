@@ -2,16 +2,22 @@
 import os
 import time
 import uuid
+import threading
 import boto3
 from .base import StorageBackend
 from ..validators import convert_floats_to_decimal
 from ..status import StatusTracker
 
 
+# DynamoDB BatchWriteItem / BatchGetItem limits per request
+BATCH_WRITE_LIMIT = 25
+BATCH_GET_LIMIT = 100
+
+
 class DynamoDBBackend(StorageBackend):
     """Storage backend using DynamoDB with flexible domain-to-table mapping"""
 
-    def __init__(self, status_tracker=None, domain_mapping=None):
+    def __init__(self, status_tracker=None, domain_mapping=None, on_write=None):
         """
         Initialize DynamoDB backend with optional domain mapping.
 
@@ -21,9 +27,13 @@ class DynamoDBBackend(StorageBackend):
                            Default (insurance): {"customer": "CUSTOMERS_TABLE", "quote": "QUOTES_TABLE", ...}
                            Retail example: {"customer": "CUSTOMERS_TABLE", "product": "QUOTES_TABLE",
                                            "order": "POLICIES_TABLE", "inventory": "CLAIMS_TABLE", ...}
+            on_write: Optional callable(domain) run after every write to a domain
+                      (e.g. to invalidate caches that read it)
         """
         self.ddb = boto3.resource("dynamodb")
         self.status_tracker = status_tracker
+        self.on_write = on_write
+        self._local = threading.local()
 
         # Default mapping (insurance/legacy)
         if domain_mapping is None:
@@ -36,20 +46,43 @@ class DynamoDBBackend(StorageBackend):
                 "case": "CASES_TABLE",
             }
 
-        # Build table mapping from domain names to DynamoDB table resources
-        self.tables = {}
+        # Build table mapping from domain names to DynamoDB table names
+        self.table_names = {}
         for domain, env_var in domain_mapping.items():
             if env_var in os.environ:
-                self.tables[domain] = self.ddb.Table(os.environ[env_var])
+                self.table_names[domain] = os.environ[env_var]
             else:
                 # Skip if env var not set (allows partial configurations)
                 pass
 
+    def _written(self, domain: str):
+        if self.on_write:
+            self.on_write(domain)
+
+    def _get_resource(self):
+        """Get the DynamoDB resource for the calling thread
+
+        boto3 resources are not thread-safe, so worker threads (batch
+        sub-requests, concurrent tool calls) each get their own resource.
+        """
+        if not hasattr(self._local, "ddb"):
+            if threading.current_thread() is threading.main_thread():
+                self._local.ddb = self.ddb
+            else:
+                self._local.ddb = boto3.session.Session().resource("dynamodb")
+            self._local.tables = {}
+        return self._local.ddb
+
     def _get_table(self, domain: str):
         """Get table for domain, raise error if invalid"""
-        if domain not in self.tables:
+        if domain not in self.table_names:
             raise ValueError(f"Unknown domain: {domain}")
-        return self.tables[domain]
+
+        ddb = self._get_resource()
+        tables = self._local.tables
+        if domain not in tables:
+            tables[domain] = ddb.Table(self.table_names[domain])
+        return tables[domain]
 
     def create(self, domain: str, data: dict, status: str, top_level_fields: dict = None) -> dict:
         """Create a new item with optional top-level fields for GSI indexing"""
@@ -72,6 +105,7 @@ class DynamoDBBackend(StorageBackend):
 
         print(f"Creating {domain} with id={item_id}, status={status}")
         table.put_item(Item=item)
+        self._written(domain)
         return item
 
     def get(self, domain: str, item_id: str) -> dict:
@@ -111,12 +145,14 @@ class DynamoDBBackend(StorageBackend):
             ExpressionAttributeNames={"#s": "status"},
             ExpressionAttributeValues={":s": status, ":u": int(time.time())},
         )
+        self._written(domain)
         return True
 
     def delete(self, domain: str, item_id: str) -> bool:
         """Delete a single item"""
         table = self._get_table(domain)
         table.delete_item(Key={"id": item_id})
+        self._written(domain)
         return True
 
     def delete_all(self, domain: str) -> int:
@@ -128,6 +164,7 @@ class DynamoDBBackend(StorageBackend):
         for item in items:
             table.delete_item(Key={"id": item["id"]})
             deleted_count += 1
+        self._written(domain)
         return deleted_count
 
     def scan(self, domain: str) -> list:
@@ -148,6 +185,100 @@ class DynamoDBBackend(StorageBackend):
 
         return items
 
+    def scan_pages(self, domain: str, segment: int = None, total_segments: int = None):
+        """Yield every page of a (optionally segmented) table scan
+
+        Unlike scan(), this follows LastEvaluatedKey, so it sees the whole
+        table. Pass segment/total_segments to run one worker of a parallel scan.
+        """
+        for items, _ in self.scan_pages_from(domain, segment, total_segments):
+            yield items
+
+    def scan_pages_from(self, domain: str, segment: int = None, total_segments: int = None, start_key: dict = None):
+        """Yield (items, last_evaluated_key) per scan page, starting after start_key
+
+        The key is None on the last page; passing a yielded key back as
+        start_key resumes the scan after that page.
+        """
+        table = self._get_table(domain)
+        kwargs = {}
+        if total_segments:
+            kwargs.update(Segment=segment, TotalSegments=total_segments)
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+
+        while True:
+            response = table.scan(**kwargs)
+            last_key = response.get("LastEvaluatedKey")
+            yield response.get("Items", []), last_key
+            if not last_key:
+                return
+            kwargs["ExclusiveStartKey"] = last_key
+
+    def batch_put(self, domain: str, items: list, max_attempts: int = 5) -> int:
+        """Write up to 25 complete items with a single BatchWriteItem call
+
+        Unprocessed items are retried with exponential backoff.
+
+        Returns:
+            Number of items that could not be written after all attempts
+        """
+        if len(items) > BATCH_WRITE_LIMIT:
+            raise ValueError(f"batch_put accepts at most {BATCH_WRITE_LIMIT} items")
+        if not items:
+            return 0
+
+        if domain not in self.table_names:
+            raise ValueError(f"Unknown domain: {domain}")
+        table_name = self.table_names[domain]
+        ddb = self._get_resource()
+
+        request_items = {table_name: [{"PutRequest": {"Item": item}} for item in items]}
+        try:
+            for attempt in range(max_attempts):
+                response = ddb.batch_write_item(RequestItems=request_items)
+                request_items = response.get("UnprocessedItems") or {}
+                if not request_items:
+                    return 0
+                time.sleep(min(0.05 * (2 ** attempt), 1.0))
+
+            return len(request_items.get(table_name, []))
+        finally:
+            self._written(domain)
+
+    def batch_get(self, domain: str, item_ids: list, max_attempts: int = 5) -> list:
+        """Read items by id with BatchGetItem, 100 keys per request
+
+        Unprocessed keys are retried with exponential backoff. Missing ids
+        are skipped; items are returned in the order of item_ids.
+        """
+        if domain not in self.table_names:
+            raise ValueError(f"Unknown domain: {domain}")
+        table_name = self.table_names[domain]
+        ddb = self._get_resource()
+
+        start_time = time.time()
+        found = {}
+        for offset in range(0, len(item_ids), BATCH_GET_LIMIT):
+            request_items = {table_name: {"Keys": [{"id": item_id} for item_id in item_ids[offset:offset + BATCH_GET_LIMIT]]}}
+            for attempt in range(max_attempts):
+                response = ddb.batch_get_item(RequestItems=request_items)
+                for item in response.get("Responses", {}).get(table_name, []):
+                    found[item["id"]] = item
+                request_items = response.get("UnprocessedKeys") or {}
+                if not request_items:
+                    break
+                time.sleep(min(0.05 * (2 ** attempt), 1.0))
+            else:
+                raise RuntimeError(f"BatchGetItem on {domain} left keys unprocessed")
+
+        if self.status_tracker:
+            elapsed_ms = int((time.time() - start_time) * 1000)
+            self.status_tracker.add("dynamodb_query", f"Fetched {len(found)} {domain} items by id",
+                                   {"table": domain, "query_type": "batch_get", "count": len(found), "latency_ms": elapsed_ms})
+
+        return [found[item_id] for item_id in item_ids if item_id in found]
+
     def query_by_email(self, domain: str, email: str) -> list:
         """Query customer by email using GSI"""
         table = self._get_table(domain)
@@ -218,4 +349,5 @@ class DynamoDBBackend(StorageBackend):
 
         print(f"Creating customer with id={item_id}, email={email_value}")
         table.put_item(Item=item)
+        self._written("customer")
         return item
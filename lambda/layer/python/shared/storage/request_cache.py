@@ -0,0 +1,45 @@
+"""Request-scoped read cache over a storage backend"""
+from ..memo import RequestMemo
+
+
+class RequestCachedStorage:
+    """
+    Wrap a storage backend for the duration of one read-only request.
+
+    Reads (scans, get, GSI queries) hit DynamoDB once per distinct argument
+    set; e.g. two different searches on the same domain share a single table
+    scan. Every other method is passed through to the wrapped backend
+    uncached. Scan/query results are shallow copies, so callers may filter
+    or sort them freely.
+    """
+
+    def __init__(self, storage, memo=None):
+        self.storage = storage
+        self.memo = memo or RequestMemo()
+
+    def scan(self, domain: str) -> list:
+        return list(self.memo.get_or_compute(("scan", domain), lambda: self.storage.scan(domain)))
+
+    def scan_pages(self, domain: str, segment: int = None, total_segments: int = None):
+        pages = self.memo.get_or_compute(
+            ("scan_pages", domain, segment, total_segments),
+            lambda: list(self.storage.scan_pages(domain, segment, total_segments)),
+        )
+        return (list(page) for page in pages)
+
+    def get(self, domain: str, item_id: str) -> dict:
+        return self.memo.get_or_compute(("get", domain, item_id), lambda: self.storage.get(domain, item_id))
+
+    def query_by_email(self, domain: str, email: str) -> list:
+        return list(self.memo.get_or_compute(
+            ("query_by_email", domain, email), lambda: self.storage.query_by_email(domain, email)
+        ))
+
+    def query_by_customer_id(self, domain: str, customer_id: str) -> list:
+        return list(self.memo.get_or_compute(
+            ("query_by_customer_id", domain, customer_id),
+            lambda: self.storage.query_by_customer_id(domain, customer_id),
+        ))
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
@@ -0,0 +1,275 @@
+"""Trigram index for chatbot substring searches, stored in the docs bucket"""
+import os
+import gzip
+import json
+import threading
+import time
+import boto3
+from botocore.exceptions import ClientError
+from .events import subscribe
+from .s3_deltas import write_delta, list_deltas, read_delta, delete_deltas
+
+
+s3 = boto3.client("s3")
+DOCS_BUCKET = os.environ.get("DOCS_BUCKET", "")
+TEXT_INDEX_ENABLED = os.environ.get("CHAT_TEXT_INDEX", "true").lower() == "true"
+
+INDEX_PREFIX = "text-index"
+# Beyond this many candidates a table scan is cheaper than fetching them by id
+MAX_CANDIDATES = int(os.environ.get("TEXT_INDEX_MAX_CANDIDATES", "100"))
+# Pending deltas that make a search store the merged index as the new base
+COMPACT_DELTAS = int(os.environ.get("TEXT_INDEX_COMPACT_DELTAS", "20"))
+# How long a warm container searches its cached index before checking S3 again
+REFRESH_SECONDS = float(os.environ.get("TEXT_INDEX_REFRESH_SECONDS", "15"))
+
+
+def trigrams(text):
+    """Distinct three-character substrings of the lowercased text"""
+    text = text.lower()
+    return {text[n:n + 3] for n in range(len(text) - 2)}
+
+
+class TextIndex:
+    """
+    Trigram postings for the text fields of one domain.
+
+    Item ids are stored once; postings hold positions into that list.
+    Deleted items leave an empty slot until the index is next compacted.
+    `applied` holds the keys of the delta objects merged into it.
+    """
+
+    def __init__(self, fields, ids=None, postings=None, etag=None, applied=None):
+        self.fields = sorted(fields)
+        self.ids = ids or []
+        self.positions = {item_id: n for n, item_id in enumerate(self.ids) if item_id is not None}
+        self.postings = postings or {field: {} for field in self.fields}
+        self.etag = etag
+        self.applied = set(applied or ())
+
+    @classmethod
+    def build(cls, fields, items):
+        index = cls(fields)
+        for item in items:
+            index.add(item["id"], item.get("data") or {})
+        return index
+
+    def add(self, item_id, data):
+        """Index an item's text fields (replacing an earlier version of it)"""
+        self.remove(item_id)
+        position = len(self.ids)
+        self.ids.append(item_id)
+        self.positions[item_id] = position
+        for field in self.fields:
+            value = data.get(field)
+            if isinstance(value, str):
+                for gram in trigrams(value):
+                    self.postings[field].setdefault(gram, []).append(position)
+
+    def remove(self, item_id):
+        position = self.positions.pop(item_id, None)
+        if position is not None:
+            self.ids[position] = None
+
+    def candidates(self, fields, text):
+        """
+        Ids of the items that may contain text in any of the fields.
+
+        Returns:
+            A superset of the matching ids, or None when the index cannot
+            narrow the search (text shorter than three characters, or a field
+            that is not indexed)
+        """
+        grams = trigrams(text)
+        if not grams or any(field not in self.postings for field in fields):
+            return None
+        found = set()
+        for field in fields:
+            postings = [self.postings[field].get(gram, ()) for gram in grams]
+            postings.sort(key=len)
+            matched = set(postings[0])
+            for positions in postings[1:]:
+                if not matched:
+                    break
+                matched.intersection_update(positions)
+            found.update(self.ids[position] for position in matched)
+        found.discard(None)
+        return found
+
+    def to_bytes(self):
+        """Gzipped JSON, with deleted slots compacted away"""
+        remap, ids = {}, []
+        for position, item_id in enumerate(self.ids):
+            if item_id is not None:
+                remap[position] = len(ids)
+                ids.append(item_id)
+        postings = {
+            field: {gram: [remap[p] for p in positions if p in remap] for gram, positions in grams.items()}
+            for field, grams in self.postings.items()
+        }
+        postings = {field: {gram: positions for gram, positions in grams.items() if positions}
+                    for field, grams in postings.items()}
+        return gzip.compress(json.dumps({"fields": self.fields, "ids": ids, "postings": postings,
+                                         "applied": sorted(self.applied)}).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, payload, etag):
+        data = json.loads(gzip.decompress(payload))
+        return cls(data["fields"], data["ids"], data["postings"], etag, data.get("applied"))
+
+
+class TextIndexStore:
+    """
+    Per-domain text indexes in S3: a base object plus one small delta object per write.
+
+    Creates and deletes only PUT a delta (no read, no condition), so the
+    write path never waits on or conflicts with other writers. A warm
+    container searches its cached index for up to REFRESH_SECONDS; after
+    that the next search revalidates the base with a conditional GET, lists
+    the domain's deltas and merges the ones the base does not contain yet.
+    Writes made by this container expire its copy right away, while other
+    containers' writes become visible within REFRESH_SECONDS. Once COMPACT_DELTAS are pending, the merged index is
+    written back as the new base with a conditional put and the merged
+    deltas are deleted. A missing index (or one whose field set changed)
+    is built from a table scan on first use; bulk imports and bulk deletes
+    drop the base so the next search rebuilds it.
+    """
+
+    def __init__(self):
+        self.fields = {}            # domain -> set of indexed data fields
+        self.cache = {}             # domain -> TextIndex
+        self.refreshed = {}         # domain -> monotonic time the cached index was last synced with S3
+        self.lock = threading.Lock()
+
+    def register(self, domain, fields):
+        """Declare data fields of a domain that substring searches read"""
+        self.fields.setdefault(domain, set()).update(fields)
+
+    def enabled(self, domain):
+        return TEXT_INDEX_ENABLED and bool(DOCS_BUCKET) and domain in self.fields
+
+    def _key(self, domain):
+        return f"{INDEX_PREFIX}/{domain}.json.gz"
+
+    def _delta_prefix(self, domain):
+        return f"{INDEX_PREFIX}/{domain}/deltas/"
+
+    def _fetch(self, domain):
+        """Current base index from S3 (the cached copy if unchanged), or None if there is none"""
+        cached = self.cache.get(domain)
+        kwargs = {"IfNoneMatch": cached.etag} if cached and cached.etag else {}
+        try:
+            response = s3.get_object(Bucket=DOCS_BUCKET, Key=self._key(domain), **kwargs)
+        except ClientError as e:
+            code = e.response["Error"]["Code"]
+            if code in ("304", "NotModified"):
+                return cached
+            if code in ("NoSuchKey", "404"):
+                self.cache.pop(domain, None)
+                return None
+            raise
+        index = TextIndex.from_bytes(response["Body"].read(), response["ETag"])
+        self.cache[domain] = index
+        return index
+
+    def _put(self, domain, index, **condition):
+        response = s3.put_object(Bucket=DOCS_BUCKET, Key=self._key(domain), Body=index.to_bytes(),
+                                 ContentType="application/gzip", **condition)
+        index.etag = response["ETag"]
+        self.cache[domain] = index
+
+    def _merge(self, index, keys):
+        """
+        Apply the listed deltas the index does not contain yet, in key (time) order.
+
+        Keys the index merged earlier and that are no longer listed were
+        deleted by a compaction, so they are forgotten.
+        """
+        listed = set(keys)
+        for key in keys:
+            if key in index.applied:
+                continue
+            delta = read_delta(key)
+            if delta is None:
+                continue        # Compacted into a newer base meanwhile
+            if delta["op"] == "add":
+                index.add(delta["id"], delta["data"])
+            else:
+                index.remove(delta["id"])
+            index.applied.add(key)
+        index.applied &= listed
+
+    def _compact(self, domain, index, condition):
+        """Store the merged index as the base and delete the deltas it contains"""
+        try:
+            self._put(domain, index, **condition)
+        except ClientError as e:
+            # Another container stored a newer base first; this copy is still valid for this search
+            print(f"Text index for {domain} not stored: {str(e)}")
+            return
+        delete_deltas(index.applied)
+
+    def load(self, storage, domain):
+        """The domain's index with the stored deltas merged; built from a scan if it does not exist yet"""
+        with self.lock:
+            cached = self.cache.get(domain)
+            if (cached is not None and set(cached.fields) == self.fields[domain]
+                    and time.monotonic() - self.refreshed.get(domain, 0) < REFRESH_SECONDS):
+                return cached
+
+            index = self._fetch(domain)
+            if index is not None and set(index.fields) == self.fields[domain]:
+                keys = list_deltas(self._delta_prefix(domain))
+                pending = len(set(keys) - index.applied)
+                self._merge(index, keys)
+                if len(index.applied) >= COMPACT_DELTAS and pending:
+                    self._compact(domain, index, {"IfMatch": index.etag})
+                self.refreshed[domain] = time.monotonic()
+                return index
+
+            print(f"Building text index for {domain} ({', '.join(sorted(self.fields[domain]))})")
+            # Deltas listed before the scan are already reflected in it
+            keys = list_deltas(self._delta_prefix(domain))
+            items = (item for page in storage.scan_pages(domain) for item in page)
+            built = TextIndex.build(self.fields[domain], items)
+            built.applied = set(keys)
+            self._compact(domain, built, {"IfMatch": index.etag} if index else {"IfNoneMatch": "*"})
+            self.cache[domain] = built
+            self.refreshed[domain] = time.monotonic()
+            return built
+
+    def _write_delta(self, domain, delta):
+        """Record one change; this container's next search should see it"""
+        write_delta(self._delta_prefix(domain), delta)
+        self.refreshed.pop(domain, None)
+
+    def drop(self, domain):
+        """Delete the stored base index; the next search rebuilds it"""
+        with self.lock:
+            self.cache.pop(domain, None)
+            self.refreshed.pop(domain, None)
+            s3.delete_object(Bucket=DOCS_BUCKET, Key=self._key(domain))
+
+    def on_event(self, detail_type, detail):
+        """Record {domain}.created / .deleted as deltas; .bulk_deleted / .imported drop the index"""
+        domain, _, action = detail_type.rpartition(".")
+        if not self.enabled(domain):
+            return
+        try:
+            if action == "created":
+                data = detail.get("data") or {}
+                self._write_delta(domain, {
+                    "op": "add", "id": detail["id"],
+                    "data": {field: data[field] for field in self.fields[domain] if isinstance(data.get(field), str)},
+                })
+            elif action == "deleted":
+                self._write_delta(domain, {"op": "remove", "id": detail["id"]})
+            elif action in ("bulk_deleted", "imported"):
+                self.drop(domain)
+        except Exception as e:
+            # An index missing this change could hide the item from searches: rebuild instead
+            print(f"Text index update failed for {detail_type}: {str(e)}")
+            self.drop(domain)
+
+
+TEXT_INDEX = TextIndexStore()
+subscribe(TEXT_INDEX.on_event)
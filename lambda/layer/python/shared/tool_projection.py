@@ -0,0 +1,82 @@
+"""Compact tabular encoding of tool results for the model context"""
+
+
+MAX_CELL_CHARS = 120
+DEFAULT_COLUMNS = ["id", "status"]
+
+
+def _cell(value):
+    """Scalar cell value; long text is truncated, nested values are summarized"""
+    if isinstance(value, str) and len(value) > MAX_CELL_CHARS:
+        return value[:MAX_CELL_CHARS] + "..."
+    if isinstance(value, list):
+        return f"[{len(value)} items]"
+    if isinstance(value, dict):
+        return value.get("id", "{...}")
+    return value
+
+
+def _value(item, column):
+    """Column lookup: top-level attributes (id, status, customerId, ...) first, then data fields"""
+    if column in item and column != "data":
+        return item[column]
+    data = item.get("data")
+    return data.get(column) if isinstance(data, dict) else None
+
+
+def _default_columns(items):
+    """id, status and every scalar data field, in first-seen order"""
+    columns = list(DEFAULT_COLUMNS)
+    for item in items:
+        data = item.get("data")
+        for key, value in (data.items() if isinstance(data, dict) else []):
+            if key not in columns and not isinstance(value, (list, dict)):
+                columns.append(key)
+    return columns
+
+
+def to_table(items, columns=None):
+    """
+    Encode domain items as {"columns": [...], "rows": [[...], ...]}.
+
+    Args:
+        items: Domain items ({"id", "status", "data": {...}, ...})
+        columns: Column names (top-level attributes or data fields); defaults
+                 to id, status and all scalar data fields
+
+    Returns:
+        Header row plus one value row per item; the id column is always kept
+    """
+    columns = list(columns or _default_columns(items))
+    if "id" not in columns:
+        columns.insert(0, "id")
+    return {"columns": columns, "rows": [[_cell(_value(item, column)) for column in columns] for item in items]}
+
+
+def project_result(result, columns=None):
+    """Replace every list of domain items in a tool result with its table encoding"""
+    if not isinstance(result, dict):
+        return result
+    projected = {}
+    for key, value in result.items():
+        if isinstance(value, list) and value and all(isinstance(item, dict) and "id" in item for item in value):
+            projected[key] = to_table(value, columns)
+        else:
+            projected[key] = value
+    return projected
+
+
+def projecting(execute, result_columns):
+    """
+    Wrap a tool executor so search results come back as compact tables.
+
+    Args:
+        execute: Callable (tool_name, tool_input) -> result
+        result_columns: {tool_name: [columns]}; tools not listed use the default projection
+
+    Returns:
+        Callable with the same signature returning projected results
+    """
+    def execute_projected(tool_name, tool_input):
+        return project_result(execute(tool_name, tool_input), result_columns.get(tool_name))
+    return execute_projected
@@ -0,0 +1,264 @@
+"""Declarative chatbot search tools composed into cheapest-first filters"""
+from .text_index import TEXT_INDEX, MAX_CANDIDATES
+
+
+# Item attributes stored outside "data" (see storage.base)
+TOP_LEVEL_FIELDS = {"id", "status", "customerId", "createdAt"}
+
+_EMPTY = {}
+
+
+def _text(value):
+    """Lowercased text of a field value (None is empty; other types are stringified)"""
+    return "" if value is None else str(value).lower()
+
+
+class TextColumns:
+    """
+    Lowercased text of items, computed once per item and set of fields.
+
+    Kept in the request's RequestMemo next to the memoized scans, so every
+    substring search over the same scanned items compares against stored
+    text instead of lowering each field again. Items are referenced here
+    while cached so their id() stays unique.
+    """
+
+    def __init__(self):
+        self.columns = {}       # fields -> {id(item): text of the fields joined by NUL}
+        self.items = []
+
+    def column(self, fields):
+        return self.columns.setdefault(fields, {})
+
+
+class Equals:
+    """Exact match on one field"""
+    cost = 0
+
+    def __init__(self, field):
+        self.field = field
+
+    def prepare(self, value):
+        return value
+
+    def select(self, items, value, texts=None):
+        """Keep the items whose field equals value"""
+        field = self.field
+        if field in TOP_LEVEL_FIELDS:
+            return [item for item in items if item.get(field) == value]
+        return [item for item in items if item.get("data", _EMPTY).get(field) == value]
+
+
+class In:
+    """Membership of one field in a set of values"""
+    cost = 0
+
+    def __init__(self, field):
+        self.field = field
+
+    def prepare(self, value):
+        return set(value)
+
+    def select(self, items, values, texts=None):
+        """Keep the items whose field is one of values"""
+        field = self.field
+        if field in TOP_LEVEL_FIELDS:
+            return [item for item in items if item.get(field) in values]
+        return [item for item in items if item.get("data", _EMPTY).get(field) in values]
+
+
+class Contains:
+    """Case-insensitive substring match on any of the given fields"""
+    cost = 1
+
+    def __init__(self, *fields):
+        self.fields = fields
+        self._sources = [(field, field in TOP_LEVEL_FIELDS) for field in fields]
+
+    def prepare(self, value):
+        return str(value).lower()       # Lowered once per call, not once per item
+
+    def text_of(self, item):
+        """The item's lowercased fields joined by NUL, so a match cannot span two fields"""
+        data = item.get("data", _EMPTY)
+        return "\0".join(_text((item if top_level else data).get(field)) for field, top_level in self._sources)
+
+    def select(self, items, text, texts=None):
+        """Keep the items containing text in any of the fields (texts: TextColumns to reuse)"""
+        if texts is None:
+            text_of = self.text_of
+            return [item for item in items if text in text_of(item)]
+        return self._select_cached(items, text, texts)
+
+    def _select_cached(self, items, text, texts):
+        column = texts.column(self.fields)
+        lowered = column.get
+
+        def remember(item):
+            value = column[id(item)] = self.text_of(item)
+            texts.items.append(item)
+            return value
+        # Empty texts are not distinguished from misses; recomputing them is cheap
+        return [item for item in items if text in (lowered(id(item)) or remember(item))]
+
+
+class OwnedBy:
+    """Scope: the customer's own items (prefetched by the CustomerScope when possible)"""
+
+    def load(self, storage, domain, customer):
+        if domain in customer.owned_items:
+            return customer.items(domain), None
+        return storage.query_by_customer_id(domain, customer.customer_id), None
+
+
+class LinkedTo:
+    """Scope: items whose data field references one of the customer's items in another domain"""
+
+    def __init__(self, domain, field):
+        self.domain = domain
+        self.field = field
+
+    def load(self, storage, domain, customer):
+        if self.domain in customer.owned_ids:
+            ids = customer.ids(self.domain)
+        else:
+            ids = [item["id"] for item in storage.query_by_customer_id(self.domain, customer.customer_id)]
+        return storage.scan(domain), (In(self.field), ids)
+
+
+def _compose(matchers):
+    """
+    Build one filter applying every matcher, cheapest first.
+
+    Each matcher's select() keeps the items passing its condition, so
+    later (costlier) conditions only see the survivors of cheaper ones;
+    substring conditions compare against text lowercased once per item.
+
+    Returns:
+        Callable (items, texts, *values) -> matching items, with texts the
+        request's TextColumns (or None) and one value per matcher (as
+        returned by its prepare) in matcher order
+    """
+    order = sorted(range(len(matchers)), key=lambda n: matchers[n].cost)
+
+    def _filter(items, texts, *values):
+        matches = items
+        for n in order:
+            matches = matchers[n].select(matches, values[n], texts)
+        return list(matches)
+
+    return _filter
+
+
+class SearchTool:
+    """
+    A search tool declared as data: domain, input-to-field mappings and limits.
+
+    Args:
+        name: Tool name (as in the tool definitions sent to the model)
+        domain: Storage domain to read
+        result_key: Key of the item list in the result
+        criteria: {input_name: Equals(...) | Contains(...)}; empty inputs are ignored
+        columns: Result columns sent to the model (see tool_projection); None for the default
+        where: {field: value} filters always applied (e.g. only ACTIVE products)
+        scope: OwnedBy() or LinkedTo(...) for customer-scoped tools; None scans the domain
+        limit: Maximum number of items returned (count still reports all matches)
+    """
+
+    def __init__(self, name, domain, result_key, criteria, columns=None, where=None, scope=None, limit=10):
+        self.name = name
+        self.domain = domain
+        self.result_key = result_key
+        self.criteria = criteria
+        self.columns = columns
+        self.where = where or {}
+        self.scope = scope
+        self.limit = limit
+        self._filters = {}     # Composed filter per combination of given inputs
+
+        # Substring searches on data fields can be narrowed by the text index
+        if not scope:
+            text_fields = {field for matcher in criteria.values() if isinstance(matcher, Contains)
+                           for field in matcher.fields if field not in TOP_LEVEL_FIELDS}
+            if text_fields:
+                TEXT_INDEX.register(domain, text_fields)
+
+    def _filter_for(self, input_names, scoped):
+        key = (input_names, scoped)
+        if key not in self._filters:
+            matchers = [Equals(field) for field in self.where]
+            matchers += [self.criteria[name] for name in input_names]
+            if scoped:
+                matchers.append(In(self.scope.field))
+            self._filters[key] = _compose(matchers)
+        return self._filters[key]
+
+    def _indexed_items(self, storage, tool_input):
+        """
+        Candidate items for substring criteria, read by id via the text index.
+
+        Returns None when the index is off or cannot narrow the search (short
+        text, too many candidates); the caller then scans. Candidates are a
+        superset of the matches: the composed filter still decides.
+        """
+        queries = [(matcher.fields, matcher.prepare(tool_input[name])) for name, matcher in self.criteria.items()
+                   if isinstance(matcher, Contains) and tool_input.get(name) not in (None, "")]
+        if not queries or not TEXT_INDEX.enabled(self.domain):
+            return None
+        index = TEXT_INDEX.load(storage, self.domain)
+        ids = None
+        for fields, text in queries:
+            found = index.candidates(fields, text)
+            if found is not None:
+                ids = found if ids is None else ids & found
+        if ids is None or len(ids) > MAX_CANDIDATES:
+            return None
+        return storage.batch_get(self.domain, sorted(ids))
+
+    def run(self, storage, tool_input, customer=None):
+        """Read the domain once and filter it, cheapest condition first (customer: CustomerScope for scoped tools)"""
+        if self.scope:
+            items, scope_filter = self.scope.load(storage, self.domain, customer)
+        else:
+            items = self._indexed_items(storage, tool_input)
+            if items is None:
+                items = storage.scan(self.domain)
+            scope_filter = None
+
+        input_names = tuple(name for name in self.criteria if tool_input.get(name) not in (None, ""))
+        values = list(self.where.values())
+        values += [self.criteria[name].prepare(tool_input[name]) for name in input_names]
+        if scope_filter:
+            matcher, value = scope_filter
+            values.append(matcher.prepare(value))
+
+        # Request-scoped storage keeps lowercased text alongside its memoized scans
+        memo = getattr(storage, "memo", None)
+        texts = memo.get_or_compute(("text_columns", self.domain), TextColumns) if memo else None
+
+        matches = self._filter_for(input_names, scope_filter is not None)(items, texts, *values)
+        return {self.result_key: matches[:self.limit], "count": len(matches)}
+
+
+class ToolRegistry:
+    """Search tools by name"""
+
+    def __init__(self, tools):
+        self.tools = {tool.name: tool for tool in tools}
+
+    def __contains__(self, tool_name):
+        return tool_name in self.tools
+
+    def run(self, tool_name, tool_input, storage, customer=None):
+        """Run a registered search tool"""
+        return self.tools[tool_name].run(storage, tool_input, customer)
+
+    def domain_of(self, tool_name, tool_input):
+        """Domain a tool call reads: the search tool's own, else the entity_type input of generic tools"""
+        if tool_name in self.tools:
+            return self.tools[tool_name].domain
+        return tool_input.get("entity_type") or tool_name
+
+    def result_columns(self):
+        """{tool_name: columns} for tools that declare result columns"""
+        return {name: tool.columns for name, tool in self.tools.items() if tool.columns}
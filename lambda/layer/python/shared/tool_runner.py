@@ -0,0 +1,134 @@
+"""Concurrent execution of the tool calls in one model turn, with timeouts and circuit breaking"""
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as ToolTimeout
+from .responses import decimal_default
+from .memo import canonical_key
+from .circuit_breaker import TOOL_BREAKER
+
+
+MAX_TOOL_WORKERS = 4
+TOOL_TIMEOUT_MS = int(os.environ.get("CHAT_TOOL_TIMEOUT_MS", "10000"))
+
+# Shared by the container's requests; the headroom covers calls still running after a timeout
+_executor = ThreadPoolExecutor(max_workers=MAX_TOOL_WORKERS * 4, thread_name_prefix="chat-tool")
+
+
+def default_tool_domain(tool_name, tool_input):
+    """Circuit key of a tool call: its entity_type input, else the tool itself"""
+    return tool_input.get("entity_type") or tool_name
+
+
+def _compute(tool_name, tool_input, execute, memo):
+    """Run the tool (memoized when a memo is given): (result, reused from memo)"""
+    if memo is None:
+        return execute(tool_name, tool_input), False
+    computed = []
+    result = memo.get_or_compute(
+        ("tool", tool_name, canonical_key(tool_input)),
+        lambda: computed.append(True) or execute(tool_name, tool_input),
+    )
+    return result, not computed
+
+
+def _unavailable(tool_name, domain, reason, message, **details):
+    """Structured result for a call that did not run to completion; the model answers without it"""
+    return {"error": "tool_unavailable", "tool": tool_name, "domain": domain, "reason": reason,
+            **details, "message": message}
+
+
+def _collect(call, expires_at, timeout_ms, status_tracker, metrics, breaker):
+    """Wait for one submitted call and build its tool_result block
+
+    Failures, timeouts and refused calls are reported back to the model as
+    error results, so one broken tool never fails the other calls of the
+    same turn or the request.
+    """
+    block, domain, future, retry_after, start_time = call
+    tool_name = block["name"]
+    cached = False
+    failed = True
+    if future is None:
+        outcome = "skipped (circuit open)"
+        payload = _unavailable(
+            tool_name, domain, "circuit_open",
+            f"{domain} lookups are failing repeatedly and are paused; answer without them and "
+            f"say this data is temporarily unavailable",
+            retry_after_seconds=retry_after,
+        )
+    else:
+        try:
+            result, cached = future.result(timeout=max(0, expires_at - time.time()))
+            content = json.dumps(result, default=decimal_default)
+            breaker.record_success(domain)
+            outcome = "reused cached result" if cached else "completed"
+            failed = False
+        except ToolTimeout:
+            future.cancel()     # Only stops calls that have not started; a running one finishes unobserved
+            breaker.record_failure(domain)
+            print(f"Tool timeout ({tool_name}) after {timeout_ms}ms")
+            outcome = "timed out"
+            payload = _unavailable(
+                tool_name, domain, "timeout",
+                f"{tool_name} did not finish within {timeout_ms}ms; answer with the results you have "
+                f"and say what could not be looked up",
+            )
+        except Exception as e:
+            breaker.record_failure(domain)
+            print(f"Tool error ({tool_name}): {str(e)}")
+            outcome = "failed"
+            payload = {"error": f"{tool_name} failed: {str(e)}"}
+    if failed:
+        content = json.dumps(payload)
+
+    elapsed_ms = int((time.time() - start_time) * 1000)
+    if status_tracker:
+        status_tracker.add("tool_execution", f"{tool_name} {outcome} ({elapsed_ms}ms)",
+                           {"tool": tool_name, "latency_ms": elapsed_ms, "error": failed, "cached": cached})
+    if metrics:
+        metrics.record_tool(tool_name, len(content.encode("utf-8")), elapsed_ms, failed, cached)
+
+    tool_result = {"type": "tool_result", "tool_use_id": block["id"], "content": content}
+    if failed:
+        tool_result["is_error"] = True
+    return tool_result
+
+
+def run_tool_calls(content, execute, status_tracker=None, memo=None, metrics=None,
+                   timeout_ms=TOOL_TIMEOUT_MS, tool_domain=None, breaker=TOOL_BREAKER):
+    """
+    Execute every tool_use block of an assistant turn concurrently, each within a time limit.
+
+    Calls whose domain has a circuit open (repeated failures or timeouts in
+    this warm container) are not run. A call that exceeds timeout_ms is
+    abandoned: its tool_result says the data is unavailable and the loop
+    continues with the other results.
+
+    Args:
+        content: Assistant message content blocks (Anthropic messages format)
+        execute: Callable (tool_name, tool_input) -> JSON-serializable result
+        status_tracker: Optional StatusTracker receiving per-tool timings
+        memo: Optional RequestMemo; identical calls (same tool, same canonical
+              input) within the request then run once
+        metrics: Optional ChatMetrics receiving per-tool timings and result sizes
+        timeout_ms: Time limit for the turn's calls, which run in parallel
+        tool_domain: Callable (tool_name, tool_input) -> circuit key; defaults to default_tool_domain
+        breaker: CircuitBreaker tracking failures per key
+
+    Returns:
+        tool_result blocks, in the same order as the tool_use blocks
+    """
+    tool_domain = tool_domain or default_tool_domain
+    calls = []
+    for block in content:
+        if block.get("type") != "tool_use":
+            continue
+        tool_input = block.get("input") or {}
+        domain = tool_domain(block["name"], tool_input)
+        allowed, retry_after = breaker.allow(domain)
+        future = _executor.submit(_compute, block["name"], tool_input, execute, memo) if allowed else None
+        calls.append((block, domain, future, retry_after, time.time()))
+
+    expires_at = time.time() + timeout_ms / 1000
+    return [_collect(call, expires_at, timeout_ms, status_tracker, metrics, breaker) for call in calls]
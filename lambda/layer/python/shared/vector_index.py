@@ -0,0 +1,415 @@
+"""Semantic search over free-text fields: pluggable embedders and a per-domain vector index"""
+import os
+import re
+import json
+import gzip
+import math
+import heapq
+import time
+import base64
+import hashlib
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from botocore.exceptions import ClientError
+from .events import subscribe
+from .s3_deltas import write_delta, list_deltas, read_delta, delete_deltas
+
+try:
+    import numpy as np
+except ImportError:     # Shipped in the Lambda layer; local runs without it score in pure Python
+    np = None
+
+
+s3 = boto3.client("s3")
+DOCS_BUCKET = os.environ.get("DOCS_BUCKET", "")
+
+EMBEDDER = os.environ.get("CHAT_EMBEDDER", "bedrock")     # "bedrock" or "hashing"
+EMBEDDING_MODEL_ID = os.environ.get("EMBEDDING_MODEL_ID", "amazon.titan-embed-text-v2:0")
+EMBEDDING_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS", "256"))
+# How long a warm container searches its cached index before checking S3 (and the table) again
+REFRESH_SECONDS = float(os.environ.get("VECTOR_INDEX_REFRESH_SECONDS", "60"))
+# Items embedded when a search refreshes the index (imported or older items); new items
+# are embedded when they are created, so this only drains a backlog
+MAX_EMBEDDINGS_PER_REFRESH = int(os.environ.get("MAX_EMBEDDINGS_PER_REFRESH", "16"))
+# Pending deltas that make a refresh store the merged index as the new base
+COMPACT_DELTAS = int(os.environ.get("VECTOR_INDEX_COMPACT_DELTAS", "20"))
+
+INDEX_PREFIX = "vector-index"
+
+
+def _normalized(vector):
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder: hashed word and word-pair features.
+
+    Captures shared vocabulary rather than meaning; meant for tests and
+    offline runs where Bedrock is not available.
+    """
+
+    def __init__(self, dimensions=EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing:{dimensions}"
+
+    def _embed_one(self, text):
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        vector = [0.0] * self.dimensions
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return _normalized(vector)
+
+    def embed(self, texts):
+        return [self._embed_one(text) for text in texts]
+
+
+class BedrockEmbedder:
+    """Titan text embeddings from Bedrock, requested concurrently (one text per call)"""
+
+    def __init__(self, model_id=EMBEDDING_MODEL_ID, dimensions=EMBEDDING_DIMENSIONS, max_workers=8):
+        self.model_id = model_id
+        self.dimensions = dimensions
+        self.max_workers = max_workers
+        self.name = f"bedrock:{model_id}:{dimensions}"
+        self.client = boto3.client("bedrock-runtime", region_name=os.environ.get("BEDROCK_REGION", "us-east-1"))
+
+    def _embed_one(self, text):
+        response = self.client.invoke_model(
+            modelId=self.model_id,
+            body=json.dumps({"inputText": text[:8000], "dimensions": self.dimensions, "normalize": True}),
+        )
+        return json.loads(response["body"].read())["embedding"]
+
+    def embed(self, texts):
+        if len(texts) <= 1:
+            return [self._embed_one(text) for text in texts]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(texts))) as pool:
+            return list(pool.map(self._embed_one, texts))
+
+
+def embedder():
+    """The configured embedder (CHAT_EMBEDDER)"""
+    if EMBEDDER == "hashing":
+        return HashingEmbedder()
+    return BedrockEmbedder()
+
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class VectorIndex:
+    """
+    Normalized embeddings of one domain's items, with the text hash each was built from.
+
+    Vectors are kept as float32 rows and scored with a dot product per
+    item; with NumPy (shipped in the Lambda layer) a batch of queries is
+    scored with one matrix product. Removed items leave an empty slot
+    until the index is next stored. `applied` holds the keys of the delta
+    objects merged into it.
+    """
+
+    def __init__(self, embedder_name, dimensions, ids=None, hashes=None, vectors=None, etag=None, applied=None):
+        self.embedder_name = embedder_name
+        self.dimensions = dimensions
+        self.ids = ids or []
+        self.hashes = hashes or []
+        self.vectors = vectors if vectors is not None else array("f")
+        self.etag = etag
+        self.applied = set(applied or ())
+        self.positions = {item_id: n for n, item_id in enumerate(self.ids) if item_id is not None}
+        self._matrix = None
+
+    def add(self, item_id, text_hash, vector):
+        """Index an item's embedding (replacing an earlier version of it)"""
+        self.remove(item_id)
+        self.positions[item_id] = len(self.ids)
+        self.ids.append(item_id)
+        self.hashes.append(text_hash)
+        self.vectors.extend(vector)
+        self._matrix = None
+
+    def remove(self, item_id):
+        position = self.positions.pop(item_id, None)
+        if position is not None:
+            self.ids[position] = None
+            self._matrix = None
+
+    def sync(self, texts, embed, limit=MAX_EMBEDDINGS_PER_REFRESH):
+        """
+        Bring the index in line with the current item texts.
+
+        Removes vanished or changed items and embeds up to `limit` new or
+        changed ones.
+
+        Args:
+            texts: {item_id: text}
+            embed: Callable embedding a list of texts
+            limit: Maximum number of texts to embed now
+
+        Returns:
+            (changed, pending): whether the index changed, and how many items still await embedding
+        """
+        wanted = {item_id: _text_hash(text) for item_id, text in texts.items()}
+        changed = False
+        for item_id in list(self.positions):
+            if wanted.get(item_id) != self.hashes[self.positions[item_id]]:
+                self.remove(item_id)
+                changed = True
+
+        missing = [item_id for item_id in texts if item_id not in self.positions]
+        batch = missing[:limit]
+        if batch:
+            for item_id, vector in zip(batch, embed([texts[item_id] for item_id in batch])):
+                self.add(item_id, wanted[item_id], vector)
+            changed = True
+        return changed, len(missing) - len(batch)
+
+    def top_k(self, queries, k):
+        """
+        Cosine top-k for a batch of normalized query vectors.
+
+        Returns:
+            One [(item_id, score), ...] list per query, best first
+        """
+        k = min(k, len(self.positions))
+        if not k:
+            return [[] for _ in queries]
+        if np is not None:
+            if self._matrix is None:
+                live = np.fromiter(self.positions.values(), dtype=np.int64, count=len(self.positions))
+                rows = np.frombuffer(self.vectors.tobytes(), dtype=np.float32).reshape(len(self.ids), self.dimensions)
+                self._matrix = (rows[live], live)
+            matrix, live = self._matrix
+            scores = np.asarray(queries, dtype=np.float32) @ matrix.T
+            results = []
+            for row in scores:
+                best = np.argpartition(-row, k - 1)[:k]
+                best = best[np.argsort(-row[best])]
+                results.append([(self.ids[live[n]], float(row[n])) for n in best])
+            return results
+
+        width = self.dimensions
+        rows = [(item_id, self.vectors[n * width:(n + 1) * width]) for item_id, n in self.positions.items()]
+        return [
+            heapq.nlargest(k, ((item_id, sum(a * b for a, b in zip(query, row))) for item_id, row in rows),
+                           key=lambda pair: pair[1])
+            for query in queries
+        ]
+
+    def to_bytes(self):
+        """Gzipped JSON, with removed slots compacted away"""
+        width = self.dimensions
+        live = sorted(self.positions.values())
+        vectors = array("f")
+        for n in live:
+            vectors.extend(self.vectors[n * width:(n + 1) * width])
+        return gzip.compress(json.dumps({
+            "embedder": self.embedder_name,
+            "dimensions": self.dimensions,
+            "ids": [self.ids[n] for n in live],
+            "hashes": [self.hashes[n] for n in live],
+            "vectors": base64.b64encode(vectors.tobytes()).decode("ascii"),
+            "applied": sorted(self.applied),
+        }).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, payload, etag):
+        data = json.loads(gzip.decompress(payload))
+        vectors = array("f")
+        vectors.frombytes(base64.b64decode(data["vectors"]))
+        return cls(data["embedder"], data["dimensions"], data["ids"], data["hashes"], vectors, etag,
+                   data.get("applied"))
+
+
+class SemanticSearch:
+    """
+    The semantic_search chatbot tool: nearest items by meaning of their free-text fields.
+
+    Items are embedded off the search path: the {domain}.created listener
+    embeds each new item and records it as a small delta object next to
+    the stored index (vector-index/<domain>.json.gz), and .deleted records
+    a removal. A search embeds only the query, scores the index cached in
+    the warm container and reads the best items by id. Every
+    REFRESH_SECONDS the next search revalidates the base, merges new
+    deltas and scans the domain to drop vanished items and embed up to
+    MAX_EMBEDDINGS_PER_REFRESH items that were imported or predate the
+    index; a changed index is stored back with a conditional put.
+
+    Args:
+        sources: {domain: [data fields whose text is embedded]}
+        embedder: Object with .name, .dimensions and .embed(texts); defaults to embedder()
+    """
+
+    def __init__(self, sources, embedder=None):
+        self.sources = sources
+        self._embedder = embedder
+        self.cache = {}         # domain -> VectorIndex
+        self.refreshed = {}     # domain -> monotonic time of the last refresh
+        self.pending = {}       # domain -> items awaiting embedding at the last refresh
+        self.lock = threading.Lock()
+        subscribe(self.on_event)
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = embedder()
+        return self._embedder
+
+    def columns(self):
+        """Result columns sent to the model"""
+        fields = [field for domain_fields in self.sources.values() for field in domain_fields]
+        return ["id", "entityType", "score", "status"] + sorted(set(fields), key=fields.index)
+
+    def _key(self, domain):
+        return f"{INDEX_PREFIX}/{domain}.json.gz"
+
+    def _delta_prefix(self, domain):
+        return f"{INDEX_PREFIX}/{domain}/deltas/"
+
+    def _text(self, domain, data):
+        return "\n".join(str(data[field]) for field in self.sources[domain] if data.get(field))
+
+    def _fetch(self, domain):
+        """Stored base index (the cached copy if unchanged), or an empty one"""
+        cached = self.cache.get(domain)
+        if DOCS_BUCKET:
+            kwargs = {"IfNoneMatch": cached.etag} if cached and cached.etag else {}
+            try:
+                response = s3.get_object(Bucket=DOCS_BUCKET, Key=self._key(domain), **kwargs)
+                cached = VectorIndex.from_bytes(response["Body"].read(), response["ETag"])
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                    cached = None
+                elif e.response["Error"]["Code"] not in ("304", "NotModified"):
+                    raise
+        if cached is None or cached.embedder_name != self.embedder.name:
+            cached = VectorIndex(self.embedder.name, self.embedder.dimensions)
+        return cached
+
+    def _merge(self, index, keys):
+        """Apply the listed deltas the index does not contain yet; forget merged keys no longer listed"""
+        for key in keys:
+            if key in index.applied:
+                continue
+            delta = read_delta(key)
+            if delta is None:
+                continue        # Compacted into a newer base meanwhile
+            if delta["op"] == "add":
+                if delta["embedder"] == index.embedder_name:
+                    index.add(delta["id"], delta["hash"], delta["vector"])
+            else:
+                index.remove(delta["id"])
+            index.applied.add(key)
+        index.applied &= set(keys)
+
+    def _store(self, domain, index):
+        """Store the index as the base and delete the deltas it contains"""
+        if not DOCS_BUCKET:
+            return
+        condition = {"IfMatch": index.etag} if index.etag else {"IfNoneMatch": "*"}
+        try:
+            response = s3.put_object(Bucket=DOCS_BUCKET, Key=self._key(domain), Body=index.to_bytes(),
+                                     ContentType="application/gzip", **condition)
+        except ClientError as e:
+            # Another container stored first; this copy is still valid here and refreshes later
+            print(f"Vector index for {domain} not stored: {str(e)}")
+            return
+        index.etag = response["ETag"]
+        delete_deltas(index.applied)
+
+    def _refresh(self, storage, domain):
+        """Reload the index from S3 and the table, embedding a bounded backlog"""
+        index = self._fetch(domain)
+        keys = list_deltas(self._delta_prefix(domain)) if DOCS_BUCKET else []
+        pending_deltas = len(set(keys) - index.applied)
+        self._merge(index, keys)
+
+        # Every page: items missing from a partial scan would be dropped from the index
+        texts = {}
+        for page in storage.scan_pages(domain):
+            for item in page:
+                text = self._text(domain, item.get("data") or {})
+                if text:
+                    texts[item["id"]] = text
+        changed, self.pending[domain] = index.sync(texts, self.embedder.embed)
+        if changed or (pending_deltas and len(index.applied) >= COMPACT_DELTAS):
+            self._store(domain, index)
+
+        self.cache[domain] = index
+        self.refreshed[domain] = time.monotonic()
+        return index
+
+    def _search(self, storage, domain, query_vector, limit):
+        """Score the domain's index: ([(item, score)], items still to embed)"""
+        with self.lock:
+            index = self.cache.get(domain)
+            if index is None or time.monotonic() - self.refreshed.get(domain, 0) >= REFRESH_SECONDS:
+                index = self._refresh(storage, domain)
+            best = index.top_k([query_vector], limit)[0]
+            pending = self.pending.get(domain, 0)
+        # Items deleted since their delta was merged are simply not found
+        items = {item["id"]: item for item in storage.batch_get(domain, [item_id for item_id, _ in best])}
+        return [(items[item_id], score) for item_id, score in best if item_id in items], pending
+
+    def on_event(self, detail_type, detail):
+        """Embed items on {domain}.created and record removals on .deleted; .bulk_deleted drops the index"""
+        domain, _, action = detail_type.rpartition(".")
+        if domain not in self.sources or not DOCS_BUCKET:
+            return
+        try:
+            if action == "created":
+                text = self._text(domain, detail.get("data") or {})
+                if not text:
+                    return
+                delta = {"op": "add", "id": detail["id"], "hash": _text_hash(text),
+                         "embedder": self.embedder.name, "vector": self.embedder.embed([text])[0]}
+            elif action == "deleted":
+                delta = {"op": "remove", "id": detail["id"]}
+            elif action == "bulk_deleted":
+                with self.lock:
+                    self.cache.pop(domain, None)
+                    self.refreshed.pop(domain, None)
+                    s3.delete_object(Bucket=DOCS_BUCKET, Key=self._key(domain))
+                    delete_deltas(list_deltas(self._delta_prefix(domain)))
+                return
+            else:
+                return
+            key = write_delta(self._delta_prefix(domain), delta)
+            with self.lock:
+                # This container's own searches see the change right away
+                index = self.cache.get(domain)
+                if index is not None:
+                    self._merge(index, sorted(index.applied | {key}))
+        except Exception as e:
+            # The next refresh's table scan embeds (or drops) the item instead
+            print(f"Vector index update failed for {detail_type}: {str(e)}")
+
+    def run(self, storage, tool_input):
+        """Execute the tool: {"query", "entity_type"?, "limit"?} -> scored items across the source domains"""
+        query = (tool_input.get("query") or "").strip()
+        if not query:
+            return {"error": "query is required"}
+        entity_type = tool_input.get("entity_type")
+        if entity_type and entity_type not in self.sources:
+            return {"error": f"Semantic search is not available for {entity_type}"}
+        limit = max(1, min(int(tool_input.get("limit") or 5), 20))
+
+        query_vector = self.embedder.embed([query])[0]
+        results, pending = [], 0
+        for domain in ([entity_type] if entity_type else list(self.sources)):
+            matches, domain_pending = self._search(storage, domain, query_vector, limit)
+            pending += domain_pending
+            results += [{**item, "entityType": domain, "score": round(score, 3)} for item, score in matches]
+
+        results.sort(key=lambda item: item["score"], reverse=True)
+        result = {"results": results[:limit], "count": min(len(results), limit)}
+        if pending:
+            result["note"] = f"{pending} recently added records are not indexed yet"
+        return result
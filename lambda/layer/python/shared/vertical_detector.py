@@ -9,11 +9,12 @@ def detect_vertical(host_header: str) -> str:
         host_header: Host header from API Gateway event (e.g., "insurance.silvermoat.net")
 
     Returns:
-        Vertical name: "insurance" or "retail" (defaults to "insurance")
+        Vertical name: "insurance", "retail" or "healthcare" (defaults to "insurance")
 
     Examples:
         insurance.silvermoat.net -> insurance
         retail.silvermoat.net -> retail
+        healthcare.silvermoat.net -> healthcare
         silvermoat.net -> insurance (default)
         localhost -> insurance (local dev)
     """
@@ -30,7 +31,7 @@ def detect_vertical(host_header: str) -> str:
     # Check if first part is a known vertical
     subdomain = parts[0] if len(parts) > 1 else ""
 
-    valid_verticals = ["insurance", "retail"]
+    valid_verticals = ["insurance", "retail", "healthcare"]
 
     if subdomain in valid_verticals:
         return subdomain
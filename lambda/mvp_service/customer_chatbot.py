@@ -4,6 +4,7 @@ import json
 import boto3
 from shared.responses import _resp, decimal_default
 from shared.storage import DynamoDBBackend
+from shared.customer_scope import resolve_customer
 
 
 # Initialize Bedrock client
@@ -59,20 +60,18 @@ CUSTOMER_TOOLS = [
 ]
 
 
-def execute_customer_tool(tool_name, tool_input, storage, customer_email):
+def execute_customer_tool(tool_name, tool_input, storage, customer):
     """Execute a customer-scoped tool call and return results"""
 
-    # Get customer by email using GSI
-    customers = storage.query_by_email("customer", customer_email)
-    if not customers:
+    # Customer resolved once per request (see resolve_customer)
+    if not customer:
         return {"error": "Customer not found"}
 
-    customer = customers[0]
-    customer_id = customer["id"]
+    customer_id = customer.customer_id
 
     if tool_name == "search_my_policies":
-        # Query policies by customerId using GSI
-        items = storage.query_by_customer_id("policy", customer_id)
+        # Policies prefetched by customerId
+        items = customer.items("policy")
 
         print(f"[DEBUG] search_my_policies: customer_id='{customer_id}', total_policies={len(items)}")
 
@@ -87,8 +86,8 @@ def execute_customer_tool(tool_name, tool_input, storage, customer_email):
         return {"policies": items[:10], "count": len(items)}
 
     elif tool_name == "search_my_claims":
-        # Query claims by customerId using GSI
-        items = storage.query_by_customer_id("claim", customer_id)
+        # Claims prefetched by customerId
+        items = customer.items("claim")
 
         print(f"[DEBUG] search_my_claims: customer_id='{customer_id}', total_claims={len(items)}")
 
@@ -103,9 +102,8 @@ def execute_customer_tool(tool_name, tool_input, storage, customer_email):
         return {"claims": items[:10], "count": len(items)}
 
     elif tool_name == "search_my_payments":
-        # Get policies by customerId, then filter payments
-        policies = storage.query_by_customer_id("policy", customer_id)
-        policy_ids = [p["id"] for p in policies]
+        # Payments are linked to the customer through their policies
+        policy_ids = customer.ids("policy")
 
         print(f"[DEBUG] search_my_payments: customer_id='{customer_id}', policy_ids={len(policy_ids)}")
 
@@ -130,24 +128,13 @@ def execute_customer_tool(tool_name, tool_input, storage, customer_email):
         if not item:
             return {"error": f"{entity_type} not found"}
 
-        # Verify ownership via customerId
-        if entity_type == "policy":
-            if item.get("customerId") != customer_id:
+        # Verify ownership: policies and claims directly, payments via their policy
+        if entity_type in ["policy", "claim"]:
+            if not customer.owns(entity_type, entity_id):
+                return {"error": "Access denied"}
+        elif entity_type == "payment":
+            if not customer.owns("policy", item.get("data", {}).get("policyId")):
                 return {"error": "Access denied"}
-        elif entity_type in ["claim", "payment"]:
-            # Check if item's customerId matches (for claim) or via policy (for payment)
-            if entity_type == "claim":
-                if item.get("customerId") != customer_id:
-                    return {"error": "Access denied"}
-            else:
-                # For payment, check via policy
-                policy_id = item.get("data", {}).get("policyId")
-                if policy_id:
-                    policy = storage.get("policy", policy_id)
-                    if not policy or policy.get("customerId") != customer_id:
-                        return {"error": "Access denied"}
-                else:
-                    return {"error": "Access denied"}
 
         return {entity_type: item}
 
@@ -168,6 +155,9 @@ def handle_customer_chat(event, storage):
         if not customer_email:
             return _resp(400, {"error": "customer_email_required", "message": "Customer email is required for customer chat"})
 
+        # Resolve the customer (and their policy/claim ids) once for every tool call
+        customer = resolve_customer(storage, customer_email, ["policy", "claim"])
+
         # Build messages for Claude
         messages = conversation_history + [{"role": "user", "content": user_message}]
 
@@ -207,7 +197,7 @@ def handle_customer_chat(event, storage):
                     tool_use_id = content_block["id"]
 
                     # Execute the tool with customer email filtering
-                    result = execute_customer_tool(tool_name, tool_input, storage, customer_email)
+                    result = execute_customer_tool(tool_name, tool_input, storage, customer)
 
                     tool_results.append({
                         "type": "tool_result",
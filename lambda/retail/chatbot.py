@@ -1,14 +1,36 @@
 """Retail employee chatbot endpoint logic using AWS Bedrock"""
 import os
 import json
-import boto3
-from shared.responses import _resp, decimal_default
-
-
-# Initialize Bedrock client
-bedrock = boto3.client("bedrock-runtime", region_name=os.environ.get("BEDROCK_REGION", "us-east-1"))
+from shared.responses import _resp
+from shared.chat_engine import chat_events, chat_response
+from shared.chat_stream import wants_live_stream
+from shared.model_client import model_client
+from shared.chat_history import compact_history
+from shared.conversations import open_session, ConversationError
+from shared.chat_jobs import open_chat_job
+from shared.response_cache import open_response_cache
+from shared.status import StatusTracker
+from shared.deadline import Deadline
+from shared.memo import RequestMemo
+from shared.tool_registry import ToolRegistry, SearchTool, Contains, Equals
+from shared.intents import IntentParser
+from shared.vector_index import SemanticSearch
+from shared.aggregation import Aggregation
+from shared.storage import RequestCachedStorage
+
+
+# Model client (Bedrock, or a scripted stand-in when CHAT_MODEL_SCRIPT is set)
+bedrock = model_client()
 BEDROCK_MODEL_ID = os.environ.get("BEDROCK_MODEL_ID", "anthropic.claude-3-5-sonnet-20240620-v1:0")
 
+# Report aggregations: groupable and numeric fields per domain
+AGGREGATE = Aggregation({
+    "product": {"group_by": ["status", "category"], "numeric": ["price", "stockQuantity"]},
+    "order": {"group_by": ["status"], "numeric": ["totalAmount"]},
+    "inventory": {"group_by": ["status", "location"], "numeric": ["quantity"]},
+    "case": {"group_by": ["status", "priority", "topic", "assignee"]},
+})
+
 # Tool definitions for retail assistant
 TOOLS = [
     {
@@ -61,6 +83,22 @@ TOOLS = [
             }
         }
     },
+    {
+        "name": "semantic_search",
+        "description": "Find products or cases by meaning when keyword searches miss, e.g. \"something to keep drinks cold outdoors\" or \"package arrived damaged\". Searches product and case descriptions",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "What the records are about, in plain words"},
+                "entity_type": {"type": "string", "enum": ["product", "case"], "description": "Limit to one record type"},
+                "limit": {"type": "integer", "description": "Number of results (default 5, max 20)"}
+            },
+            "required": ["query"]
+        }
+    },
+    AGGREGATE.tool_definition(
+        "Counts and totals across all products, orders, inventory or cases, grouped by a field, e.g. orders by status with total revenue, or average price per product category. Use for reports and \"how many\" / \"how much\" questions instead of paging through searches"
+    ),
     {
         "name": "get_entity_details",
         "description": "Get full details of a specific product, order, inventory, or case by ID",
@@ -75,73 +113,59 @@ TOOLS = [
     }
 ]
 
+# Search tools: input-to-field mappings, match semantics and the columns sent to the model
+# (full records via get_entity_details)
+SEARCH_TOOLS = ToolRegistry([
+    SearchTool(
+        "search_products", "product", "products",
+        {"sku": Contains("sku"), "name": Contains("name"), "category": Contains("category"), "status": Equals("status")},
+        columns=["id", "status", "sku", "name", "category", "price", "stockQuantity"],
+    ),
+    SearchTool(
+        "search_orders", "order", "orders",
+        {"order_number": Contains("orderNumber"), "customer_name": Contains("customerName"), "status": Equals("status")},
+        columns=["id", "status", "orderNumber", "customerName", "totalAmount", "orderDate", "items"],
+    ),
+    SearchTool(
+        "search_inventory", "inventory", "inventory",
+        {"location": Contains("location"), "product_id": Equals("productId"), "status": Equals("status")},
+        columns=["id", "status", "productName", "sku", "location", "quantity", "reorderPoint"],
+    ),
+    SearchTool(
+        "search_cases", "case", "cases",
+        {"title": Contains("title"), "customer_name": Contains("customerName"), "priority": Equals("priority"), "status": Equals("status")},
+        columns=["id", "status", "title", "customerName", "priority", "assignee", "topic"],
+    ),
+])
+
+# Meaning-based search over free-text fields (embeddings indexed per domain)
+SEMANTIC_SEARCH = SemanticSearch({"product": ["name", "category", "description"], "case": ["title", "description"]})
+RESULT_COLUMNS = {**SEARCH_TOOLS.result_columns(), "semantic_search": SEMANTIC_SEARCH.columns()}
+
+# Direct ID lookups answered from storage without the model
+INTENTS = IntentParser(
+    SEARCH_TOOLS,
+    id_lookups=[
+        (r"SKU-\d{5}", "search_products", "sku"),
+        (r"ORD-\d{6}", "search_orders", "order_number"),
+    ],
+    entity_tools={"product": "search_products", "order": "search_orders", "inventory": "search_inventory",
+                  "case": "search_cases"},
+)
+
+
 def execute_tool(tool_name, tool_input, storage):
     """Execute a tool call and return results"""
-    if tool_name == "search_products":
-        items = storage.scan("product")
-
-        # Filter by criteria
-        if tool_input.get("sku"):
-            sku = tool_input["sku"].lower()
-            items = [i for i in items if sku in i.get("data", {}).get("sku", "").lower()]
-        if tool_input.get("name"):
-            name = tool_input["name"].lower()
-            items = [i for i in items if name in i.get("data", {}).get("name", "").lower()]
-        if tool_input.get("category"):
-            cat = tool_input["category"].lower()
-            items = [i for i in items if cat in i.get("data", {}).get("category", "").lower()]
-        if tool_input.get("status"):
-            items = [i for i in items if tool_input["status"] == i.get("status")]
-
-        return {"products": items[:10], "count": len(items)}
-
-    elif tool_name == "search_orders":
-        items = storage.scan("order")
-
-        # Filter by criteria
-        if tool_input.get("order_number"):
-            on = tool_input["order_number"].lower()
-            items = [i for i in items if on in i.get("data", {}).get("orderNumber", "").lower()]
-        if tool_input.get("customer_name"):
-            cn = tool_input["customer_name"].lower()
-            items = [i for i in items if cn in i.get("data", {}).get("customerName", "").lower()]
-        if tool_input.get("status"):
-            items = [i for i in items if tool_input["status"] == i.get("status")]
-
-        return {"orders": items[:10], "count": len(items)}
-
-    elif tool_name == "search_inventory":
-        items = storage.scan("inventory")
-
-        # Filter by criteria
-        if tool_input.get("location"):
-            loc = tool_input["location"].lower()
-            items = [i for i in items if loc in i.get("data", {}).get("location", "").lower()]
-        if tool_input.get("product_id"):
-            items = [i for i in items if tool_input["product_id"] == i.get("data", {}).get("productId")]
-        if tool_input.get("status"):
-            items = [i for i in items if tool_input["status"] == i.get("status")]
-
-        return {"inventory": items[:10], "count": len(items)}
-
-    elif tool_name == "search_cases":
-        items = storage.scan("case")
-
-        # Filter by criteria
-        if tool_input.get("title"):
-            title = tool_input["title"].lower()
-            items = [i for i in items if title in i.get("data", {}).get("title", "").lower()]
-        if tool_input.get("customer_name"):
-            cn = tool_input["customer_name"].lower()
-            items = [i for i in items if cn in i.get("data", {}).get("customerName", "").lower()]
-        if tool_input.get("priority"):
-            items = [i for i in items if tool_input["priority"] == i.get("data", {}).get("priority")]
-        if tool_input.get("status"):
-            items = [i for i in items if tool_input["status"] == i.get("status")]
-
-        return {"cases": items[:10], "count": len(items)}
-
-    elif tool_name == "get_entity_details":
+    if tool_name in SEARCH_TOOLS:
+        return SEARCH_TOOLS.run(tool_name, tool_input, storage)
+
+    if tool_name == "semantic_search":
+        return SEMANTIC_SEARCH.run(storage, tool_input)
+
+    if tool_name == "aggregate":
+        return AGGREGATE.run(storage, tool_input)
+
+    if tool_name == "get_entity_details":
         entity_type = tool_input["entity_type"]
         entity_id = tool_input["entity_id"]
 
@@ -154,94 +178,64 @@ def execute_tool(tool_name, tool_input, storage):
     return {"error": "Unknown tool"}
 
 
-def handle_chat(event, storage):
+def handle_chat(event, storage, context=None):
     """Handle POST /chat endpoint for retail employees"""
     try:
         body = json.loads(event.get("body", "{}"))
         user_message = body.get("message", "")
-        conversation_history = body.get("history", [])
+        stream = bool(body.get("stream"))
 
         if not user_message:
             return _resp(400, {"error": "message_required", "message": "Message is required"})
 
-        # Build messages for Claude
-        messages = conversation_history + [{"role": "user", "content": user_message}]
+        # Session mode: history is kept server-side and only the new turn is exchanged
+        session = open_session(body, owner="staff")
+        conversation_history = session.history if session else body.get("history", [])
 
-        # System prompt for retail assistant
-        system_prompt = "You are a helpful AI assistant for Silvermoat Retail employees. You help employees search products, manage inventory, track orders, and handle customer support cases. When users ask about products, orders, or inventory, use the available tools to search the database. Be professional, concise, and accurate. Format data clearly for retail context. When helping with forms, provide structured data that can pre-fill form fields."
+        # Opt-in answer cache for repeated first questions over unchanged data
+        cache = open_response_cache(body, user_message, conversation_history, session, storage.table_names)
 
-        # Invoke Bedrock with tool use
-        response = bedrock.invoke_model(
-            modelId=BEDROCK_MODEL_ID,
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 4096,
-                "system": system_prompt,
-                "messages": messages,
-                "tools": TOOLS,
-                "temperature": 0.7
-            })
-        )
-
-        response_body = json.loads(response["body"].read())
-
-        # Handle tool use loop
-        while response_body.get("stop_reason") == "tool_use":
-            # Extract tool calls
-            assistant_message = {
-                "role": "assistant",
-                "content": response_body["content"]
-            }
-            messages.append(assistant_message)
-
-            # Execute tools
-            tool_results = []
-            for content_block in response_body["content"]:
-                if content_block["type"] == "tool_use":
-                    tool_name = content_block["name"]
-                    tool_input = content_block["input"]
-                    tool_use_id = content_block["id"]
-
-                    # Execute the tool
-                    result = execute_tool(tool_name, tool_input, storage)
-
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": tool_use_id,
-                        "content": json.dumps(result, default=decimal_default)
-                    })
-
-            # Send tool results back to Claude
-            messages.append({
-                "role": "user",
-                "content": tool_results
-            })
-
-            # Continue conversation
-            response = bedrock.invoke_model(
-                modelId=BEDROCK_MODEL_ID,
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 4096,
-                    "system": system_prompt,
-                    "messages": messages,
-                    "tools": TOOLS,
-                    "temperature": 0.7
-                })
-            )
+        status_tracker = StatusTracker()
 
-            response_body = json.loads(response["body"].read())
+        # Request-scoped memo: identical tool calls and repeated table reads run once
+        memo = RequestMemo()
+        storage = RequestCachedStorage(storage, memo)
+        if cache:
+            storage = cache.track(storage)
 
-        # Extract final response
-        assistant_content = response_body["content"]
-        text_content = next((block["text"] for block in assistant_content if block["type"] == "text"), "")
+        # Build messages (old tool results compacted so long sessions stay within a token budget)
+        messages = compact_history(conversation_history, status_tracker=status_tracker) + [{"role": "user", "content": user_message}]
 
-        return _resp(200, {
-            "response": text_content,
-            "usage": response_body.get("usage", {}),
-            "conversation": messages + [{"role": "assistant", "content": assistant_content}]
-        })
+        # System prompt for retail assistant
+        system_prompt = "You are a helpful AI assistant for Silvermoat Retail employees. You help employees search products, manage inventory, track orders, and handle customer support cases. When users ask about products, orders, or inventory, use the available tools to search the database. Be professional, concise, and accurate. Format data clearly for retail context. When helping with forms, provide structured data that can pre-fill form fields."
 
+        # Direct ID lookups ("show claim CLM-1234-5678") are answered without the model
+        events = INTENTS.answer(user_message, messages, storage, status_tracker)
+        # Then a stored answer to the same first question, if the data it read is unchanged
+        cached = cache.lookup() if cache and events is None else None
+        if cached is not None:
+            events = cache.events(cached, messages, status_tracker)
+        elif events is None:
+            # Otherwise run the tool-use loop (NDJSON events when "stream" is requested)
+            events = chat_events(
+                bedrock, BEDROCK_MODEL_ID, system_prompt, messages, TOOLS,
+                lambda tool_name, tool_input: execute_tool(tool_name, tool_input, storage),
+                status_tracker, memo, stream=stream,
+                result_columns=RESULT_COLUMNS, deadline=Deadline(context),
+                tool_domain=SEARCH_TOOLS.domain_of,
+            )
+            if cache:
+                events = cache.record(events)
+        if session:
+            events = session.record(events, len(messages) - 1)
+        # Chat job worker: status messages become the job's progress as they happen
+        job = open_chat_job(event)
+        if job:
+            events = job.record(events)
+        return chat_response(events, stream, live=wants_live_stream(event))
+
+    except ConversationError as e:
+        return _resp(e.status_code, {"error": e.error, "message": str(e)})
     except Exception as e:
         print(f"Retail chat error: {str(e)}")
         return _resp(500, {"error": "chat_error", "message": str(e)})
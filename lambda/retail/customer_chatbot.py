@@ -1,12 +1,22 @@
 """Retail customer chatbot endpoint logic using AWS Bedrock"""
 import os
 import json
-import boto3
-from shared.responses import _resp, decimal_default
-
-
-# Initialize Bedrock client
-bedrock = boto3.client("bedrock-runtime", region_name=os.environ.get("BEDROCK_REGION", "us-east-1"))
+from shared.responses import _resp
+from shared.chat_engine import chat_events, chat_response
+from shared.chat_stream import wants_live_stream
+from shared.model_client import model_client
+from shared.chat_history import compact_history
+from shared.conversations import open_session, ConversationError
+from shared.status import StatusTracker
+from shared.deadline import Deadline
+from shared.memo import RequestMemo
+from shared.customer_scope import resolve_customer
+from shared.tool_registry import ToolRegistry, SearchTool, Contains, Equals, OwnedBy
+from shared.storage import RequestCachedStorage
+
+
+# Model client (Bedrock, or a scripted stand-in when CHAT_MODEL_SCRIPT is set)
+bedrock = model_client()
 BEDROCK_MODEL_ID = os.environ.get("BEDROCK_MODEL_ID", "anthropic.claude-3-5-sonnet-20240620-v1:0")
 
 # Tool definitions for customer-facing retail chatbot
@@ -46,33 +56,38 @@ CUSTOMER_TOOLS = [
     }
 ]
 
-def execute_customer_tool(tool_name, tool_input, storage, customer_email):
-    """Execute a customer-scoped tool call and return results"""
-    # Get customer by email using GSI
-    customers = storage.query_by_email("customer", customer_email)
-    if not customers:
+# Search tools: input-to-field mappings, match semantics and the columns sent to the model
+# (full orders via track_order)
+SEARCH_TOOLS = ToolRegistry([
+    SearchTool(
+        "search_my_orders", "order", "orders",
+        {"order_number": Contains("orderNumber"), "status": Equals("status")},
+        columns=["id", "status", "orderNumber", "totalAmount", "orderDate", "items"],
+        scope=OwnedBy(),
+    ),
+    SearchTool(
+        "browse_products", "product", "products",
+        {"category": Contains("category"), "search": Contains("name", "description")},
+        columns=["id", "name", "category", "price", "stockQuantity", "description"],
+        where={"status": "ACTIVE"},
+        limit=20,
+    ),
+])
+RESULT_COLUMNS = SEARCH_TOOLS.result_columns()
+
+# Customer items prefetched once per request (ownership checks become set lookups)
+OWNED_DOMAINS = ["order"]
+
+
+def execute_customer_tool(tool_name, tool_input, storage, customer):
+    """Execute a tool call scoped to the request's CustomerScope and return results"""
+    if not customer:
         return {"error": "Customer not found"}
 
-    customer = customers[0]
-    customer_id = customer["id"]
-
-    if tool_name == "search_my_orders":
-        # Query orders by customerId using GSI
-        items = storage.query_by_customer_id("order", customer_id)
-
-        print(f"[DEBUG] search_my_orders: customer_id='{customer_id}', total_orders={len(items)}")
+    if tool_name in SEARCH_TOOLS:
+        return SEARCH_TOOLS.run(tool_name, tool_input, storage, customer=customer)
 
-        # Filter by additional criteria
-        if tool_input.get("order_number"):
-            on = tool_input["order_number"].lower()
-            items = [i for i in items if on in i.get("data", {}).get("orderNumber", "").lower()]
-        if tool_input.get("status"):
-            items = [i for i in items if tool_input["status"] == i.get("status")]
-            print(f"[DEBUG] After status filter ({tool_input['status']}): {len(items)} orders")
-
-        return {"orders": items[:10], "count": len(items)}
-
-    elif tool_name == "track_order":
+    if tool_name == "track_order":
         order_id = tool_input["order_id"]
         item = storage.get("order", order_id)
 
@@ -80,38 +95,21 @@ def execute_customer_tool(tool_name, tool_input, storage, customer_email):
             return {"error": "Order not found"}
 
         # Verify ownership
-        if item.get("customerId") != customer_id:
+        if not customer.owns("order", order_id):
             return {"error": "Access denied"}
 
         # Return order with tracking info
         return {"order": item}
 
-    elif tool_name == "browse_products":
-        # Get all active products
-        items = storage.scan("product")
-        items = [i for i in items if i.get("status") == "ACTIVE"]
-
-        # Filter by criteria
-        if tool_input.get("category"):
-            cat = tool_input["category"].lower()
-            items = [i for i in items if cat in i.get("data", {}).get("category", "").lower()]
-        if tool_input.get("search"):
-            search = tool_input["search"].lower()
-            items = [i for i in items if
-                    search in i.get("data", {}).get("name", "").lower() or
-                    search in i.get("data", {}).get("description", "").lower()]
-
-        return {"products": items[:20], "count": len(items)}
-
     return {"error": "Unknown tool"}
 
 
-def handle_customer_chat(event, storage):
+def handle_customer_chat(event, storage, context=None):
     """Handle POST /customer-chat endpoint for retail customers"""
     try:
         body = json.loads(event.get("body", "{}"))
         user_message = body.get("message", "")
-        conversation_history = body.get("history", [])
+        stream = bool(body.get("stream"))
         customer_email = body.get("customerEmail", "")
 
         if not user_message:
@@ -120,84 +118,39 @@ def handle_customer_chat(event, storage):
         if not customer_email:
             return _resp(400, {"error": "customer_email_required", "message": "Customer email is required for customer chat"})
 
-        # Build messages for Claude
-        messages = conversation_history + [{"role": "user", "content": user_message}]
+        # Session mode: history is kept server-side and only the new turn is exchanged
+        session = open_session(body, owner=customer_email)
+        conversation_history = session.history if session else body.get("history", [])
+
+        status_tracker = StatusTracker()
+
+        # Request-scoped memo: identical tool calls and repeated table reads run once
+        memo = RequestMemo()
+        storage = RequestCachedStorage(storage, memo)
+
+        # Resolve the customer once for every tool call in this request
+        customer = resolve_customer(storage, customer_email, OWNED_DOMAINS)
+
+        # Build messages (old tool results compacted so long sessions stay within a token budget)
+        messages = compact_history(conversation_history, status_tracker=status_tracker) + [{"role": "user", "content": user_message}]
 
         # System prompt for customer assistant
         system_prompt = f"You are a helpful AI assistant for Silvermoat Retail customers. You help customers track their orders, browse products, and get support. The customer you're assisting is {customer_email}. When customers ask about their orders or want to browse products, use the available tools. Be professional, friendly, and helpful. Format data clearly. Only show information that belongs to this customer."
 
-        # Invoke Bedrock with tool use
-        response = bedrock.invoke_model(
-            modelId=BEDROCK_MODEL_ID,
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 4096,
-                "system": system_prompt,
-                "messages": messages,
-                "tools": CUSTOMER_TOOLS,
-                "temperature": 0.7
-            })
+        # Run the tool-use loop (NDJSON events when "stream" is requested)
+        events = chat_events(
+            bedrock, BEDROCK_MODEL_ID, system_prompt, messages, CUSTOMER_TOOLS,
+            lambda tool_name, tool_input: execute_customer_tool(tool_name, tool_input, storage, customer),
+            status_tracker, memo, stream=stream,
+            result_columns=RESULT_COLUMNS, deadline=Deadline(context),
+            tool_domain=SEARCH_TOOLS.domain_of,
         )
+        if session:
+            events = session.record(events, len(messages) - 1)
+        return chat_response(events, stream, live=wants_live_stream(event))
 
-        response_body = json.loads(response["body"].read())
-
-        # Handle tool use loop
-        while response_body.get("stop_reason") == "tool_use":
-            # Extract tool calls
-            assistant_message = {
-                "role": "assistant",
-                "content": response_body["content"]
-            }
-            messages.append(assistant_message)
-
-            # Execute tools
-            tool_results = []
-            for content_block in response_body["content"]:
-                if content_block["type"] == "tool_use":
-                    tool_name = content_block["name"]
-                    tool_input = content_block["input"]
-                    tool_use_id = content_block["id"]
-
-                    # Execute the tool with customer email filtering
-                    result = execute_customer_tool(tool_name, tool_input, storage, customer_email)
-
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": tool_use_id,
-                        "content": json.dumps(result, default=decimal_default)
-                    })
-
-            # Send tool results back to Claude
-            messages.append({
-                "role": "user",
-                "content": tool_results
-            })
-
-            # Continue conversation
-            response = bedrock.invoke_model(
-                modelId=BEDROCK_MODEL_ID,
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 4096,
-                    "system": system_prompt,
-                    "messages": messages,
-                    "tools": CUSTOMER_TOOLS,
-                    "temperature": 0.7
-                })
-            )
-
-            response_body = json.loads(response["body"].read())
-
-        # Extract final response
-        assistant_content = response_body["content"]
-        text_content = next((block["text"] for block in assistant_content if block["type"] == "text"), "")
-
-        return _resp(200, {
-            "response": text_content,
-            "usage": response_body.get("usage", {}),
-            "conversation": messages + [{"role": "assistant", "content": assistant_content}]
-        })
-
+    except ConversationError as e:
+        return _resp(e.status_code, {"error": e.error, "message": str(e)})
     except Exception as e:
         print(f"Retail customer chat error: {str(e)}")
         return _resp(500, {"error": "chat_error", "message": str(e)})
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark the staff chat tool loop offline: end-to-end latency minus model time.
+
+Runs a vertical's handle_chat against in-memory synthetic data with the
+scripted model client from shared.model_client (no AWS access), so the
+numbers isolate storage reads, tool execution, serialization and loop
+overhead. The default script calls two search tools, then a third, then
+answers; pass --script to replay your own (see ScriptedModelClient).
+
+Usage:
+    python scripts/benchmark-chat-loop.py [--vertical insurance] [--items 2000] [--requests 50]
+                                          [--latency-ms 0] [--stream] [--script steps.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+LAMBDA_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+sys.path.insert(0, os.path.join(LAMBDA_ROOT, "layer", "python"))
+
+# Clients are created at import time but never called; keep optional tables and the text index off
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+for name in ("CONVERSATIONS_TABLE", "RESPONSE_CACHE_TABLE", "CHAT_MODEL_SCRIPT", "DOCS_BUCKET"):
+    os.environ.pop(name, None)
+
+from shared.model_client import ScriptedModelClient  # noqa: E402
+
+
+STATUSES = ["PENDING", "ACTIVE", "APPROVED", "CLOSED"]
+WORDS = ["Ann", "Lee", "Garcia", "north", "water", "premium", "basic", "urgent", "review", "refill"]
+
+
+class MemoryStorage:
+    """Storage stand-in holding prebuilt items per domain"""
+
+    def __init__(self, domains):
+        self.domains = domains
+        self.table_names = {domain: domain for domain in domains}
+
+    def scan(self, domain):
+        return list(self.domains.get(domain, []))
+
+    def list(self, domain):
+        return self.scan(domain)
+
+    def get(self, domain, item_id):
+        return next((item for item in self.domains.get(domain, []) if item["id"] == item_id), None)
+
+    def query_by_email(self, domain, email):
+        return [item for item in self.domains.get(domain, []) if item.get("email") == email]
+
+    def query_by_customer_id(self, domain, customer_id):
+        return [item for item in self.domains.get(domain, []) if item.get("customerId") == customer_id]
+
+
+def make_items(tool, count):
+    """Synthetic items carrying every field the tool filters on or returns"""
+    fields = set(tool.columns or [])
+    for matcher in tool.criteria.values():
+        fields.update(getattr(matcher, "fields", None) or [matcher.field])
+    fields -= {"id", "status", "createdAt", "customerId"}
+    return [
+        {
+            "id": f"{tool.domain}-{n}",
+            "status": random.choice(STATUSES),
+            "createdAt": 1700000000 + n,
+            "data": {field: (random.randint(1, 5000) if field.lower().endswith(("amount", "quantity", "price", "premium"))
+                             else f"{random.choice(WORDS)} {random.choice(WORDS)} {n}")
+                     for field in sorted(fields)},
+        }
+        for n in range(count)
+    ]
+
+
+def default_script(registry):
+    names = list(registry.tools)
+    return [
+        {"text": "Let me look that up.",
+         "tool_use": [{"name": names[0], "input": {"status": "PENDING"}}, {"name": names[1], "input": {"status": "ACTIVE"}}]},
+        {"tool_use": [{"name": names[-1], "input": {"status": "PENDING"}}]},
+        {"text": "There are several pending items; the most recent ones are listed above."},
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chat tool loop without Bedrock")
+    parser.add_argument("--vertical", default="insurance", choices=["insurance", "retail", "healthcare"])
+    parser.add_argument("--items", type=int, default=2000, help="Items per searchable domain")
+    parser.add_argument("--requests", type=int, default=50, help="Chat requests to time")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated model time per call")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming (NDJSON) path")
+    parser.add_argument("--script", help="JSON file with scripted model steps")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(LAMBDA_ROOT, args.vertical))
+    import chatbot
+
+    random.seed(7)
+    storage = MemoryStorage({tool.domain: make_items(tool, args.items) for tool in chatbot.SEARCH_TOOLS.tools.values()})
+    script = ScriptedModelClient.from_file(args.script).script if args.script else default_script(chatbot.SEARCH_TOOLS)
+    client = ScriptedModelClient(script, latency_ms=args.latency_ms)
+    chatbot.bedrock = client
+
+    event = {"body": json.dumps({"message": "Which items need attention this week?", "stream": args.stream})}
+    totals, models, calls = [], [], []
+    for n in range(args.requests + 1):
+        model_before, calls_before = client.model_seconds, client.calls
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):     # Per-request log lines
+            response = chatbot.handle_chat(event, storage)
+        elapsed = time.perf_counter() - start
+        if response["statusCode"] != 200:
+            print(f"Chat failed: {response['body']}", file=sys.stderr)
+            sys.exit(1)
+        if n == 0:
+            continue    # Warm-up: filter compilation, first imports
+        totals.append(elapsed * 1000)
+        models.append((client.model_seconds - model_before) * 1000)
+        calls.append(client.calls - calls_before)
+
+    overhead = [total - model for total, model in zip(totals, models)]
+    print(f"{args.vertical}: {args.requests} requests, {args.items} items per domain, "
+          f"{statistics.mean(calls):.0f} model calls per request, {args.latency_ms:g}ms simulated model latency"
+          f"{', streaming' if args.stream else ''}\n")
+    print(f"{'ms per request':<16} {'mean':>9} {'p50':>9} {'p95':>9}")
+    for label, values in (("end-to-end", totals), ("model", models), ("loop overhead", overhead)):
+        print(f"{label:<16} {statistics.mean(values):>9.2f} {percentile(values, 0.5):>9.2f} {percentile(values, 0.95):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
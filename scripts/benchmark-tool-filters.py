@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark the chatbot search filters: composed registry filters vs. chained list filters.
+
+Builds synthetic items in memory (no AWS access), runs the same searches through
+the previous hand-written filter chains and through shared.tool_registry, checks
+that both return the same results and prints timings.
+
+Usage:
+    python scripts/benchmark-tool-filters.py [--items 20000] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda", "layer", "python"))
+
+# Clients are created at import time but never called; keep the text index off
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.pop("DOCS_BUCKET", None)
+
+from shared.memo import RequestMemo  # noqa: E402
+from shared.tool_registry import SearchTool, Contains, Equals  # noqa: E402
+
+
+STATUSES = ["ACTIVE", "EXPIRED", "CANCELLED"]
+FIRST_NAMES = ["Ann", "Bob", "Carla", "Dmitri", "Eve", "Farah", "Gus", "Hana"]
+LAST_NAMES = ["Lee", "Smith", "Garcia", "Ivanova", "Okafor", "Nguyen", "Brown"]
+CATEGORIES = ["Electronics", "Home & Garden", "Clothing", "Sports", "Toys"]
+
+
+def make_policies(count):
+    return [
+        {
+            "id": f"policy-{n}",
+            "status": random.choice(STATUSES),
+            "data": {
+                "policyNumber": f"POL-{random.randint(1000, 9999)}-{random.randint(1000, 9999)}",
+                "holderName": f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}",
+                "coverageAmount": random.randint(50, 1000) * 1000,
+            },
+        }
+        for n in range(count)
+    ]
+
+
+def make_products(count):
+    return [
+        {
+            "id": f"product-{n}",
+            "status": random.choice(["ACTIVE", "ACTIVE", "DISCONTINUED"]),
+            "data": {
+                "name": f"{random.choice(['Smart', 'Classic', 'Pro', 'Eco'])} {random.choice(['Lamp', 'Jacket', 'Ball', 'Drone'])} {n}",
+                "category": random.choice(CATEGORIES),
+                "description": f"High-quality item number {n} for everyday use",
+            },
+        }
+        for n in range(count)
+    ]
+
+
+def legacy_search_policies(items, tool_input):
+    """Filter chain as previously written in insurance/chatbot.py"""
+    if tool_input.get("policy_number"):
+        pn = tool_input["policy_number"].lower()
+        items = [i for i in items if pn in i.get("data", {}).get("policyNumber", "").lower()]
+    if tool_input.get("holder_name"):
+        hn = tool_input["holder_name"].lower()
+        items = [i for i in items if hn in i.get("data", {}).get("holderName", "").lower()]
+    if tool_input.get("status"):
+        items = [i for i in items if tool_input["status"] == i.get("status")]
+    return {"policies": items[:10], "count": len(items)}
+
+
+def legacy_browse_products(items, tool_input):
+    """Filter chain as previously written in retail/customer_chatbot.py"""
+    items = [i for i in items if i.get("status") == "ACTIVE"]
+    if tool_input.get("category"):
+        cat = tool_input["category"].lower()
+        items = [i for i in items if cat in i.get("data", {}).get("category", "").lower()]
+    if tool_input.get("search"):
+        search = tool_input["search"].lower()
+        items = [i for i in items if
+                 search in i.get("data", {}).get("name", "").lower() or
+                 search in i.get("data", {}).get("description", "").lower()]
+    return {"products": items[:20], "count": len(items)}
+
+
+class ListStorage:
+    """
+    Storage stand-in returning prebuilt items.
+
+    Like the chatbots' RequestCachedStorage it carries a RequestMemo, so
+    repeated searches over the same scan reuse its lowercased text.
+    """
+
+    def __init__(self, domains):
+        self.domains = domains
+        self.memo = RequestMemo()
+
+    def scan(self, domain):
+        return self.domains[domain]
+
+
+SEARCH_POLICIES = SearchTool(
+    "search_policies", "policy", "policies",
+    {"policy_number": Contains("policyNumber"), "holder_name": Contains("holderName"), "status": Equals("status")},
+)
+BROWSE_PRODUCTS = SearchTool(
+    "browse_products", "product", "products",
+    {"category": Contains("category"), "search": Contains("name", "description")},
+    where={"status": "ACTIVE"},
+    limit=20,
+)
+
+CASES = [
+    ("search_policies", SEARCH_POLICIES, legacy_search_policies, "policy", {"holder_name": "lee", "status": "ACTIVE"}),
+    ("search_policies", SEARCH_POLICIES, legacy_search_policies, "policy", {"policy_number": "pol-12", "holder_name": "an"}),
+    ("search_policies", SEARCH_POLICIES, legacy_search_policies, "policy", {"status": "EXPIRED"}),
+    ("browse_products", BROWSE_PRODUCTS, legacy_browse_products, "product", {"category": "home"}),
+    ("browse_products", BROWSE_PRODUCTS, legacy_browse_products, "product", {"category": "sports", "search": "ball"}),
+    ("browse_products", BROWSE_PRODUCTS, legacy_browse_products, "product", {"search": "everyday"}),
+]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chatbot search filters")
+    parser.add_argument("--items", type=int, default=20000, help="Items per domain")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per search")
+    args = parser.parse_args()
+
+    random.seed(7)
+    storage = ListStorage({"policy": make_policies(args.items), "product": make_products(args.items)})
+
+    print(f"{args.items} items per domain, {args.repeat} runs per search\n")
+    print(f"{'tool':<17} {'input':<48} {'legacy ms':>10} {'registry ms':>12} {'speedup':>8}")
+    for name, tool, legacy, domain, tool_input in CASES:
+        legacy_ms, expected = timed(lambda: legacy(storage.scan(domain), tool_input), args.repeat)
+        registry_ms, actual = timed(lambda: tool.run(storage, tool_input), args.repeat)
+        if actual != expected:
+            print(f"MISMATCH for {name} {tool_input}", file=sys.stderr)
+            sys.exit(1)
+        print(f"{name:<17} {str(tool_input):<48} {legacy_ms:>10.2f} {registry_ms:>12.2f} {legacy_ms / registry_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 """Seed demo data using Faker library v40.1.0 with realistic customer relationships."""
 import os
 import sys
+import time
+import uuid
 import requests
 from datetime import date
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -18,6 +20,7 @@ fake = Faker()
 
 # Parallel execution configuration
 MAX_WORKERS = 10  # Number of concurrent API requests
+MAX_ATTEMPTS = 3  # Attempts per create; retries reuse the Idempotency-Key
 
 # Global storage for created resources to maintain relationships
 customers = []
@@ -26,6 +29,23 @@ policies = []
 products = []
 orders = []
 
+def post_entity(path, data):
+    """POST a create request, retrying timeouts and 5xx with the same Idempotency-Key."""
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    for attempt in range(MAX_ATTEMPTS):
+        last_attempt = attempt == MAX_ATTEMPTS - 1
+        try:
+            response = requests.post(f"{API_BASE_URL}{path}", json=data, headers=headers, timeout=30)
+        except (requests.ConnectionError, requests.Timeout):
+            if last_attempt:
+                raise
+        else:
+            # 409: the first attempt is still in flight server-side; wait for it
+            if last_attempt or (response.status_code < 500 and response.status_code != 409):
+                response.raise_for_status()
+                return response
+        time.sleep(2 ** attempt)
+
 def create_customer(index):
     """Create a single customer and return data."""
     customer_email = fake.email()
@@ -35,8 +55,7 @@ def create_customer(index):
         "address": fake.address().replace('\n', ', '),
         "phone": fake.phone_number()
     }
-    response = requests.post(f"{API_BASE_URL}/customer", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/customer", data)
 
     customer_id = response.json()['id']
     return {
@@ -74,8 +93,7 @@ def create_quote(customer):
         "propertyType": fake.random_element(["SINGLE_FAMILY", "CONDO", "TOWNHOUSE"]),
         "yearBuilt": fake.random_int(1950, 2024)
     }
-    response = requests.post(f"{API_BASE_URL}/quote", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/quote", data)
 
     quote_id = response.json()['id']
     return {
@@ -133,8 +151,7 @@ def create_policy(quote):
         "effectiveDate": effective_date.isoformat(),
         "expirationDate": expiration_date.isoformat()
     }
-    response = requests.post(f"{API_BASE_URL}/policy", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/policy", data)
 
     policy_id = response.json()['id']
     return {
@@ -203,8 +220,7 @@ def create_claim(policy):
         "estimatedAmount_cents": fake.random_int(1000, 100000, step=1000) * 100,
         "incidentDate": loss_date.isoformat()
     }
-    response = requests.post(f"{API_BASE_URL}/claim", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/claim", data)
     return response.json()['id']
 
 def seed_claims(count=50):
@@ -248,8 +264,7 @@ def create_payment(policy):
         "paymentMethod": fake.random_element(["CREDIT_CARD", "BANK_TRANSFER", "CHECK"]),
         "cardLastFour": fake.numerify(text="####")
     }
-    response = requests.post(f"{API_BASE_URL}/payment", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/payment", data)
     return response.json()['id']
 
 def seed_payments(count=270):
@@ -287,8 +302,7 @@ def seed_payments(count=270):
 
 def create_case(case_data):
     """Create a single case."""
-    response = requests.post(f"{API_BASE_URL}/case", json=case_data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/case", case_data)
     return response.json()['id']
 
 def seed_cases(count=50):
@@ -390,8 +404,7 @@ def create_product(index):
         "weight": fake.random_int(1, 50)
     }
 
-    response = requests.post(f"{API_BASE_URL}/product", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/product", data)
 
     product_id = response.json()['id']
     return {
@@ -452,8 +465,7 @@ def create_order(product_list):
         "status": fake.random_element(['PENDING', 'PROCESSING', 'SHIPPED', 'DELIVERED'])
     }
 
-    response = requests.post(f"{API_BASE_URL}/order", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/order", data)
 
     order_id = response.json()['id']
     return {
@@ -495,8 +507,7 @@ def create_inventory(product):
         "lastRestocked": fake.date_between(start_date='-30d', end_date='today').isoformat()
     }
 
-    response = requests.post(f"{API_BASE_URL}/inventory", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/inventory", data)
     return response.json()['id']
 
 def seed_inventory(count=50):
@@ -531,8 +542,7 @@ def create_retail_payment(order):
         "paymentDate": order["orderDate"]
     }
 
-    response = requests.post(f"{API_BASE_URL}/payment", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/payment", data)
     return response.json()['id']
 
 def seed_retail_payments(count):
@@ -574,8 +584,7 @@ def create_retail_case(index):
         "createdDate": fake.date_between(start_date='-60d', end_date='today').isoformat()
     }
 
-    response = requests.post(f"{API_BASE_URL}/case", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/case", data)
     return response.json()['id']
 
 def seed_retail_cases(count=15):
@@ -615,8 +624,7 @@ def create_patient(idx):
         "dateOfBirth": fake.date_of_birth(minimum_age=18, maximum_age=90).isoformat(),
         "status": fake.random_element(["ACTIVE", "ACTIVE", "ACTIVE", "INACTIVE"]),  # Mostly active
     }
-    response = requests.post(f"{API_BASE_URL}/patient", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/patient", data)
 
     patient_id = response.json()['id']
     return {
@@ -659,8 +667,7 @@ def create_appointment(patient):
         "status": fake.random_element(["SCHEDULED", "CONFIRMED", "COMPLETED", "COMPLETED", "CANCELLED"]),
         "notes": fake.sentence(nb_words=10)
     }
-    response = requests.post(f"{API_BASE_URL}/appointment", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/appointment", data)
 
     appointment_id = response.json()['id']
     return {
@@ -719,8 +726,7 @@ def create_prescription(patient):
         "status": fake.random_element(["ACTIVE", "ACTIVE", "FILLED", "EXPIRED"]),
         "refillsRemaining": fake.random_int(0, 5)
     }
-    response = requests.post(f"{API_BASE_URL}/prescription", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/prescription", data)
 
     prescription_id = response.json()['id']
     return {
@@ -769,8 +775,7 @@ def create_healthcare_billing(patient):
             "Medication", "Physical Therapy", "Consultation"
         ])
     }
-    response = requests.post(f"{API_BASE_URL}/billing", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/billing", data)
     return response.json()['id']
 
 def seed_healthcare_billing(count=80):
@@ -812,8 +817,7 @@ def create_healthcare_case(patient):
         "status": fake.random_element(["OPEN", "IN_PROGRESS", "RESOLVED", "CLOSED"])
     }
 
-    response = requests.post(f"{API_BASE_URL}/case", json=data, timeout=30)
-    response.raise_for_status()
+    response = post_entity("/case", data)
     return response.json()['id']
 
 def seed_healthcare_cases(count=40):